@@ -10,23 +10,32 @@ Features:
 - Token-aware semantic chunking
 - Per-query performance metrics
 - Streaming support
+- HTTP embedding endpoints (/embed, /embed-batch)
+- Prometheus latency histograms (/metrics/prometheus)
 """
 
 import os
-import json
+import base64
+import asyncio
 import logging
-from typing import List, Optional, Dict, Any, AsyncIterator
+import anyio
+import numpy as np
+import orjson
+from typing import List, Optional, Dict, Any, AsyncIterator, Literal
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel, Field
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
 from dotenv import load_dotenv
 
 # Modular RAG imports
 from rag.config import RAGConfig
 from rag.pipeline import RAGPipeline
+from rag.generator import sse_data
 
 load_dotenv()
 
@@ -38,6 +47,59 @@ logging.basicConfig(
 )
 logger = logging.getLogger("rag_service")
 
+# ── Responses ──────────────────────────────────────────────────────────────────
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered by orjson, with native NumPy array support."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
+
+
+# ── Streaming ──────────────────────────────────────────────────────────────────
+SSE_HEARTBEAT_SECONDS = float(os.getenv("RAG_SSE_HEARTBEAT_SECONDS", "15"))
+
+
+async def sse_with_heartbeat(
+    stream: AsyncIterator[str], interval: float = SSE_HEARTBEAT_SECONDS
+) -> AsyncIterator[str]:
+    """
+    Relay SSE chunks, sending a comment frame whenever the stream is idle.
+
+    Proxies drop idle connections, and retrieval plus reranking can take a
+    while before the first token. If the client disconnects, Starlette
+    cancels this generator and the upstream stream is closed with it.
+    """
+    it = stream.__aiter__()
+    pending = asyncio.ensure_future(it.__anext__())
+    try:
+        while True:
+            done, _ = await asyncio.wait({pending}, timeout=interval)
+            if not done:
+                yield ": keepalive\n\n"
+                continue
+            try:
+                chunk = pending.result()
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                logger.error(f"Stream error: {e}")
+                yield sse_data({"error": str(e)})
+                yield "data: [DONE]\n\n"
+                return
+            yield chunk
+            pending = asyncio.ensure_future(it.__anext__())
+    finally:
+        if not pending.done():
+            pending.cancel()
+            try:
+                await pending
+            except (asyncio.CancelledError, StopAsyncIteration):
+                pass
+        await it.aclose()
+
+
 # ── Global Pipeline ────────────────────────────────────────────────────────────
 pipeline: Optional[RAGPipeline] = None
 
@@ -49,6 +111,10 @@ async def lifespan(app: FastAPI):
 
     config = RAGConfig.from_env()
 
+    # Blocking pipeline calls run on the AnyIO thread pool (default 40 threads)
+    thread_limiter = anyio.to_thread.current_default_thread_limiter()
+    thread_limiter.total_tokens = int(os.getenv("RAG_THREADPOOL_SIZE", "64"))
+
     logger.info("Starting Enhanced RAG Service v2.0")
     logger.info(f"  Embedding: {config.get_embedding_model().model_id}")
     logger.info(f"  Reranking: {config.get_reranking_model().model_id}")
@@ -67,10 +133,22 @@ async def lifespan(app: FastAPI):
         f"recovered={startup_check['recovered']}"
     )
 
+    if config.enable_warmup:
+        warmup = await pipeline.warmup()
+        app.state.warmup = warmup
+        logger.info(
+            "✓ Warmup: "
+            + ", ".join(
+                f"{name}={'ok' if r['ok'] else 'failed'} ({r['latency_ms']:.0f}ms)"
+                for name, r in warmup.items()
+            )
+        )
+
     logger.info("✓ RAG Service ready")
     yield
 
     logger.info("Shutting down RAG Service")
+    pipeline.close()
 
 
 # ── FastAPI App ────────────────────────────────────────────────────────────────
@@ -79,8 +157,31 @@ app = FastAPI(
     description="Modular RAG pipeline with NVIDIA embeddings, reranking, and hybrid search",
     version="2.0.0",
     lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
+# Prometheus scrape endpoint (optional dependency)
+try:
+    from prometheus_client import make_asgi_app
+
+    app.mount("/metrics/prometheus", make_asgi_app())
+except ImportError:
+    logger.info("prometheus_client not installed; /metrics/prometheus disabled")
+
+
+# Registered before CORSMiddleware so it runs inside it: a handler for bare
+# Exception would run in Starlette's outermost middleware, and its 500s would
+# reach browsers without CORS headers
+@app.middleware("http")
+async def unhandled_error(request: Request, call_next):
+    """Uncaught endpoint errors become a 500 carrying the error text."""
+    try:
+        return await call_next(request)
+    except Exception as exc:
+        logger.exception(f"{request.url.path} error: {exc}")
+        return FastJSONResponse({"detail": str(exc)}, status_code=500)
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -92,6 +193,9 @@ app.add_middleware(
 
 # ── Request/Response Models ────────────────────────────────────────────────────
 
+MAX_EMBED_BATCH_SIZE = 50  # NVIDIA embedding endpoint cap per call
+
+
 class DocumentRequest(BaseModel):
     pdf_path: str = Field(..., description="Path to PDF file")
 
@@ -107,6 +211,28 @@ class QueryRequest(BaseModel):
     stream: bool = Field(default=False, description="Enable streaming response")
 
 
+class EmbedRequest(BaseModel):
+    text: str = Field(..., description="Query text to embed")
+    format: Literal["json", "f16b64"] = Field(
+        default="json",
+        description="'json' for a float array, 'f16b64' for base64 float16 bytes",
+    )
+
+
+class EmbedBatchRequest(BaseModel):
+    texts: List[str] = Field(..., description="Document texts to embed")
+    batch_size: Optional[int] = Field(
+        default=None,
+        gt=0,
+        le=MAX_EMBED_BATCH_SIZE,
+        description="Texts per upstream API call",
+    )
+    format: Literal["json", "f16b64"] = Field(
+        default="json",
+        description="'json' for float arrays, 'f16b64' for base64 float16 bytes",
+    )
+
+
 class HealthResponse(BaseModel):
     status: str
     nvidia_key_set: bool
@@ -146,6 +272,33 @@ class QueryResponse(BaseModel):
     metrics: Optional[Dict[str, Any]] = None
 
 
+# Hot routes validate raw bytes with prebuilt adapters: pydantic-core parses
+# the JSON directly instead of json.loads followed by model validation.
+_QUERY_REQUEST = TypeAdapter(QueryRequest)
+_EMBED_REQUEST = TypeAdapter(EmbedRequest)
+_EMBED_BATCH_REQUEST = TypeAdapter(EmbedBatchRequest)
+
+
+async def parse_body(adapter: TypeAdapter, raw: Request) -> Any:
+    """Validate a JSON request body, raising FastAPI's standard 422 on failure."""
+    try:
+        return adapter.validate_json(await raw.body())
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)]
+        )
+
+
+def json_body_schema(model: type) -> Dict[str, Any]:
+    """OpenAPI requestBody for routes that parse their own body."""
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": model.model_json_schema()}},
+        }
+    }
+
+
 # ── Endpoints ──────────────────────────────────────────────────────────────────
 
 @app.get("/health", response_model=HealthResponse)
@@ -163,15 +316,12 @@ async def load_document(request: DocumentRequest):
         raise HTTPException(status_code=503, detail="Pipeline not initialized")
 
     try:
-        result = pipeline.load_pdf(request.pdf_path)
+        result = await pipeline.aload_pdf(request.pdf_path)
         return result
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        logger.error(f"Document load error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/load-text")
@@ -181,49 +331,127 @@ async def load_text(request: TextLoadRequest):
         raise HTTPException(status_code=503, detail="Pipeline not initialized")
 
     try:
-        result = pipeline.load_text(request.text, request.source_name)
+        result = await pipeline.aload_text(request.text, request.source_name)
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        logger.error(f"Text load error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/query")
-async def query_rag(request: QueryRequest):
+def stream_response(request: QueryRequest) -> StreamingResponse:
+    """SSE response relaying pipeline tokens as they are generated."""
+    return StreamingResponse(
+        sse_with_heartbeat(pipeline.query_stream(request.question, top_k=request.top_k)),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@app.post("/query", openapi_extra=json_body_schema(QueryRequest))
+async def query_rag(raw: Request):
     """Query the RAG pipeline with optional streaming."""
+    request: QueryRequest = await parse_body(_QUERY_REQUEST, raw)
     if not pipeline:
         raise HTTPException(status_code=503, detail="Pipeline not initialized")
 
     try:
         if request.stream:
+            return stream_response(request)
 
-            async def generate() -> AsyncIterator[str]:
-                assert pipeline is not None
-                async for chunk in pipeline.query_stream(
-                    request.question, top_k=request.top_k
-                ):
-                    yield chunk
-
-            return StreamingResponse(
-                generate(),
-                media_type="text/event-stream",
-                headers={
-                    "Cache-Control": "no-cache",
-                    "Connection": "keep-alive",
-                    "X-Accel-Buffering": "no",
-                },
-            )
-        else:
-            result = pipeline.query(request.question, top_k=request.top_k)
-            return result
+        # Retrieval/reranking use a worker thread; the LLM call is awaited
+        result = await pipeline.aquery(request.question, top_k=request.top_k)
+        return FastJSONResponse(result)
 
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        logger.error(f"Query error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/retrieve", openapi_extra=json_body_schema(QueryRequest))
+async def retrieve(raw: Request):
+    """Retrieve and rerank sources for a question, without LLM generation."""
+    request: QueryRequest = await parse_body(_QUERY_REQUEST, raw)
+    if not pipeline:
+        raise HTTPException(status_code=503, detail="Pipeline not initialized")
+
+    try:
+        return FastJSONResponse(await pipeline.aretrieve(request.question, top_k=request.top_k))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/query-stream", openapi_extra=json_body_schema(QueryRequest))
+async def query_rag_stream(raw: Request):
+    """Always-streaming variant of /query (the stream flag is ignored)."""
+    request: QueryRequest = await parse_body(_QUERY_REQUEST, raw)
+    if not pipeline:
+        raise HTTPException(status_code=503, detail="Pipeline not initialized")
+    if not request.question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+    return stream_response(request)
+
+
+def f16_b64(vectors) -> str:
+    """Base64 of the vectors as row-major little-endian float16."""
+    arr = np.asarray(vectors, dtype="<f2")
+    return base64.b64encode(arr.tobytes()).decode("ascii")
+
+
+@app.post("/embed", openapi_extra=json_body_schema(EmbedRequest))
+async def embed(raw: Request):
+    """Embed a single query text."""
+    request: EmbedRequest = await parse_body(_EMBED_REQUEST, raw)
+    if not pipeline:
+        raise HTTPException(status_code=503, detail="Pipeline not initialized")
+
+    embedding = await pipeline.embedder.aembed_query(request.text)
+    if request.format == "f16b64":
+        # Little-endian float16: half the bytes of the float32 array
+        return FastJSONResponse({
+            "embedding_b64": f16_b64(embedding),
+            "dtype": "float16",
+            "dimensions": len(embedding),
+            "model": pipeline.embedder.model_id,
+        })
+    # Returned directly so the array skips FastAPI's jsonable_encoder walk
+    return FastJSONResponse({
+        "embedding": np.asarray(embedding, dtype=np.float32),
+        "dimensions": len(embedding),
+        "model": pipeline.embedder.model_id,
+    })
+
+
+@app.post("/embed-batch", openapi_extra=json_body_schema(EmbedBatchRequest))
+async def embed_batch(raw: Request):
+    """Embed many document texts with concurrent batch requests."""
+    request: EmbedBatchRequest = await parse_body(_EMBED_BATCH_REQUEST, raw)
+    if not pipeline:
+        raise HTTPException(status_code=503, detail="Pipeline not initialized")
+
+    embeddings = await pipeline.embedder.aembed_documents(
+        request.texts, batch_size=request.batch_size
+    )
+    if request.format == "f16b64":
+        # Row-major little-endian float16; decode with shape + dtype
+        arr = np.asarray(embeddings, dtype="<f2")
+        return FastJSONResponse({
+            "embeddings_b64": f16_b64(arr),
+            "shape": list(arr.shape),
+            "dtype": "float16",
+            "count": len(embeddings),
+            "dimensions": arr.shape[1] if arr.ndim == 2 else 0,
+            "model": pipeline.embedder.model_id,
+        })
+
+    arr = np.asarray(embeddings, dtype=np.float32)
+    return FastJSONResponse({
+        "embeddings": arr,
+        "count": len(embeddings),
+        "dimensions": arr.shape[1] if arr.ndim == 2 else 0,
+        "model": pipeline.embedder.model_id,
+    })
 
 
 @app.get("/collection/stats")
@@ -241,12 +469,8 @@ async def startup_self_heal_check():
     if not pipeline:
         raise HTTPException(status_code=503, detail="Pipeline not initialized")
 
-    try:
-        result = pipeline.run_startup_self_heal_check()
-        return result
-    except Exception as e:
-        logger.error(f"Startup self-heal check error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    result = await run_in_threadpool(pipeline.run_startup_self_heal_check)
+    return result
 
 
 @app.get("/metrics")
@@ -255,7 +479,8 @@ async def get_metrics():
     if not pipeline:
         raise HTTPException(status_code=503, detail="Pipeline not initialized")
 
-    return pipeline.get_metrics_summary()
+    # Returned directly: metric dicts skip FastAPI's jsonable_encoder walk
+    return FastJSONResponse(pipeline.get_metrics_summary())
 
 
 @app.get("/metrics/recent")
@@ -264,7 +489,16 @@ async def get_recent_metrics():
     if not pipeline:
         raise HTTPException(status_code=503, detail="Pipeline not initialized")
 
-    return pipeline.metrics.get_recent_queries(n=20)
+    return FastJSONResponse(pipeline.metrics.get_recent_queries(n=20))
+
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Get query embedding cache statistics."""
+    if not pipeline:
+        raise HTTPException(status_code=503, detail="Pipeline not initialized")
+
+    return pipeline.embedder.get_cache_stats()
 
 
 @app.get("/pipeline/stats")
@@ -273,7 +507,7 @@ async def get_pipeline_stats():
     if not pipeline:
         raise HTTPException(status_code=503, detail="Pipeline not initialized")
 
-    return pipeline.get_pipeline_stats()
+    return FastJSONResponse(pipeline.get_pipeline_stats())
 
 
 @app.get("/models/embeddings")
@@ -300,11 +534,22 @@ async def clear_collection():
     if not pipeline:
         raise HTTPException(status_code=503, detail="Pipeline not initialized")
 
-    return pipeline.clear_collection()
+    return await run_in_threadpool(pipeline.clear_collection)
 
 
 if __name__ == "__main__":
     import uvicorn
 
     port = int(os.getenv("RAG_PORT", "8000"))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Each worker builds its own pipeline in lifespan. The keyword index is
+    # per process, so keep a single worker unless ingestion happens elsewhere.
+    workers = int(os.getenv("RAG_WORKERS", "1"))
+    uvicorn.run(
+        "enhanced_rag_service:app",
+        host="0.0.0.0",
+        port=port,
+        loop="auto",  # uvloop when installed
+        http="auto",  # httptools when installed
+        workers=workers,
+        log_level="info",
+    )
@@ -4,29 +4,57 @@ Enhanced NVIDIA RAG Service with Streaming Support
 Optimized for Kimi K2 Instruct model with clean architecture
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from sse_starlette.sse import EventSourceResponse
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any, AsyncIterator
+from typing import List, Optional, Dict, Any, AsyncIterator, Iterable
 from contextlib import asynccontextmanager
+import asyncio
+import hashlib
+import io
 import os
-import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from pathlib import Path
 from dotenv import load_dotenv
 
 # Core imports
-from langchain_community.document_loaders import PyPDFLoader
+from langchain_community.document_loaders import PyMuPDFLoader, PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_nvidia_ai_endpoints import NVIDIAEmbeddings, ChatNVIDIA
 from langchain_community.vectorstores import Chroma
 from langchain.schema import Document
-from langchain_core.prompts import ChatPromptTemplate
+import aiohttp
+import numpy as np
+import orjson
+import requests
 import tiktoken
+from requests.adapters import HTTPAdapter
+
+import rerank_kernel
+from rag.batcher import DynamicBatcher
+from rag.config import RetrieverConfig
+from rag.pipeline import file_hash
+from rag.retriever import hnsw_metadata, prewarm_collection
+from rerank_kernel import adc_scores
 
 # Load environment
 load_dotenv()
 
+# Logging
+logging.basicConfig(
+    level=os.getenv("RAG_LOGLEVEL", "INFO").upper(),
+    format="%(asctime)s [%(name)s] %(levelname)s: %(message)s",
+    datefmt="%H:%M:%S",
+)
+logger = logging.getLogger("nvidia_rag_service")
+
 # Configuration
 NVIDIA_API_KEY = os.getenv("NVIDIA_API_KEY")
 CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
@@ -40,6 +68,47 @@ LLM_MODEL = "qwen/qwen3.5-397b-a17b"
 CHUNK_SIZE = 512  # tokens
 CHUNK_OVERLAP = 128  # 25% overlap
 TOP_K_RETRIEVAL = 5
+MAX_TOP_K = 100  # per-request ceiling on top_k
+SOURCE_PREVIEW_CHARS = 500  # source text inlined in /query responses
+
+# Diversified retrieval: MMR over at least MMR_FETCH_K nearest candidates
+# (0 = plain similarity search)
+MMR_FETCH_K = int(os.getenv("MMR_FETCH_K", "20"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.5"))  # 1 = relevance only
+
+# HNSW index (applied when the collection is created; HNSW_* env vars parsed by rag.config)
+HNSW_METADATA = hnsw_metadata(RetrieverConfig())
+
+# PDF ingestion
+PAGE_GROUP_SIZE = int(os.getenv("PDF_PAGE_GROUP_SIZE", "8"))  # pages per split task
+PAGE_QUEUE_SIZE = 4  # parsed page groups buffered ahead of the splitter
+DOCUMENT_CONCURRENCY = int(os.getenv("DOCUMENT_CONCURRENCY", "2"))  # PDFs ingested at once
+
+# Embedding ingestion
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "50"))  # NVIDIA endpoint cap
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "8"))
+HASH_LOOKUP_BATCH = 500  # content hashes per Chroma $in lookup
+
+# Query cache (embeddings + retrieval results for recent questions)
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "600"))
+QUERY_CACHE_SIMILARITY = float(os.getenv("QUERY_CACHE_SIMILARITY", "0.97"))
+
+# Answer cache (full /query responses for exact repeats)
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "300"))
+
+# Query embedding batching (concurrent /query misses share one API call)
+QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", "32"))
+QUERY_BATCH_MS = float(os.getenv("QUERY_BATCH_MS", "10"))
+
+# Outbound HTTP (shared by the embedding and chat clients)
+NVIDIA_MAX_CONNECTIONS = int(os.getenv("NVIDIA_MAX_CONNECTIONS", "64"))
+
+# Streaming
+SSE_PING_SECONDS = int(os.getenv("SSE_PING_SECONDS", "15"))
+SSE_COALESCE_TOKENS = int(os.getenv("SSE_COALESCE_TOKENS", "16"))  # max tokens per frame
+SSE_COALESCE_MS = float(os.getenv("SSE_COALESCE_MS", "25"))  # max delay before a frame
 
 # Semantic separators for better chunking
 SEMANTIC_SEPARATORS = [
@@ -55,31 +124,265 @@ SEMANTIC_SEPARATORS = [
     "",  # Characters
 ]
 
+# PDF text extraction: MuPDF (C) when installed, pypdf otherwise
+try:
+    import pymupdf  # noqa: F401
+
+    def pdf_loader(path: str):
+        return PyMuPDFLoader(path, extract_images=False)
+
+except ImportError:
+
+    def pdf_loader(path: str):
+        return PyPDFLoader(path)
+
+
 # Initialize tokenizer
 try:
     tokenizer = tiktoken.get_encoding("cl100k_base")
 except Exception as e:
-    print(f"⚠️ Tiktoken failed: {e}")
+    logger.warning(f"⚠️ Tiktoken failed: {e}")
     tokenizer = None
 
-# Global instances
-embeddings: Optional[NVIDIAEmbeddings] = None
-llm: Optional[ChatNVIDIA] = None
-llm_streaming: Optional[ChatNVIDIA] = None
-vector_store: Optional[Chroma] = None
+
+class QueryCache:
+    """LRU cache of query embeddings and retrieval results with semantic lookup"""
+
+    def __init__(self, max_size: int, ttl_seconds: float, threshold: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None  # SQ8 unit vectors, one row per entry
+        self._scales: Optional[np.ndarray] = None  # per-row dequantization scale
+        self._keys: List[str] = []
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        return " ".join(question.lower().split())
+
+    @staticmethod
+    def quantize(vector: List[float]) -> tuple:
+        """Normalize and scalar-quantize to int8 codes plus one float scale"""
+        unit = np.asarray(vector, dtype=np.float32)
+        unit /= np.linalg.norm(unit) or 1.0
+        scale = float(np.abs(unit).max()) / 127 or 1.0
+        codes = np.clip(np.rint(unit / scale), -127, 127).astype(np.int8)
+        return codes, scale
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        stale = [k for k, e in self._entries.items() if e["created"] < cutoff]
+        for key in stale:
+            del self._entries[key]
+        if stale:
+            self._matrix = None
+
+    def embedding(self, key: str) -> Optional[List[float]]:
+        """Cached embedding for an exact (normalized) question, dequantized from its SQ8 codes"""
+        self._expire()
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return (entry["codes"] * np.float32(entry["scale"] * entry["norm"])).tolist()
+
+    def lookup(self, vector: List[float], top_k: int) -> Optional[List[Any]]:
+        """Results of the most similar cached query, if above the threshold"""
+        self._expire()
+        if not self._entries:
+            self.misses += 1
+            return None
+
+        if self._matrix is None:
+            self._keys = list(self._entries)
+            self._matrix = np.stack([self._entries[k]["codes"] for k in self._keys])
+            self._scales = np.array([self._entries[k]["scale"] for k in self._keys], dtype=np.float32)
+
+        q = np.asarray(vector, dtype=np.float32)
+        q /= np.linalg.norm(q) or 1.0
+        # Cosine similarity against every cached query: fp32 query vs int8 rows
+        scores = adc_scores(q, self._matrix, self._scales)
+        best = int(np.argmax(scores))
+        entry = self._entries[self._keys[best]]
+
+        if scores[best] >= self.threshold and entry["top_k"] >= top_k:
+            self._entries.move_to_end(self._keys[best])
+            self.hits += 1
+            return entry["results"][:top_k]
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, vector: List[float], top_k: int, results: List[Any]) -> None:
+        if self.max_size <= 0:
+            return
+        codes, scale = self.quantize(vector)
+        # Only the int8 codes are kept; the norm restores the original magnitude
+        self._entries[key] = {
+            "codes": codes,
+            "scale": scale,
+            "norm": float(np.linalg.norm(vector)) or 1.0,
+            "top_k": top_k,
+            "results": results,
+            "created": time.monotonic(),
+        }
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        self._matrix = None
+
+    def clear(self) -> None:
+        """Drop everything (call when the collection changes)"""
+        self._entries.clear()
+        self._matrix = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+query_cache = QueryCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL_SECONDS, QUERY_CACHE_SIMILARITY)
+
+
+class AnswerCache:
+    """LRU + TTL cache of complete /query responses, keyed on the exact question"""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()  # key -> (created, payload)
+        self._locks: Dict[bytes, list] = {}  # key -> [lock, holders + waiters]
+        self.generation = 0  # bumped by clear(); stale puts are dropped
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(question: str, top_k: int, include_source_content: bool) -> bytes:
+        digest = hashlib.blake2b(QueryCache.normalize(question).encode(), digest_size=16).digest()
+        return digest + top_k.to_bytes(2, "big") + bytes([include_source_content])
+
+    def get(self, key: bytes) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic() - self.ttl_seconds:
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: bytes, payload: Dict[str, Any], generation: Optional[int] = None) -> None:
+        """Store payload unless the cache was cleared since generation was read"""
+        if self.max_size <= 0 or (generation is not None and generation != self.generation):
+            return
+        self._entries[key] = (time.monotonic(), payload)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    @asynccontextmanager
+    async def lock(self, key: bytes):
+        """Serialize concurrent misses on one key so only the first calls the LLM"""
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.generation += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+answer_cache = AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL_SECONDS)
+
+
+@dataclass
+class AppState:
+    """Per-worker clients and vector store, built once in lifespan (app.state.rag)"""
+
+    embeddings: NVIDIAEmbeddings
+    llm: ChatNVIDIA
+    llm_streaming: ChatNVIDIA
+    vector_store: Chroma
+    http_connector: Optional[aiohttp.TCPConnector] = None
+    http_session: Optional[requests.Session] = None
+    query_batcher: DynamicBatcher = field(init=False)
+    document_slots: asyncio.Semaphore = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.query_batcher = DynamicBatcher(
+            self.embed_queries, max_batch=QUERY_BATCH_MAX, max_wait_ms=QUERY_BATCH_MS
+        )
+        # Caps concurrent PDF ingestion so uploads don't oversubscribe the embed API
+        self.document_slots = asyncio.Semaphore(max(1, DOCUMENT_CONCURRENCY))
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Query-type embeddings for many texts, in one request when the client supports it"""
+        # Same client hook as rag.embedder; per-text calls otherwise
+        embed_many = getattr(self.embeddings, "_embed", None)
+        if embed_many is not None:
+            return embed_many(texts, model_type="query")
+        return [self.embeddings.embed_query(t) for t in texts]
+
+    async def embed_query(self, text: str) -> List[float]:
+        """Embed one question through the shared batcher without blocking the loop"""
+        future = asyncio.wrap_future(self.query_batcher.submit(text))
+        return await asyncio.wait_for(future, self.query_batcher.timeout_s)
+
+    async def aclose(self) -> None:
+        await asyncio.to_thread(self.query_batcher.close)
+        if self.http_connector is not None:
+            await self.http_connector.close()
+        if self.http_session is not None:
+            self.http_session.close()
+
+
+def get_app_state(request: Request) -> AppState:
+    """Endpoint dependency: the worker's AppState"""
+    return request.app.state.rag
 
 
 def token_length(text: str) -> int:
     """Calculate token length"""
     if tokenizer:
-        return len(tokenizer.encode(text))
+        return len(tokenizer.encode_ordinary(text))
     return len(text) // 4  # Fallback approximation
 
 
-async def initialize_clients():
-    """Initialize NVIDIA clients"""
-    global embeddings, llm, llm_streaming
+def token_lengths(texts: List[str]) -> List[int]:
+    """Calculate token lengths for many texts in one parallel encode"""
+    if tokenizer:
+        batches = tokenizer.encode_ordinary_batch(texts, num_threads=os.cpu_count() or 1)
+        return [len(ids) for ids in batches]
+    return [len(t) // 4 for t in texts]
+
 
+async def create_app_state() -> AppState:
+    """Initialize NVIDIA clients and open the vector store"""
     if not NVIDIA_API_KEY:
         raise ValueError("NVIDIA_API_KEY not set")
 
@@ -107,65 +410,522 @@ async def initialize_clients():
         streaming=True,  # Enable streaming
     )
 
-    print(f"✓ NVIDIA clients initialized (Model: {LLM_MODEL})")
-
+    # One keep-alive pool per transport for all three clients
+    http_connector = aiohttp.TCPConnector(
+        limit=NVIDIA_MAX_CONNECTIONS, ssl=embeddings._client._build_ssl_context()
+    )
+    http_session = pooled_session(NVIDIA_MAX_CONNECTIONS, embeddings._client.verify_ssl)
+    share_connection_pool([embeddings, llm, llm_streaming], http_connector, http_session)
 
-def get_vector_store() -> Chroma:
-    """Get or create vector store"""
-    global vector_store
+    logger.info(f"✓ NVIDIA clients initialized (Model: {LLM_MODEL})")
+    vector_store = await asyncio.to_thread(create_vector_store, embeddings)
+    return AppState(
+        embeddings, llm, llm_streaming, vector_store, http_connector, http_session
+    )
 
-    if vector_store is None:
-        Path(CHROMA_PERSIST_DIR).mkdir(parents=True, exist_ok=True)
-        vector_store = Chroma(
-            collection_name=COLLECTION_NAME,
-            embedding_function=embeddings,
-            persist_directory=CHROMA_PERSIST_DIR,
-        )
 
-    return vector_store
+def pooled_session(max_connections: int, verify: Any = True) -> requests.Session:
+    """requests.Session keeping up to max_connections keep-alive connections per host"""
+    session = requests.Session()
+    session.verify = verify
+    adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def share_connection_pool(
+    clients: List[Any],
+    connector: "aiohttp.TCPConnector",
+    session: Optional[requests.Session] = None,
+) -> None:
+    """
+    Route the clients' requests through one connection pool.
+
+    The NVIDIA clients open and close an aiohttp session per async call.
+    Sessions that do not own the connector leave its keep-alive connections
+    open, so later calls reuse them instead of paying a new TCP + TLS
+    handshake. Sync calls (query embeddings run in a worker thread) build a
+    fresh requests.Session each time; with a session given they share it.
+    """
+
+    def make_session() -> aiohttp.ClientSession:
+        return aiohttp.ClientSession(connector=connector, connector_owner=False)
+
+    for client in clients:
+        client._client.get_async_session_fn = make_session
+        if session is not None:
+            client._client.get_session_fn = lambda: session
+
+
+def create_vector_store(embeddings: NVIDIAEmbeddings) -> Chroma:
+    """Open (or create) the persistent collection"""
+    Path(CHROMA_PERSIST_DIR).mkdir(parents=True, exist_ok=True)
+    return Chroma(
+        collection_name=COLLECTION_NAME,
+        embedding_function=embeddings,
+        persist_directory=CHROMA_PERSIST_DIR,
+        collection_metadata=HNSW_METADATA,
+    )
 
 
-def create_optimized_chunks(documents: List[Document]) -> List[Document]:
-    """Create semantic chunks using token-based splitting"""
-
-    # Token-based splitter
-    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        encoding_name="cl100k_base",
+def create_text_splitter() -> RecursiveCharacterTextSplitter:
+    """Token-based splitter with semantic separators"""
+    # Measures with the shared tokenizer (or its fallback) instead of
+    # resolving another tiktoken encoding per splitter
+    return RecursiveCharacterTextSplitter(
         chunk_size=CHUNK_SIZE,
         chunk_overlap=CHUNK_OVERLAP,
         separators=SEMANTIC_SEPARATORS,
         is_separator_regex=False,
+        length_function=token_length,
     )
 
-    # Split documents
-    chunks = text_splitter.split_documents(documents)
 
-    # Enrich metadata
+class TokenWindowSplitter:
+    """
+    Token windows cut from a single encode of each document.
+
+    Each window of CHUNK_SIZE tokens ends at the strongest boundary
+    (paragraph, line, sentence, clause) in its second half, and the next
+    window starts CHUNK_OVERLAP tokens earlier. Text is never re-encoded
+    while splitting. Every cut lands on a token that begins a UTF-8
+    character, so byte-level BPE never leaves a split character (U+FFFD)
+    at either end of a chunk.
+    """
+
+    # Token endings by boundary strength, strongest first
+    BOUNDARIES = ((b"\n\n",), (b"\n",), (b".", b"?", b"!"), (b";", b","))
+
+    def __init__(self, encoding, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP):
+        self._encoding = encoding
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self._ranks: Dict[int, int] = {}
+        self._char_starts: Dict[int, bool] = {}
+
+    def _starts_char(self, token_id: int) -> bool:
+        """True unless the token's first byte is a UTF-8 continuation byte"""
+        starts = self._char_starts.get(token_id)
+        if starts is None:
+            first = self._encoding.decode_single_token_bytes(token_id)[:1]
+            starts = not first or (first[0] & 0xC0) != 0x80
+            self._char_starts[token_id] = starts
+        return starts
+
+    def _snap(self, ids: List[int], cut: int, lo: int) -> int:
+        """Nearest clean cut at or before cut (not below lo), else the next one after"""
+        i = cut
+        while i > lo and i < len(ids) and not self._starts_char(ids[i]):
+            i -= 1
+        if i < len(ids) and not self._starts_char(ids[i]):
+            i = cut
+            while i < len(ids) and not self._starts_char(ids[i]):
+                i += 1
+        return i
+
+    def _rank(self, token_id: int) -> int:
+        rank = self._ranks.get(token_id)
+        if rank is None:
+            text = self._encoding.decode_single_token_bytes(token_id).rstrip(b" \t")
+            rank = next(
+                (r for r, ends in enumerate(self.BOUNDARIES) if text.endswith(ends)),
+                len(self.BOUNDARIES),
+            )
+            self._ranks[token_id] = rank
+        return rank
+
+    def _window_end(self, ids: List[int], start: int) -> int:
+        end = start + self.chunk_size
+        if end >= len(ids):
+            return len(ids)
+        best, cut = len(self.BOUNDARIES), end
+        for i in range(end - 1, start + self.chunk_size // 2 - 1, -1):
+            rank = self._rank(ids[i])
+            if rank < best:
+                best, cut = rank, i + 1
+                if rank == 0:
+                    break
+        return cut
+
+    def split_text(self, text: str) -> List[str]:
+        ids = self._encoding.encode_ordinary(text)
+        chunks: List[str] = []
+        start = 0
+        while start < len(ids):
+            end = self._snap(ids, self._window_end(ids, start), start + 1)
+            chunk = self._encoding.decode(ids[start:end]).strip()
+            if chunk:
+                chunks.append(chunk)
+            if end >= len(ids):
+                break
+            start = self._snap(ids, max(end - self.chunk_overlap, start + 1), start + 1)
+            if start > end:
+                start = end
+        return chunks
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        return [
+            Document(page_content=chunk, metadata=dict(doc.metadata))
+            for doc in documents
+            for chunk in self.split_text(doc.page_content)
+        ]
+
+
+# Built once; splitting keeps no per-call state, so it is safe across threads.
+# Without tiktoken, the character splitter measures with the ~4 chars/token fallback
+text_splitter = TokenWindowSplitter(tokenizer) if tokenizer else create_text_splitter()
+
+
+def enrich_chunks(chunks: List[Document]) -> List[Document]:
+    """Number chunks and attach token counts"""
+    # Token counts for every chunk in one batch encode
+    lens = token_lengths([c.page_content for c in chunks])
+
+    total = len(chunks)
     for i, chunk in enumerate(chunks):
-        chunk.metadata.update(
-            {
-                "chunk_id": i,
-                "chunk_index": i,
-                "total_chunks": len(chunks),
-                "chunk_size_tokens": token_length(chunk.page_content),
-                "preview": chunk.page_content[:100].replace("\n", " "),
-            }
+        meta = chunk.metadata
+        meta["chunk_id"] = i
+        meta["chunk_index"] = i
+        meta["total_chunks"] = total
+        meta["chunk_size_tokens"] = lens[i]
+
+    logger.info(f"✓ Created {len(chunks)} chunks")
+
+    return chunks
+
+
+def chunk_token_stats(chunks: List[Document]) -> Dict[str, int]:
+    """Token count summary for a non-empty list of enriched chunks"""
+    return token_stats([c.metadata["chunk_size_tokens"] for c in chunks])
+
+
+def token_stats(counts: List[int]) -> Dict[str, int]:
+    arr = np.asarray(counts, dtype=np.int64)
+    total = int(arr.sum())
+    return {
+        "total_chunks": int(arr.size),
+        "avg_tokens_per_chunk": total // int(arr.size),
+        "min_tokens": int(arr.min()),
+        "max_tokens": int(arr.max()),
+        "total_tokens": total,
+    }
+
+
+def create_optimized_chunks(documents: List[Document]) -> List[Document]:
+    """Create semantic chunks using token-based splitting"""
+    return enrich_chunks(text_splitter.split_documents(documents))
+
+
+async def load_and_split_pdf(pdf_path: str) -> List[Document]:
+    """
+    Parse and split a PDF without blocking the event loop.
+
+    A worker thread parses pages and hands them over in groups through a
+    bounded queue while earlier groups are being split, so parsing and
+    splitting overlap. The splitter works per page, so the result matches
+    splitting the whole document at once.
+    """
+    loop = asyncio.get_running_loop()
+    pages: "asyncio.Queue[Optional[List[Document]]]" = asyncio.Queue(maxsize=PAGE_QUEUE_SIZE)
+    stop = threading.Event()
+
+    def put(item: Optional[List[Document]]) -> None:
+        asyncio.run_coroutine_threadsafe(pages.put(item), loop).result()
+
+    def parse() -> None:
+        try:
+            group: List[Document] = []
+            for page in pdf_loader(pdf_path).lazy_load():
+                if stop.is_set():
+                    return
+                group.append(page)
+                if len(group) >= PAGE_GROUP_SIZE:
+                    put(group)
+                    group = []
+            if group:
+                put(group)
+        finally:
+            put(None)
+
+    parser = asyncio.ensure_future(asyncio.to_thread(parse))
+    chunks: List[Document] = []
+    try:
+        while (group := await pages.get()) is not None:
+            chunks.extend(await asyncio.to_thread(text_splitter.split_documents, group))
+    finally:
+        # On failure, unblock the parser so its thread can exit
+        stop.set()
+        while not parser.done():
+            while not pages.empty():
+                pages.get_nowait()
+            await asyncio.sleep(0.01)
+    await parser  # re-raise parse errors
+
+    return chunks
+
+
+def document_id(pdf_path: str) -> str:
+    """Stable id for one version of a file (path + modification time)"""
+    stamp = f"{pdf_path}:{os.path.getmtime(pdf_path)}"
+    return hashlib.sha1(stamp.encode()).hexdigest()[:12]
+
+
+def indexed_chunks(store: Chroma, source_hash: str) -> List[Dict[str, Any]]:
+    """Metadata of stored chunks whose source file has this content hash"""
+    res = store._collection.get(
+        where={"source_hash": source_hash}, include=["metadatas"]
+    )
+    return [meta or {} for meta in res["metadatas"] or []]
+
+
+def delete_stale_versions(store: Chroma, source: str, source_hash: str) -> None:
+    """Drop chunks of earlier versions of a file (same source, other content hash)"""
+    store._collection.delete(
+        where={"$and": [{"source": source}, {"source_hash": {"$ne": source_hash}}]}
+    )
+
+
+def content_hash(text: str) -> int:
+    """63-bit content hash (fits Chroma's signed int metadata)"""
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big") >> 1
+
+
+def stored_vectors(collection: Any, hashes: List[int]) -> Dict[int, List[float]]:
+    """Embeddings already in the collection, keyed by content hash"""
+    found: Dict[int, List[float]] = {}
+    unique = list(set(hashes))
+    for start in range(0, len(unique), HASH_LOOKUP_BATCH):
+        res = collection.get(
+            where={"content_hash": {"$in": unique[start : start + HASH_LOOKUP_BATCH]}},
+            include=["metadatas", "embeddings"],
         )
+        for meta, vector in zip(res["metadatas"], res["embeddings"]):
+            found[meta["content_hash"]] = list(vector)
+    return found
+
+
+async def embed_and_upsert(
+    rag: AppState, chunks: List[Document], doc_id: Optional[str] = None
+) -> int:
+    """
+    Embed chunks in concurrent micro-batches and write them to Chroma.
+
+    With a doc_id, chunk ids are "<doc_id>:<chunk_index>", so re-ingesting an
+    unchanged file overwrites its chunks instead of duplicating them, and is
+    skipped entirely when every chunk is already stored. Chunks whose text is
+    already in the collection (e.g. unchanged pages of a revised PDF) reuse
+    the stored vector. Returns the number of chunks written.
+    """
+    # Chroma calls are blocking (SQLite + HNSW): keep them off the event loop
+    store = rag.vector_store
+    collection = store._collection
+
+    if doc_id is None:
+        ids = [str(uuid.uuid4()) for _ in chunks]
+    else:
+        ids = [f"{doc_id}:{i}" for i in range(len(chunks))]
+        existing = await asyncio.to_thread(collection.get, ids=ids, include=[])
+        if len(existing["ids"]) == len(ids):
+            logger.info(f"✓ Already indexed ({doc_id}), skipping embedding")
+            return 0
+
+    hashes = [content_hash(c.page_content) for c in chunks]
+    for chunk, h in zip(chunks, hashes):
+        chunk.metadata["content_hash"] = h
+    vectors = await asyncio.to_thread(stored_vectors, collection, hashes)
+    reused = sum(h in vectors for h in hashes)
+
+    # Each new distinct text once, longest first so batches hold similar lengths
+    new: Dict[int, Document] = {}
+    for chunk, h in zip(chunks, hashes):
+        if h not in vectors:
+            new.setdefault(h, chunk)
+    ordered = sorted(new.items(), key=lambda kv: kv[1].metadata["chunk_size_tokens"], reverse=True)
+    batches = [
+        ordered[i : i + EMBED_BATCH_SIZE]
+        for i in range(0, len(ordered), EMBED_BATCH_SIZE)
+    ]
+    semaphore = asyncio.Semaphore(max(1, EMBED_CONCURRENCY))
+
+    async def embed_batch(batch: List[tuple]) -> List[List[float]]:
+        async with semaphore:
+            return await rag.embeddings.aembed_documents(  # type: ignore
+                [c.page_content for _, c in batch]
+            )
+
+    results = await asyncio.gather(*(embed_batch(b) for b in batches))
+    for batch, batch_vectors in zip(batches, results):
+        for (h, _), vector in zip(batch, batch_vectors):
+            vectors[h] = vector
+
+    # Write precomputed vectors directly (skips LangChain's sequential embed)
+    max_write = getattr(store._client, "get_max_batch_size", lambda: 5000)()
+
+    def write() -> None:
+        for start in range(0, len(chunks), max_write):
+            end = start + max_write
+            collection.upsert(
+                ids=ids[start:end],
+                embeddings=[vectors[h] for h in hashes[start:end]],
+                documents=[c.page_content for c in chunks[start:end]],
+                metadatas=[c.metadata for c in chunks[start:end]],
+            )
+
+    await asyncio.to_thread(write)
 
-    print(
-        f"✓ Created {len(chunks)} chunks (avg: {sum(token_length(c.page_content) for c in chunks) // len(chunks)} tokens)"
+    logger.info(
+        f"✓ Embedded {len(ordered)} chunks in {len(batches)} concurrent batches"
+        f" ({reused} reused from the collection)"
+    )
+    return len(chunks)
+
+
+def search_by_vector(
+    store: Chroma,
+    query_vector: List[float],
+    k: int,
+    fetch_k: int = 0,
+    lambda_mult: float = MMR_LAMBDA,
+) -> List[tuple]:
+    """
+    Nearest chunks for a precomputed query vector as (Document, distance).
+
+    With fetch_k > k, fetches fetch_k candidates and keeps k of them by
+    maximal marginal relevance, so near-duplicate chunks don't crowd out
+    the rest of the context.
+    """
+    use_mmr = fetch_k > k
+    include = ["documents", "metadatas", "distances"]
+    res = store._collection.query(
+        query_embeddings=[query_vector],
+        n_results=fetch_k if use_mmr else k,
+        include=include + ["embeddings"] if use_mmr else include,
     )
+    rows = list(
+        zip(res["ids"][0], res["documents"][0], res["metadatas"][0], res["distances"][0])
+    )
+    if use_mmr and len(rows) > k:
+        vectors = np.asarray(res["embeddings"][0], dtype=np.float32)
+        rows = [rows[i] for i in mmr_select(query_vector, vectors, k, lambda_mult)]
+    return [
+        (Document(id=chunk_id, page_content=text, metadata=meta or {}), distance)
+        for chunk_id, text, meta, distance in rows
+    ]
+
+
+def mmr_select(
+    query_vector: List[float], vectors: np.ndarray, k: int, lambda_mult: float
+) -> List[int]:
+    """Indices of k rows trading cosine relevance to the query against redundancy"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = vectors / np.where(norms == 0, 1, norms)
+    query = np.asarray(query_vector, dtype=np.float32)
+    relevance = unit @ (query / (np.linalg.norm(query) or 1))
+
+    selected = [int(np.argmax(relevance))]
+    redundancy = unit @ unit[selected[0]]
+    while len(selected) < min(k, len(vectors)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        redundancy = np.maximum(redundancy, unit @ unit[best])
+    return selected
+
+
+async def coalesce_tokens(
+    chunks: AsyncIterator[Any], max_tokens: int, max_wait_ms: float
+) -> AsyncIterator[str]:
+    """
+    Merge streamed LLM chunks into fewer, larger pieces of text.
+
+    A piece is emitted once it holds max_tokens chunks or its first chunk
+    has waited max_wait_ms, even if the model stalls in between.
+    """
+    it = chunks.__aiter__()
+    buf: List[str] = []
+    deadline = 0.0
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(it.__anext__())
+            timeout = max(0.0, deadline - time.monotonic()) if buf else None
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                # Window closed while waiting for the next chunk
+                yield "".join(buf)
+                buf.clear()
+                continue
+            try:
+                chunk = pending.result()
+            except StopAsyncIteration:
+                break
+            finally:
+                pending = None
+            content = getattr(chunk, "content", None)
+            if not content:
+                continue
+            if not buf:
+                deadline = time.monotonic() + max_wait_ms / 1000
+            buf.append(content)
+            if len(buf) >= max_tokens:
+                yield "".join(buf)
+                buf.clear()
+        if buf:
+            yield "".join(buf)
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+PROMPT_HEADER = (
+    "You are a helpful study assistant. Use the following context to answer "
+    "accurately and concisely.\n\nContext from documents:\n"
+)
 
-    return chunks
+
+def build_prompt(question: str, docs: List[Document]) -> str:
+    """Build the context + question prompt in a single buffer"""
+    buf = io.StringIO()
+    buf.write(PROMPT_HEADER)
+    for i, doc in enumerate(docs):
+        if i:
+            buf.write("\n\n")
+        buf.write(f"[Document {i + 1}]\n")
+        buf.write(doc.page_content)
+    buf.write("\n\nQuestion: ")
+    buf.write(question)
+    buf.write("\n\nAnswer:")
+    return buf.getvalue()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown"""
-    await initialize_clients()
-    get_vector_store()
-    print("✓ RAG service ready")
+    rag = app.state.rag = await create_app_state()
+    await asyncio.to_thread(prewarm_collection, rag.vector_store._collection)
+    # Compile the cache similarity kernel before the first query
+    await asyncio.to_thread(rerank_kernel.warmup)
+    logger.info("✓ RAG service ready")
     yield
+    await rag.aclose()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered by orjson (handles NumPy scalars natively)"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def sse_frame(payload: Any) -> bytes:
+    """One pre-encoded SSE data frame"""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
+SSE_DONE = b"data: [DONE]\n\n"
 
 
 # FastAPI app
@@ -174,8 +934,21 @@ app = FastAPI(
     description="RAG pipeline with Kimi K2 Instruct and streaming support",
     version="3.0.0",
     lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
+# Registered before CORSMiddleware so it runs inside it and its 500s keep
+# CORS headers (an Exception handler runs outside every middleware)
+@app.middleware("http")
+async def unhandled_error(request: Request, call_next):
+    """Uncaught endpoint errors become a 500 carrying the error text"""
+    try:
+        return await call_next(request)
+    except Exception as exc:
+        logger.exception(f"✗ Error: {exc}")
+        return FastJSONResponse({"detail": str(exc)}, status_code=500)
+
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -193,11 +966,21 @@ class DocumentRequest(BaseModel):
 
 class QueryRequest(BaseModel):
     question: str = Field(..., description="User question")
-    top_k: int = Field(default=TOP_K_RETRIEVAL, description="Number of chunks")
+    top_k: int = Field(default=TOP_K_RETRIEVAL, gt=0, le=MAX_TOP_K, description="Number of chunks")
     stream: bool = Field(default=False, description="Enable streaming response")
+    include_source_content: bool = Field(
+        default=True, description="Inline source text (else fetch via /chunks/{id})"
+    )
 
 
 class Source(BaseModel):
+    id: Optional[str] = None
+    content: Optional[str] = None
+    metadata: Dict[str, Any]
+
+
+class Chunk(BaseModel):
+    id: str
     content: str
     metadata: Dict[str, Any]
 
@@ -240,204 +1023,257 @@ async def health_check():
     }
 
 
+async def ingest_pdf(rag: AppState, pdf_path: str, source_hash: str) -> List[Document]:
+    """Parse, chunk and index a PDF without blocking the event loop"""
+    logger.info(f"📥 Loading: {pdf_path}")
+    chunks = await load_and_split_pdf(pdf_path)
+
+    if not chunks:
+        raise HTTPException(status_code=400, detail="PDF has no content")
+
+    chunks = await asyncio.to_thread(enrich_chunks, chunks)
+    for chunk in chunks:
+        chunk.metadata["source_hash"] = source_hash
+
+    # Add to vector store (Chroma persists writes itself), then drop the
+    # previous version's chunks: its ids were keyed on the old mtime.
+    # Deleting afterwards lets unchanged pages reuse the stored vectors.
+    if await embed_and_upsert(rag, chunks, document_id(pdf_path)):
+        await asyncio.to_thread(
+            delete_stale_versions, rag.vector_store, chunks[0].metadata["source"], source_hash
+        )
+        query_cache.clear()
+        answer_cache.clear()
+    return chunks
+
+
 @app.post("/load-document", response_model=DocumentResponse)
-async def load_document(request: DocumentRequest):
+async def load_document(request: DocumentRequest, rag: AppState = Depends(get_app_state)):
     """Load and vectorize PDF with semantic chunking"""
-    try:
-        pdf_path = request.pdf_path
-
-        # Resolve path
-        if not os.path.isabs(pdf_path):
-            pdf_path = os.path.abspath(pdf_path)
-
-        if not os.path.exists(pdf_path):
-            raise HTTPException(status_code=404, detail=f"File not found: {pdf_path}")
-
-        if not pdf_path.lower().endswith(".pdf"):
-            raise HTTPException(status_code=400, detail="Only PDF files supported")
-
-        # Load PDF
-        print(f"📥 Loading: {pdf_path}")
-        loader = PyPDFLoader(pdf_path)
-        documents = loader.load()
-
-        if not documents:
-            raise HTTPException(status_code=400, detail="PDF has no content")
-
-        # Create chunks
-        chunks = create_optimized_chunks(documents)
-
-        # Add to vector store
-        store = get_vector_store()
-        store.add_documents(chunks)
-        store.persist()
-
-        # Statistics
-        token_counts = [token_length(c.page_content) for c in chunks]
-        chunk_stats = {
-            "total_chunks": len(chunks),
-            "avg_tokens_per_chunk": sum(token_counts) // len(token_counts),
-            "min_tokens": min(token_counts),
-            "max_tokens": max(token_counts),
-            "total_tokens": sum(token_counts),
-        }
+    pdf_path = request.pdf_path
+
+    # Resolve path
+    if not os.path.isabs(pdf_path):
+        pdf_path = os.path.abspath(pdf_path)
 
-        print(f"✓ Indexed {len(chunks)} chunks")
+    if not os.path.exists(pdf_path):
+        raise HTTPException(status_code=404, detail=f"File not found: {pdf_path}")
 
+    if not pdf_path.lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Only PDF files supported")
+
+    # Same bytes already indexed (under any path): nothing to parse or embed
+    source_hash = await asyncio.to_thread(file_hash, pdf_path)
+    indexed = await asyncio.to_thread(indexed_chunks, rag.vector_store, source_hash)
+    if indexed:
+        logger.info(f"✓ Unchanged, {len(indexed)} chunks already indexed: {pdf_path}")
         return {
-            "status": "success",
-            "chunks": len(chunks),
-            "message": f"Processed {os.path.basename(pdf_path)} into {len(chunks)} chunks",
-            "chunk_stats": chunk_stats,
+            "status": "cached",
+            "chunks": len(indexed),
+            "message": f"{os.path.basename(pdf_path)} is unchanged; {len(indexed)} chunks already indexed",
+            "chunk_stats": token_stats([m.get("chunk_size_tokens", 0) for m in indexed]),
         }
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"✗ Error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    async with rag.document_slots:
+        chunks = await ingest_pdf(rag, pdf_path, source_hash)
+
+    # Statistics
+    chunk_stats = chunk_token_stats(chunks)
+
+    logger.info(f"✓ Indexed {len(chunks)} chunks (avg: {chunk_stats['avg_tokens_per_chunk']} tokens)")
+
+    return {
+        "status": "success",
+        "chunks": len(chunks),
+        "message": f"Processed {os.path.basename(pdf_path)} into {len(chunks)} chunks",
+        "chunk_stats": chunk_stats,
+    }
+
+
+async def retrieve(rag: AppState, question: str, top_k: int) -> tuple:
+    """(results_with_scores, cache_status) for a question, via the query cache"""
+    # Embed once (exact repeats skip the NVIDIA round-trip)
+    cache_key = query_cache.normalize(question)
+    query_vector = query_cache.embedding(cache_key)
+    if query_vector is None:
+        query_vector = await rag.embed_query(question)
+
+    # Near-duplicate questions reuse cached retrieval results
+    results_with_scores = query_cache.lookup(query_vector, top_k)
+    if results_with_scores is not None:
+        return results_with_scores, "HIT"
+
+    fetch_k = max(MMR_FETCH_K, 5 * top_k) if MMR_FETCH_K else 0
+    results_with_scores = await asyncio.to_thread(
+        search_by_vector, rag.vector_store, query_vector, top_k, fetch_k
+    )
+    if results_with_scores:
+        query_cache.put(cache_key, query_vector, top_k, results_with_scores)
+    return results_with_scores, "MISS"
+
+
+NO_RESULTS_ANSWER = "No relevant information found. Please upload documents first."
 
 
 @app.post("/query")
-async def query_rag(request: QueryRequest):
+async def query_rag(request: QueryRequest, rag: AppState = Depends(get_app_state)):
     """Query RAG pipeline with optional streaming"""
-    try:
-        question = request.question.strip()
-        if not question:
-            raise HTTPException(status_code=400, detail="Question cannot be empty")
-
-        # Retrieve relevant documents
-        store = get_vector_store()
-        results_with_scores = store.similarity_search_with_score(
-            question, k=request.top_k
-        )
-
+    question = request.question.strip()
+    if not question:
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+
+    if request.stream:
+        return await stream_answer(rag, request, question)
+
+    # Exact repeats are answered from the answer cache; concurrent
+    # misses on the same question wait for the first one's answer
+    key = answer_cache.key(question, request.top_k, request.include_source_content)
+    async with answer_cache.lock(key):
+        payload = answer_cache.get(key)
+        if payload is not None:
+            return FastJSONResponse(payload, headers={"X-Cache": "HIT"})
+        # An ingest or clear during generation makes this answer stale
+        generation = answer_cache.generation
+
+        results_with_scores, cache_status = await retrieve(rag, question, request.top_k)
         if not results_with_scores:
-            return {
-                "answer": "No relevant information found. Please upload documents first.",
-                "sources": [],
-                "chunks_retrieved": 0,
-            }
-
-        relevant_docs = [doc for doc, _ in results_with_scores]
-
-        # Log retrieved chunks
-        print(f"🔍 Retrieved {len(results_with_scores)} chunks for query: '{question}'")
-        for i, (doc, score) in enumerate(results_with_scores):
-            source = doc.metadata.get("source", "Unknown")
-            page = doc.metadata.get("page", "?")
-            print(f"  [{i+1}] Score: {score:.4f} | Source: {os.path.basename(source)} (Page {page})")
-            print(f"      Preview: {doc.page_content[:100].replace('\n', ' ')}...")
-
-        # Build context
-        context = "\n\n".join(
-            [
-                f"[Document {i+1}]\n{doc.page_content}"
-                for i, doc in enumerate(relevant_docs)
-            ]
+            payload = {"answer": NO_RESULTS_ANSWER, "sources": [], "chunks_retrieved": 0}
+            return FastJSONResponse(payload, headers={"X-Cache": cache_status})
+
+        log_retrieved(question, results_with_scores)
+        prompt = build_prompt(question, [doc for doc, _ in results_with_scores])
+        completion = await rag.llm.ainvoke(prompt)
+
+        payload = {
+            "answer": completion.content,
+            "sources": format_sources(results_with_scores, request.include_source_content),
+            "chunks_retrieved": len(results_with_scores),
+        }
+        answer_cache.put(key, payload, generation)
+
+    return FastJSONResponse(payload, headers={"X-Cache": cache_status})
+
+
+async def stream_answer(rag: AppState, request: QueryRequest, question: str):
+    """SSE variant of /query (not answer-cached; tokens are generated live)"""
+    results_with_scores, cache_status = await retrieve(rag, question, request.top_k)
+    headers = {"X-Cache": cache_status}
+
+    if not results_with_scores:
+        return FastJSONResponse(
+            {"answer": NO_RESULTS_ANSWER, "sources": [], "chunks_retrieved": 0},
+            headers=headers,
         )
 
-        # Prompt
-        prompt = f"""You are a helpful study assistant. Use the following context to answer accurately and concisely.
+    log_retrieved(question, results_with_scores)
+    prompt = build_prompt(question, [doc for doc, _ in results_with_scores])
+    sources = format_sources(results_with_scores, request.include_source_content)
+
+    async def generate() -> AsyncIterator[bytes]:
+        """Stream response chunks as pre-encoded SSE frames"""
+        try:
+            tokens = rag.llm_streaming.astream(prompt)
+            async for text in coalesce_tokens(tokens, SSE_COALESCE_TOKENS, SSE_COALESCE_MS):
+                yield sse_frame({"content": text})
+
+            # Send sources at the end
+            yield sse_frame({"sources": sources, "chunks_retrieved": len(results_with_scores)})
+            yield SSE_DONE
+
+        except Exception as e:
+            yield sse_frame({"error": str(e)})
+
+    # Sets the no-cache/keep-alive/no-buffering headers and sends
+    # keepalive pings while the model is thinking
+    return EventSourceResponse(
+        generate(),
+        ping=SSE_PING_SECONDS,
+        sep="\n",
+        headers=headers,
+    )
 
-Context from documents:
-{context}
 
-Question: {question}
+def log_retrieved(question: str, results_with_scores: List[tuple]) -> None:
+    # Per-chunk previews are only built when debug logging is on
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    lines = [f"🔍 Retrieved {len(results_with_scores)} chunks for query: '{question}'"]
+    for i, (doc, score) in enumerate(results_with_scores):
+        source = doc.metadata.get("source", "Unknown")
+        page = doc.metadata.get("page", "?")
+        preview = doc.page_content[:100].replace("\n", " ")
+        lines.append(f"  [{i+1}] Score: {score:.4f} | Source: {os.path.basename(source)} (Page {page})")
+        lines.append(f"      Preview: {preview}...")
+    logger.debug("\n".join(lines))
 
-Answer:"""
 
-        # Format sources
-        sources = []
-        for doc, score in results_with_scores:
-            metadata = doc.metadata.copy()
-            metadata["retrieval_score"] = float(score)
-            sources.append(
-                {
-                    "content": doc.page_content[:500]
-                    + ("..." if len(doc.page_content) > 500 else ""),
-                    "metadata": metadata,
-                }
-            )
+def truncate(text: str, limit: int = SOURCE_PREVIEW_CHARS) -> str:
+    return text if len(text) <= limit else text[:limit] + "..."
 
-        # Streaming vs non-streaming
-        if request.stream:
-
-            async def generate() -> AsyncIterator[str]:
-                """Stream response chunks"""
-                try:
-                    async for chunk in llm_streaming.astream(prompt): # type: ignore
-                        if hasattr(chunk, "content"):
-                            yield f"data: {json.dumps({'content': chunk.content})}\n\n"
-
-                    # Send sources at the end
-                    yield f"data: {json.dumps({'sources': sources, 'chunks_retrieved': len(relevant_docs)})}\n\n"
-                    yield "data: [DONE]\n\n"
-
-                except Exception as e:
-                    yield f"data: {json.dumps({'error': str(e)})}\n\n"
-
-            return StreamingResponse(
-                generate(),
-                media_type="text/event-stream",
-                headers={
-                    "Cache-Control": "no-cache",
-                    "Connection": "keep-alive",
-                    "X-Accel-Buffering": "no",
-                },
-            )
 
-        else:
-            # Non-streaming response
-            response = llm.invoke(prompt) #type: ignore
+def format_sources(results_with_scores: List[tuple], include_content: bool) -> List[Dict[str, Any]]:
+    sources = []
+    for doc, score in results_with_scores:
+        source = {"id": doc.id, "metadata": {**doc.metadata, "retrieval_score": float(score)}}
+        if include_content:
+            source["content"] = truncate(doc.page_content)
+        sources.append(source)
+    return sources
 
-            return {
-                "answer": response.content,
-                "sources": sources,
-                "chunks_retrieved": len(relevant_docs),
-            }
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"✗ Error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+@app.get("/chunks/{chunk_id}", response_model=Chunk)
+async def get_chunk(chunk_id: str, rag: AppState = Depends(get_app_state)):
+    """Full text of one retrieved chunk (for sources returned without content)"""
+    res = await asyncio.to_thread(
+        rag.vector_store._collection.get, ids=[chunk_id], include=["documents", "metadatas"]
+    )
+    if not res["ids"]:
+        raise HTTPException(status_code=404, detail=f"Chunk not found: {chunk_id}")
+    return {"id": chunk_id, "content": res["documents"][0], "metadata": res["metadatas"][0] or {}}
 
 
 @app.get("/collection/stats")
-async def get_collection_stats():
+async def get_collection_stats(rag: AppState = Depends(get_app_state)):
     """Get collection statistics"""
-    try:
-        store = get_vector_store()
-        collection = store._collection
-        count = collection.count()
+    count = await asyncio.to_thread(rag.vector_store._collection.count)
 
-        return {
-            "collection_name": COLLECTION_NAME,
-            "document_count": count,
-            "persist_dir": CHROMA_PERSIST_DIR,
-        }
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "collection_name": COLLECTION_NAME,
+        "document_count": count,
+        "persist_dir": CHROMA_PERSIST_DIR,
+        "query_cache": query_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "query_batching": rag.query_batcher.get_stats(),
+    }
 
 
 @app.delete("/collection")
-async def clear_collection():
+async def clear_collection(rag: AppState = Depends(get_app_state)):
     """Clear all documents"""
-    try:
-        store = get_vector_store()
-        store.delete_collection()
-        print("✓ Collection cleared")
+    await asyncio.to_thread(rag.vector_store.delete_collection)
+    # The old handle points at the dropped collection
+    rag.vector_store = await asyncio.to_thread(create_vector_store, rag.embeddings)
+    query_cache.clear()
+    answer_cache.clear()
+    logger.info("✓ Collection cleared")
 
-        return {"status": "success", "message": "Collection cleared"}
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return {"status": "success", "message": "Collection cleared"}
 
 
 if __name__ == "__main__":
     import uvicorn
 
     port = int(os.getenv("RAG_PORT", "8000"))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Clients and the vector store are created per worker in lifespan. The
+    # query cache is per process too, so other workers would keep serving
+    # cached results after an ingest: default to a single worker.
+    workers = int(os.getenv("RAG_WORKERS", "1"))
+    uvicorn.run(
+        "nvidia_rag_service:app",
+        host="0.0.0.0",
+        port=port,
+        loop="auto",  # uvloop when installed
+        http="auto",  # httptools when installed
+        workers=workers,
+        log_level="info",
+    )
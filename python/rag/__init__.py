@@ -11,6 +11,7 @@ A production-grade RAG system with:
 
 from .config import RAGConfig, ModelConfig
 from .embedder import NVIDIAEmbedder
+from .embedding_cache import EmbeddingCache
 from .chunker import SemanticChunker
 from .retriever import HybridRetriever
 from .reranker import NVIDIAReranker
@@ -22,6 +23,7 @@ __all__ = [
     "RAGConfig",
     "ModelConfig",
     "NVIDIAEmbedder",
+    "EmbeddingCache",
     "SemanticChunker",
     "HybridRetriever",
     "NVIDIAReranker",
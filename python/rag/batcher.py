@@ -0,0 +1,139 @@
+"""
+Dynamic Batcher Module
+
+Coalesces concurrent single-text embedding calls into one upstream request.
+Callers block on a future while a background thread gathers requests for a
+short window, so a burst of queries costs one API round-trip instead of many.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BatchFn = Callable[[List[str]], List[List[float]]]
+
+
+class DynamicBatcher:
+    """
+    Thread-safe micro-batcher for embedding calls.
+
+    A batch is flushed when it holds ``max_batch`` distinct texts or
+    ``max_wait_ms`` has passed since its first request arrived. Blocking
+    callers give up after ``timeout_s`` seconds.
+    """
+
+    def __init__(
+        self,
+        batch_fn: BatchFn,
+        max_batch: int = 32,
+        max_wait_ms: float = 8.0,
+        timeout_s: float = 60.0,
+    ):
+        self._batch_fn = batch_fn
+        self._max_batch = max(1, max_batch)
+        self._max_wait = max(0.0, max_wait_ms) / 1000
+        self.timeout_s = timeout_s
+        self._queue: "queue.Queue[Optional[Tuple[str, Future]]]" = queue.Queue()
+        # Orders submit() against close(): nothing is queued behind the stop marker
+        self._state_lock = threading.Lock()
+        self._closed = False
+        self._batches: int = 0
+        self._requests: int = 0
+        self._worker = threading.Thread(
+            target=self._run, name="embed-batcher", daemon=True
+        )
+        self._worker.start()
+
+    def submit(self, text: str) -> "Future[List[float]]":
+        """Queue a text; the returned future resolves to its embedding."""
+        future: "Future[List[float]]" = Future()
+        with self._state_lock:
+            if self._closed:
+                raise RuntimeError("Batcher is closed")
+            self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str) -> List[float]:
+        """Embed a single text, blocking until its batch is flushed (or timeout_s)."""
+        return self.submit(text).result(timeout=self.timeout_s)
+
+    def close(self) -> None:
+        """Flush pending requests and stop the worker thread."""
+        with self._state_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._worker.join()
+
+    def get_stats(self) -> dict:
+        """Get batching statistics."""
+        return {
+            "batches": self._batches,
+            "requests": self._requests,
+            "avg_batch_size": round(self._requests / self._batches, 2) if self._batches else 0.0,
+        }
+
+    def _collect(self, first: Tuple[str, Future]) -> Tuple[List[Tuple[str, Future]], bool]:
+        """Gather requests until the batch is full or the window closes."""
+        items = [first]
+        distinct = {first[0]}
+        deadline = time.monotonic() + self._max_wait
+        while len(distinct) < self._max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return items, True
+            items.append(item)
+            distinct.add(item[0])
+        return items, False
+
+    def _flush(self, items: List[Tuple[str, Future]]) -> None:
+        # Identical texts in one window share a single slot in the request
+        slots: Dict[str, List[Future]] = {}
+        for text, future in items:
+            # Callers that timed out and cancelled are dropped; the rest can
+            # no longer be cancelled, so setting their result is safe
+            if future.set_running_or_notify_cancel():
+                slots.setdefault(text, []).append(future)
+        texts = list(slots)
+        if not texts:
+            return
+
+        try:
+            embeddings = self._batch_fn(texts)
+            if len(embeddings) != len(texts):
+                raise RuntimeError(
+                    f"Embedding batch returned {len(embeddings)} vectors for {len(texts)} texts"
+                )
+        except Exception as e:
+            for futures in slots.values():
+                for future in futures:
+                    future.set_exception(e)
+            return
+
+        self._batches += 1
+        self._requests += len(items)
+        for text, embedding in zip(texts, embeddings):
+            for future in slots[text]:
+                future.set_result(embedding)
+
+        logger.debug(f"Flushed embedding batch: {len(items)} requests, {len(texts)} texts")
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            items, stop = self._collect(first)
+            self._flush(items)
+            if stop:
+                return
@@ -7,8 +7,11 @@ for intelligent splitting along semantic boundaries.
 """
 
 import logging
-from typing import List, Optional, Dict, Any
+import os
+from itertools import islice
+from typing import Iterable, List, Optional, Dict, Any, Tuple
 from dataclasses import dataclass
+from functools import lru_cache
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
@@ -28,6 +31,18 @@ except ImportError:
     logger.warning("tiktoken not available, falling back to approximate token counting")
 
 
+@lru_cache(maxsize=None)
+def get_tokenizer(encoding_name: str):
+    """Load a tiktoken encoding once per process (None if unavailable)."""
+    if not _TIKTOKEN_AVAILABLE or tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        logger.warning(f"Failed to load tiktoken encoding: {e}")
+        return None
+
+
 @dataclass
 class ChunkStats:
     """Statistics about a chunking operation."""
@@ -40,6 +55,57 @@ class ChunkStats:
     source_pages: int
 
 
+class LiteralSeparatorSplitter(RecursiveCharacterTextSplitter):
+    """
+    Recursive splitter for literal separators, without the regex engine.
+
+    Produces the same chunks as RecursiveCharacterTextSplitter with
+    is_separator_regex=False, but finds and splits on separators with
+    str.find / str.split instead of escaping each one into a regex.
+    """
+
+    def _split_on(self, text: str, separator: str) -> List[str]:
+        if not separator:
+            return list(text)
+        parts = text.split(separator)
+        if self._keep_separator == "end":
+            parts = [p + separator for p in parts[:-1]] + parts[-1:]
+        elif self._keep_separator:
+            parts = parts[:1] + [separator + p for p in parts[1:]]
+        return [p for p in parts if p != ""]
+
+    def _split_text(self, text: str, separators: List[str]) -> List[str]:
+        # First separator present in the text; "" (characters) ends the list
+        separator = separators[-1]
+        new_separators: List[str] = []
+        for i, sep in enumerate(separators):
+            if sep == "":
+                separator = sep
+                break
+            if sep in text:
+                separator = sep
+                new_separators = separators[i + 1:]
+                break
+
+        final_chunks: List[str] = []
+        good_splits: List[str] = []
+        merge_separator = "" if self._keep_separator else separator
+        for piece in self._split_on(text, separator):
+            if self._length_function(piece) < self._chunk_size:
+                good_splits.append(piece)
+                continue
+            if good_splits:
+                final_chunks.extend(self._merge_splits(good_splits, merge_separator))
+                good_splits = []
+            if new_separators:
+                final_chunks.extend(self._split_text(piece, new_separators))
+            else:
+                final_chunks.append(piece)
+        if good_splits:
+            final_chunks.extend(self._merge_splits(good_splits, merge_separator))
+        return final_chunks
+
+
 class SemanticChunker:
     """
     Token-aware semantic document chunker.
@@ -53,87 +119,103 @@ class SemanticChunker:
 
     def __init__(self, config: RAGConfig):
         self.config = config
-        self._tokenizer = None
+        self._tokenizer = get_tokenizer(config.chunking.encoding_name)
+        # Built once; splitting keeps no per-call state
+        self._splitter = self._create_splitter()
+
+    def _create_splitter(self) -> LiteralSeparatorSplitter:
+        """Token-aware splitter, or a character one when tiktoken is missing."""
+        cfg = self.config.chunking
+        if self._tokenizer:
+            # Measures with the shared encoding
+            return LiteralSeparatorSplitter(
+                chunk_size=cfg.chunk_size,
+                chunk_overlap=cfg.chunk_overlap,
+                separators=cfg.separators,
+                is_separator_regex=False,
+                length_function=self.token_length,
+            )
+        # Fallback to character-based splitting (4 chars ≈ 1 token)
+        return LiteralSeparatorSplitter(
+            chunk_size=cfg.chunk_size * 4,
+            chunk_overlap=cfg.chunk_overlap * 4,
+            separators=cfg.separators,
+            is_separator_regex=False,
+        )
 
-        if _TIKTOKEN_AVAILABLE and tiktoken is not None:
-            try:
-                self._tokenizer = tiktoken.get_encoding(
-                    config.chunking.encoding_name
-                )
-            except Exception as e:
-                logger.warning(f"Failed to load tiktoken encoding: {e}")
+    def warmup(self) -> None:
+        """Run one tiny split; fails loudly if only approximate counts are available."""
+        if self._tokenizer is None:
+            raise RuntimeError("tiktoken encoding unavailable; using ~4 chars/token estimates")
+        self.token_lengths(self._splitter.split_text("Warmup sentence. Another one."))
 
     def token_length(self, text: str) -> int:
         """Calculate token length of text."""
         if self._tokenizer:
-            return len(self._tokenizer.encode(text))
+            return len(self._tokenizer.encode_ordinary(text))
         return len(text) // 4  # Fallback: ~4 chars per token
 
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        """Token lengths of many texts in one multi-threaded encode."""
+        if self._tokenizer:
+            batches = self._tokenizer.encode_ordinary_batch(
+                texts, num_threads=os.cpu_count() or 1
+            )
+            return [len(ids) for ids in batches]
+        return [len(t) // 4 for t in texts]
+
     def chunk_documents(
         self,
-        documents: List[Document],
+        documents: Iterable[Document],
         source_name: str = "unknown",
     ) -> tuple[List[Document], ChunkStats]:
         """
         Split documents into semantically meaningful chunks.
 
+        Documents are consumed a window of pages at a time, so a lazy page
+        iterator is split while it is still being parsed.
+
         Args:
-            documents: List of LangChain Document objects
+            documents: LangChain Document objects (any iterable)
             source_name: Name of the source for metadata
 
         Returns:
             Tuple of (chunked documents, chunk statistics)
         """
-        cfg = self.config.chunking
-
-        # Create token-aware splitter
-        if _TIKTOKEN_AVAILABLE and self._tokenizer:
-            splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-                encoding_name=cfg.encoding_name,
-                chunk_size=cfg.chunk_size,
-                chunk_overlap=cfg.chunk_overlap,
-                separators=cfg.separators,
-                is_separator_regex=False,
-            )
-        else:
-            # Fallback to character-based splitting (4 chars ≈ 1 token)
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=cfg.chunk_size * 4,
-                chunk_overlap=cfg.chunk_overlap * 4,
-                separators=cfg.separators,
-                is_separator_regex=False,
-            )
+        window = max(1, self.config.chunking.page_window)
 
-        # Split
-        chunks = splitter.split_documents(documents)
+        # Split window by window; the splitter works per document, so the
+        # chunks match splitting everything at once
+        pages = iter(documents)
+        chunks: List[Document] = []
+        token_counts: List[int] = []
+        while batch := list(islice(pages, window)):
+            self._split_batch(batch, chunks, token_counts)
 
         if not chunks:
             logger.warning("No chunks produced from documents")
             return [], ChunkStats(0, 0, 0, 0, 0, 0)
 
-        # Enrich metadata
+        # Enrich metadata (no text previews: they only bloat Chroma rows)
         source_pages = set()
+        total = len(chunks)
         for i, chunk in enumerate(chunks):
-            page = chunk.metadata.get("page", 0)
-            source_pages.add(page)
-
-            chunk.metadata.update({
-                "chunk_id": i,
-                "chunk_index": i,
-                "total_chunks": len(chunks),
-                "chunk_size_tokens": self.token_length(chunk.page_content),
-                "source_name": source_name,
-                "preview": chunk.page_content[:150].replace("\n", " ").strip(),
-            })
-
-        # Compute stats
-        token_counts = [self.token_length(c.page_content) for c in chunks]
+            meta = chunk.metadata
+            source_pages.add(meta.get("page", 0))
+            meta["chunk_id"] = i
+            meta["chunk_index"] = i
+            meta["total_chunks"] = total
+            meta["chunk_size_tokens"] = token_counts[i]
+            meta["source_name"] = source_name
+
+        # Compute stats from the stored counts; no re-tokenization
+        total_tokens = sum(token_counts)
         stats = ChunkStats(
             total_chunks=len(chunks),
-            avg_tokens_per_chunk=sum(token_counts) / len(token_counts),
+            avg_tokens_per_chunk=total_tokens / len(token_counts),
             min_tokens=min(token_counts),
             max_tokens=max(token_counts),
-            total_tokens=sum(token_counts),
+            total_tokens=total_tokens,
             source_pages=len(source_pages),
         )
 
@@ -145,6 +227,63 @@ class SemanticChunker:
 
         return chunks, stats
 
+    def _split_batch(
+        self,
+        documents: List[Document],
+        chunks: List[Document],
+        token_counts: List[int],
+    ) -> None:
+        """Split a window of documents, appending regularized chunks and their counts."""
+        pieces = [self._splitter.split_text(doc.page_content) for doc in documents]
+        # One encode per window; metadata and stats reuse the counts
+        counts = iter(self.token_lengths([p for texts in pieces for p in texts]))
+        for doc, texts in zip(documents, pieces):
+            piece_counts = [next(counts) for _ in texts]
+            for text, n in self._merge_and_regularize(doc.page_content, texts, piece_counts):
+                chunks.append(Document(page_content=text, metadata=dict(doc.metadata)))
+                token_counts.append(n)
+
+    def _merge_and_regularize(
+        self,
+        text: str,
+        pieces: List[str],
+        counts: List[int],
+    ) -> List[Tuple[str, int]]:
+        """
+        Fold tiny chunks of one document into their predecessor and resplit
+        any chunk over chunk_size.
+
+        Merges take the original span of text, so the overlap two chunks
+        share is not duplicated. Pieces are located left to right; if one
+        cannot be found the split is returned unchanged.
+        """
+        cfg = self.config.chunking
+        min_tokens, max_tokens = cfg.min_chunk_tokens, cfg.chunk_size
+
+        spans: List[Tuple[int, int, int]] = []
+        start = -1
+        for piece, n in zip(pieces, counts):
+            start = text.find(piece, start + 1)
+            if start < 0:
+                return list(zip(pieces, counts))
+            if spans and min(n, spans[-1][2]) < min_tokens:
+                prev_start = spans[-1][0]
+                merged = self.token_length(text[prev_start:start + len(piece)])
+                if merged <= max_tokens:
+                    spans[-1] = (prev_start, start + len(piece), merged)
+                    continue
+            spans.append((start, start + len(piece), n))
+
+        result: List[Tuple[str, int]] = []
+        for begin, end, n in spans:
+            if n <= max_tokens:
+                result.append((text[begin:end], n))
+                continue
+            # Rare: a piece the splitter measured under the limit encodes over it
+            sub = self._splitter.split_text(text[begin:end])
+            result.extend(zip(sub, self.token_lengths(sub)))
+        return result
+
     def chunk_text(
         self,
         text: str,
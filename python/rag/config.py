@@ -86,6 +86,12 @@ class ChunkingConfig:
     chunk_size: int = 512  # tokens
     chunk_overlap: int = 128  # 25% overlap
     encoding_name: str = "cl100k_base"
+    page_window: int = field(
+        default_factory=lambda: int(os.getenv("CHUNK_PAGE_WINDOW", "8"))
+    )  # Pages split per pass while a PDF is still being parsed
+    min_chunk_tokens: int = field(
+        default_factory=lambda: int(os.getenv("CHUNK_MIN_TOKENS", "100"))
+    )  # Smaller chunks fold into their neighbour (0 disables)
     separators: List[str] = field(default_factory=lambda: [
         "\n\n\n",  # Section breaks
         "\n\n",    # Paragraph breaks
@@ -100,6 +106,49 @@ class ChunkingConfig:
     ])
 
 
+@dataclass
+class EmbeddingConfig:
+    """Configuration for embedding requests."""
+
+    batch_size: int = field(
+        default_factory=lambda: int(os.getenv("NVIDIA_EMBED_BATCH_SIZE", "50"))
+    )  # Texts per API call (NVIDIA endpoint cap: 50)
+    max_batch_tokens: int = field(
+        default_factory=lambda: int(os.getenv("NVIDIA_EMBED_MAX_BATCH_TOKENS", "8192"))
+    )  # Token budget per API call (0 disables; batch_size still applies)
+    token_cache_size: int = field(
+        default_factory=lambda: int(os.getenv("EMBED_TOKEN_CACHE_SIZE", "8192"))
+    )  # LRU entries for per-text token counts
+    concurrency: int = field(
+        default_factory=lambda: int(os.getenv("NVIDIA_EMBED_CONCURRENCY", "8"))
+    )  # Max batch requests in flight for async embedding
+    query_cache_size: int = field(
+        default_factory=lambda: int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+    )  # LRU entries for repeated query embeddings (0 disables)
+    query_cache_file: str = field(
+        default_factory=lambda: os.getenv("EMBED_CACHE_FILE", "embed_cache.npz")
+    )  # Query cache snapshot under chroma_persist_dir, kept across restarts ("" disables)
+    document_cache_file: str = field(
+        default_factory=lambda: os.getenv("EMBED_DOCUMENT_CACHE_FILE", "embeddings.sqlite3")
+    )  # SQLite store of chunk embeddings under chroma_persist_dir
+    # Least recently used chunk embeddings beyond this are pruned (0 = unbounded).
+    # Each row is dimensions * 4 bytes, e.g. 8 KB at 2048 dims: 5000 rows ~ 40 MB.
+    # Indexed chunks already keep their vectors in Chroma, so this only needs to
+    # cover recent re-ingests of files that are not (or no longer) indexed.
+    document_cache_max_rows: int = field(
+        default_factory=lambda: int(os.getenv("EMBED_DOCUMENT_CACHE_MAX_ROWS", "5000"))
+    )
+    query_batch_window_ms: float = field(
+        default_factory=lambda: float(os.getenv("NVIDIA_EMBED_QUERY_BATCH_MS", "8"))
+    )  # Window for coalescing concurrent query embeddings (0 disables)
+    query_batch_max: int = field(
+        default_factory=lambda: int(os.getenv("NVIDIA_EMBED_QUERY_BATCH_MAX", "32"))
+    )  # Max distinct queries per coalesced request
+    max_connections: int = field(
+        default_factory=lambda: int(os.getenv("NVIDIA_EMBED_MAX_CONNECTIONS", "64"))
+    )  # Keep-alive connections pooled by the shared HTTP session
+
+
 @dataclass
 class RetrieverConfig:
     """Configuration for document retrieval."""
@@ -110,6 +159,17 @@ class RetrieverConfig:
     keyword_weight: float = 0.3  # Weight for keyword search in hybrid mode
     semantic_weight: float = 0.7  # Weight for semantic search in hybrid mode
     similarity_threshold: float = 0.0  # Minimum similarity score
+    # HNSW index parameters, applied when the collection is created
+    hnsw_m: int = field(default_factory=lambda: int(os.getenv("HNSW_M", "16")))
+    hnsw_construction_ef: int = field(
+        default_factory=lambda: int(os.getenv("HNSW_CONSTRUCTION_EF", "200"))
+    )
+    hnsw_search_ef: int = field(default_factory=lambda: int(os.getenv("HNSW_SEARCH_EF", "64")))
+    # Keyword index rebuilds are debounced: ingests within this window share one
+    # rebuild (a query arriving first rebuilds immediately). 0 rebuilds per ingest.
+    keyword_rebuild_delay_seconds: float = field(
+        default_factory=lambda: float(os.getenv("KEYWORD_REBUILD_DELAY_SECONDS", "2"))
+    )
 
 
 @dataclass
@@ -136,6 +196,7 @@ class RAGConfig:
 
     # Component configs
     chunking: ChunkingConfig = field(default_factory=ChunkingConfig)
+    embedding: EmbeddingConfig = field(default_factory=EmbeddingConfig)
     retriever: RetrieverConfig = field(default_factory=RetrieverConfig)
     generator: GeneratorConfig = field(default_factory=GeneratorConfig)
 
@@ -149,6 +210,8 @@ class RAGConfig:
     enable_reranking: bool = True
     enable_hybrid_search: bool = True
     enable_metrics: bool = True
+    enable_warmup: bool = True  # Prime embedder/reranker/LLM connections at startup
+    enable_embedding_cache: bool = True  # Reuse chunk embeddings (capped by document_cache_max_rows)
 
     # Rate limiting (NVIDIA free tier: 40 req/min)
     rate_limit_rpm: int = 40
@@ -200,4 +263,6 @@ class RAGConfig:
             collection_name=os.getenv("RAG_COLLECTION_NAME", "study_materials"),
             enable_reranking=os.getenv("RAG_ENABLE_RERANKING", "true").lower() == "true",
             enable_hybrid_search=os.getenv("RAG_ENABLE_HYBRID", "true").lower() == "true",
+            enable_warmup=os.getenv("RAG_ENABLE_WARMUP", "true").lower() == "true",
+            enable_embedding_cache=os.getenv("RAG_ENABLE_EMBED_CACHE", "true").lower() == "true",
         )
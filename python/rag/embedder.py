@@ -5,17 +5,28 @@ Handles embedding generation using NVIDIA AI Endpoints.
 Supports multiple embedding models with rate limiting.
 """
 
+import asyncio
+import hashlib
+import os
+import threading
 import time
 import logging
-from typing import List, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
 
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
 from langchain_nvidia_ai_endpoints import NVIDIAEmbeddings
 
+from .batcher import DynamicBatcher
+from .chunker import get_tokenizer
 from .config import RAGConfig, EMBEDDING_MODELS
+from .embedding_cache import EmbeddingCache
 
 logger = logging.getLogger(__name__)
 
-
 class NVIDIAEmbedder:
     """
     NVIDIA embedding model wrapper with rate limiting and model switching.
@@ -30,10 +41,44 @@ class NVIDIAEmbedder:
 
     def __init__(self, config: RAGConfig):
         self.config = config
-        self._client: Optional[NVIDIAEmbeddings] = None
-        self._last_request_time: float = 0
+        self._client_obj: Optional[NVIDIAEmbeddings] = None
+        self._embed_query_fn = None
+        self._embed_many_queries_fn = None
+        self._embed_documents_fn = None
+        self._aembed_documents_fn = None
+        self._session: Optional[requests.Session] = None
+        self._batcher: Optional[DynamicBatcher] = None
+        self._cache_lock = threading.Lock()
+        self._rate_lock = threading.Lock()
+        self._bucket_tokens: float = 0.0
+        self._bucket_ts: Optional[float] = None  # Bucket starts full on first use
         self._request_count: int = 0
         self._total_tokens_embedded: int = 0
+        # Keyed by text digest; float32 rows are ~8x smaller than float lists
+        self._query_cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._query_cache_hits: int = 0
+        self._query_cache_misses: int = 0
+        # Persistent document vectors; attached by the pipeline when enabled
+        self.document_cache: Optional[EmbeddingCache] = None
+        self._document_cache_hits: int = 0
+
+        self._tokenizer = get_tokenizer(config.chunking.encoding_name)
+        # Chunks are re-embedded on re-index and queries repeat, so counts are cached
+        self._token_cache: "OrderedDict[str, int]" = OrderedDict()
+        self._token_cache_lock = threading.Lock()
+
+    @property
+    def _client(self) -> Optional[NVIDIAEmbeddings]:
+        return self._client_obj
+
+    @_client.setter
+    def _client(self, client: Optional[NVIDIAEmbeddings]) -> None:
+        # Resolve the client's methods once instead of on every request
+        self._client_obj = client
+        self._embed_query_fn = getattr(client, "embed_query", None)
+        self._embed_many_queries_fn = getattr(client, "_embed", None)
+        self._embed_documents_fn = getattr(client, "embed_documents", None)
+        self._aembed_documents_fn = getattr(client, "aembed_documents", None)
 
     @property
     def model_config(self):
@@ -53,75 +98,608 @@ class NVIDIAEmbedder:
             model=model_cfg.model_id,
             nvidia_api_key=self.config.nvidia_api_key,
             truncate="END",  # Safely truncate long inputs
+            max_batch_size=self.config.embedding.batch_size,
         )
+        self._install_session()
+
+        emb_cfg = self.config.embedding
+        if emb_cfg.query_batch_window_ms > 0:
+            self._batcher = DynamicBatcher(
+                self._embed_query_batch,
+                max_batch=emb_cfg.query_batch_max,
+                max_wait_ms=emb_cfg.query_batch_window_ms,
+            )
 
         logger.info(f"✓ Embedder initialized: {model_cfg.model_id}")
         return self
 
-    def _rate_limit(self) -> None:
-        """Enforce rate limiting (NVIDIA free tier: 40 req/min)."""
-        now = time.time()
-        elapsed = now - self._last_request_time
-
-        # Reset counter every 60 seconds
-        if elapsed >= 60:
-            self._request_count = 0
-            self._last_request_time = now
+    def _count_tokens(self, texts: List[str]) -> List[int]:
+        """Token counts, with many texts encoded in one multi-threaded batch."""
+        if not self._tokenizer:
+            return [len(t) // 4 for t in texts]  # Fallback: ~4 chars per token
+        if len(texts) == 1:
+            return [len(self._tokenizer.encode_ordinary(texts[0]))]
+        batches = self._tokenizer.encode_ordinary_batch(texts, num_threads=os.cpu_count() or 1)
+        return [len(ids) for ids in batches]
+
+    def token_length(self, text: str) -> int:
+        """Token length of text (cached)."""
+        return self.token_lengths([text])[0]
+
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        """Token lengths of texts (cached); uncached texts are encoded in one batch."""
+        cache = self._token_cache
+        with self._token_cache_lock:
+            known = {t: cache[t] for t in texts if t in cache}
+            for t in known:
+                cache.move_to_end(t)
+
+        missing = [t for t in dict.fromkeys(texts) if t not in known]
+        if missing:
+            counts = self._count_tokens(missing)
+            known.update(zip(missing, counts))
+            limit = self.config.embedding.token_cache_size
+            if limit > 0:
+                with self._token_cache_lock:
+                    cache.update(zip(missing, counts))
+                    while len(cache) > limit:
+                        cache.popitem(last=False)
+        return [known[t] for t in texts]
+
+    def _install_session(self) -> None:
+        """
+        Route the client's HTTP calls through one pooled keep-alive session.
+
+        NVIDIAEmbeddings builds a fresh requests.Session (and so a fresh TLS
+        connection) for every call; sharing one avoids the handshake per query.
+        """
+        inner = getattr(self._client, "_client", None)
+        if inner is None or not hasattr(inner, "get_session_fn"):
+            logger.debug("Embeddings client has no session hook; skipping pooling")
             return
 
-        if self._request_count >= self.config.rate_limit_rpm:
-            wait_time = 60 - elapsed
-            logger.warning(f"Rate limit reached. Waiting {wait_time:.1f}s...")
+        pool_size = max(1, self.config.embedding.max_connections)
+        session = requests.Session()
+        session.verify = getattr(inner, "verify_ssl", True)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        inner.get_session_fn = lambda: session
+        self._session = session
+
+    def warmup(self) -> None:
+        """Send one throwaway query (rate limited and counted, never cached) to warm the connection."""
+        if not self._client:
+            raise RuntimeError("Embedder not initialized. Call initialize() first.")
+        self._embed_query_batch(["warmup"])
+
+    def close(self) -> None:
+        """Stop the query batcher and close the pooled HTTP session."""
+        if self._batcher is not None:
+            self._batcher.close()
+            self._batcher = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+        if self.document_cache is not None:
+            self.document_cache.close()
+            self.document_cache = None
+
+    def _rate_limit_wait(self) -> float:
+        """
+        Reserve one request from the token bucket; return seconds to wait before sending it.
+
+        The bucket refills at rate_limit_rpm / 60 tokens per second on the
+        monotonic clock and holds at most one minute's worth. A caller
+        that finds it empty takes a token on credit and waits for it, so
+        concurrent callers are spaced out in arrival order.
+        """
+        rpm = self.config.rate_limit_rpm
+        with self._rate_lock:
+            self._request_count += 1
+            if rpm <= 0:
+                return 0.0
+            rate = rpm / 60.0
+            capacity = float(rpm)
+            now = time.monotonic()
+            if self._bucket_ts is None:
+                self._bucket_tokens = capacity
+            else:
+                self._bucket_tokens = min(
+                    capacity, self._bucket_tokens + (now - self._bucket_ts) * rate
+                )
+            self._bucket_ts = now
+            self._bucket_tokens -= 1.0
+            if self._bucket_tokens >= 0:
+                return 0.0
+            wait_time = -self._bucket_tokens / rate
+
+        logger.debug(f"Rate limit reached. Waiting {wait_time:.1f}s...")
+        return wait_time
+
+    def _rate_limit(self) -> None:
+        """Enforce rate limiting, blocking the calling thread."""
+        wait_time = self._rate_limit_wait()
+        if wait_time > 0:
             time.sleep(wait_time)
-            self._request_count = 0
-            self._last_request_time = time.time()
+
+    async def _arate_limit(self) -> None:
+        """Enforce rate limiting without blocking the event loop."""
+        wait_time = self._rate_limit_wait()
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
 
     def embed_query(self, text: str) -> List[float]:
-        """Embed a single query text."""
+        """
+        Embed a single query text.
+
+        Results are kept in an LRU cache (config.embedding.query_cache_size
+        entries), so repeated questions skip the API round-trip. Misses from
+        concurrent callers are coalesced into one request when query
+        batching is enabled (config.embedding.query_batch_window_ms).
+        """
         if not self._client:
             raise RuntimeError("Embedder not initialized. Call initialize() first.")
 
-        self._rate_limit()
-        self._request_count += 1
+        cached = self._cached_query(text)
+        if cached is not None:
+            return cached
 
-        result = self._client.embed_query(text)
-        self._total_tokens_embedded += len(text.split())  # approximate
+        if self._batcher is not None:
+            result = self._batcher.embed(text)
+        else:
+            result = self._embed_query_batch([text])[0]
 
+        self._remember_query(text, result)
         return result
 
-    def embed_documents(self, texts: List[str], batch_size: int = 10) -> List[List[float]]:
+    async def aembed_query(self, text: str) -> List[float]:
+        """
+        Async embed_query.
+
+        A miss waits on the shared query batcher without holding a worker
+        thread, so concurrent requests coalesce into one API call.
+        """
+        if not self._client:
+            raise RuntimeError("Embedder not initialized. Call initialize() first.")
+
+        cached = self._cached_query(text)
+        if cached is not None:
+            return cached
+
+        if self._batcher is not None:
+            result = await asyncio.wait_for(
+                asyncio.wrap_future(self._batcher.submit(text)), self._batcher.timeout_s
+            )
+        else:
+            result = (await asyncio.to_thread(self._embed_query_batch, [text]))[0]
+
+        self._remember_query(text, result)
+        return result
+
+    @staticmethod
+    def _cache_key(text: str) -> bytes:
+        """Fixed 16-byte key, so long query texts are not kept alive by the cache."""
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def _cached_query(self, text: str) -> Optional[List[float]]:
+        key = self._cache_key(text)
+        with self._cache_lock:
+            cached = self._query_cache.get(key)
+            if cached is not None:
+                self._query_cache.move_to_end(key)
+                self._query_cache_hits += 1
+                return cached.tolist()
+            self._query_cache_misses += 1
+        return None
+
+    def _remember_query(self, text: str, vector: List[float]) -> None:
+        max_size = self.config.embedding.query_cache_size
+        if max_size > 0:
+            with self._cache_lock:
+                self._query_cache[self._cache_key(text)] = np.asarray(vector, dtype=np.float32)
+                if len(self._query_cache) > max_size:
+                    self._query_cache.popitem(last=False)
+
+    def _embed_query_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed several queries in one request (query input type, not passage)."""
+        self._rate_limit()
+
+        if self._embed_many_queries_fn is not None and len(texts) > 1:
+            results = self._embed_many_queries_fn(texts, model_type="query")
+        else:
+            results = [self._embed_query_fn(t) for t in texts]
+
+        self._total_tokens_embedded += sum(self.token_lengths(texts))
+        return results
+
+    def get_cache_stats(self) -> dict:
+        """Get query embedding cache statistics."""
+        lookups = self._query_cache_hits + self._query_cache_misses
+        return {
+            "size": len(self._query_cache),
+            "max_size": self.config.embedding.query_cache_size,
+            "hits": self._query_cache_hits,
+            "misses": self._query_cache_misses,
+            "hit_rate": round(self._query_cache_hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def clear_cache(self) -> None:
+        """Drop all cached query embeddings."""
+        with self._cache_lock:
+            self._query_cache.clear()
+
+    def save_cache(self, path: str) -> int:
+        """Snapshot the query cache to an .npz file. Returns entries written."""
+        with self._cache_lock:
+            keys = list(self._query_cache)
+            vectors = list(self._query_cache.values())
+        if not keys:
+            return 0
+
+        # Workers share the file; write aside and swap so readers never see a partial one
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                model=np.array(self.model_id),
+                keys=np.frombuffer(b"".join(keys), dtype=np.uint8).reshape(len(keys), -1),
+                vectors=np.stack(vectors),
+            )
+        os.replace(tmp_path, path)
+        return len(keys)
+
+    def load_cache(self, path: str) -> int:
+        """
+        Restore a snapshot written by save_cache(). Returns entries loaded.
+
+        Snapshots from a different embedding model are ignored.
+        """
+        max_size = self.config.embedding.query_cache_size
+        if max_size <= 0 or not os.path.exists(path):
+            return 0
+
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if str(data["model"]) != self.model_id:
+                    return 0
+                keys = [row.tobytes() for row in data["keys"][-max_size:]]
+                vectors = data["vectors"].astype(np.float32)[-max_size:]
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable embedding cache {path}: {e}")
+            return 0
+
+        with self._cache_lock:
+            for key, vector in zip(keys, vectors):
+                self._query_cache[key] = vector
+                self._query_cache.move_to_end(key)
+            while len(self._query_cache) > max_size:
+                self._query_cache.popitem(last=False)
+        return len(keys)
+
+    @staticmethod
+    def _plan_batches(
+        texts: List[str],
+        token_counts: List[int],
+        batch_size: int,
+        max_batch_tokens: int,
+        sort_by_length: bool,
+    ) -> Tuple[List[int], List[List[str]]]:
+        """
+        Split texts into batches, optionally grouping similar token lengths.
+
+        Sorting by length keeps short and long texts out of the same request,
+        so the server does not pad every input up to the longest one. A batch
+        closes when it reaches batch_size texts or adding the next text would
+        exceed max_batch_tokens (0 = no token budget).
+
+        Returns:
+            Tuple of (original index per sorted position, batches)
+        """
+        order = list(range(len(texts)))
+        if sort_by_length:
+            order.sort(key=lambda i: token_counts[i])
+
+        batches: List[List[str]] = []
+        batch: List[str] = []
+        batch_tokens = 0
+        for i in order:
+            over_budget = (
+                max_batch_tokens > 0
+                and batch_tokens + token_counts[i] > max_batch_tokens
+            )
+            if batch and (len(batch) >= batch_size or over_budget):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(texts[i])
+            batch_tokens += token_counts[i]
+        if batch:
+            batches.append(batch)
+
+        return order, batches
+
+    @staticmethod
+    def _scatter(
+        out: Optional[np.ndarray],
+        rows: List[int],
+        batch_embeddings: List[List[float]],
+        total: int,
+    ) -> np.ndarray:
+        """
+        Write one batch into the (total, dim) float32 output at its original rows.
+
+        The buffer is allocated on the first batch, once the dimension is known.
+        """
+        block = np.asarray(batch_embeddings, dtype=np.float32)
+        if out is None:
+            out = np.empty((total, block.shape[1]), dtype=np.float32)
+        out[rows] = block
+        return out
+
+    @staticmethod
+    def _dedupe(
+        texts: List[str], token_counts: Optional[List[int]]
+    ) -> Tuple[List[str], Optional[List[int]], List[int]]:
+        """
+        Collapse repeated texts (e.g. boilerplate headers) to one entry each.
+
+        Returns:
+            Tuple of (unique texts, their token counts, unique index per input)
+        """
+        first: dict = {}
+        inverse = [first.setdefault(text, len(first)) for text in texts]
+        unique = list(first)
+        if token_counts is not None and len(unique) < len(texts):
+            counts = [0] * len(unique)
+            for i, u in enumerate(inverse):
+                counts[u] = token_counts[i]
+            token_counts = counts
+        return unique, token_counts, inverse
+
+    def _lookup_documents(
+        self, texts: List[str]
+    ) -> Tuple[List[bytes], Optional[List[Optional[np.ndarray]]], List[int]]:
+        """
+        Check the persistent cache for each text.
+
+        Returns:
+            Tuple of (cache keys, cached vector or None per text or None
+            without a cache, indices still to embed)
+        """
+        if self.document_cache is None or not texts:
+            return [], None, list(range(len(texts)))
+        keys = [self._cache_key(t) for t in texts]
+        found = self.document_cache.get_many(self.model_id, keys)
+        misses = [i for i, v in enumerate(found) if v is None]
+        self._document_cache_hits += len(texts) - len(misses)
+        return keys, found, misses
+
+    def _merge_cached(
+        self,
+        keys: List[bytes],
+        found: Optional[List[Optional[np.ndarray]]],
+        misses: List[int],
+        fresh: np.ndarray,
+    ) -> np.ndarray:
+        """Store freshly embedded rows and place them between the cached ones."""
+        if found is None:
+            return fresh
+        if misses:
+            self.document_cache.put_many(self.model_id, [keys[i] for i in misses], fresh)
+            if len(misses) == len(found):
+                return fresh
+
+        dim = next(len(v) for v in found if v is not None)
+        out = np.empty((len(found), dim), dtype=np.float32)
+        for i, vector in enumerate(found):
+            if vector is not None:
+                out[i] = vector
+        if misses:
+            out[misses] = fresh
+        return out
+
+    def _empty_embeddings(self) -> np.ndarray:
+        return np.empty((0, self.model_config.dimensions), dtype=np.float32)
+
+    def embed_documents(
+        self,
+        texts: List[str],
+        batch_size: Optional[int] = None,
+        sort_by_length: bool = True,
+        token_counts: Optional[List[int]] = None,
+    ) -> np.ndarray:
         """
         Embed multiple documents with batching and rate limiting.
 
+        Each batch is sent as a single API call, with up to
+        ``config.embedding.concurrency`` calls in flight on worker threads.
+        If a batch request fails, its texts are retried one per request so
+        a single bad input does not sink the whole batch.
+
         Args:
             texts: List of document texts to embed
-            batch_size: Number of texts per API call (default: 10)
+            batch_size: Max texts per API call
+                (default: config.embedding.batch_size); batches are also
+                capped at config.embedding.max_batch_tokens tokens
+            sort_by_length: Batch texts of similar token length together
+                (results are still returned in input order)
+            token_counts: Known token count per text (e.g. from chunk
+                metadata); skips re-encoding the texts for batch planning
 
         Returns:
-            List of embedding vectors
+            float32 array of shape (len(texts), dimensions), in input order.
+            Repeated texts are embedded once and share a row value; texts
+            found in the document cache are not sent at all.
         """
         if not self._client:
             raise RuntimeError("Embedder not initialized. Call initialize() first.")
 
-        all_embeddings: List[List[float]] = []
-
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i : i + batch_size]
+        unique, unique_counts, inverse = self._dedupe(texts, token_counts)
+        keys, found, misses = self._lookup_documents(unique)
+        fresh = self._embed_batches(
+            [unique[i] for i in misses],
+            batch_size,
+            sort_by_length,
+            None if unique_counts is None else [unique_counts[i] for i in misses],
+        )
+        vectors = self._merge_cached(keys, found, misses, fresh)
+        return vectors if len(unique) == len(texts) else vectors[inverse]
+
+    def _embed_batches(
+        self,
+        texts: List[str],
+        batch_size: Optional[int],
+        sort_by_length: bool,
+        token_counts: Optional[List[int]],
+    ) -> np.ndarray:
+        """Send texts in planned batches and gather rows in input order."""
+        batch_size = batch_size or self.config.embedding.batch_size
+        if token_counts is None:
+            token_counts = self.token_lengths(texts)
+        order, batches = self._plan_batches(
+            texts,
+            token_counts,
+            batch_size,
+            self.config.embedding.max_batch_tokens,
+            sort_by_length,
+        )
+        workers = min(max(1, self.config.embedding.concurrency), len(batches))
+        if workers > 1:
+            # Requests overlap; the rate limiter is shared and thread-safe
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(self._embed_batch, batches))
+        else:
+            results = [self._embed_batch(batch) for batch in batches]
+
+        out: Optional[np.ndarray] = None
+        offset = 0
+        for batch_embeddings in results:
+            rows = order[offset : offset + len(batch_embeddings)]
+            out = self._scatter(out, rows, batch_embeddings, len(texts))
+            offset += len(batch_embeddings)
+
+        logger.debug(f"Embedded {len(texts)} texts in {len(batches)} batches")
+
+        self._total_tokens_embedded += sum(token_counts)
+        return out if out is not None else self._empty_embeddings()
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        """Embed one batch, falling back to per-document requests on failure."""
+        self._rate_limit()
+        try:
+            return self._embed_documents_fn(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                raise
+            logger.warning(
+                f"Batch embedding failed ({e}); falling back to per-document requests"
+            )
 
+        embeddings: List[List[float]] = []
+        for text in batch:
             self._rate_limit()
-            self._request_count += 1
+            embeddings.extend(self._embed_documents_fn([text]))
+        return embeddings
+
+    async def _aembed_batch(
+        self, batch: List[str], semaphore: asyncio.Semaphore
+    ) -> List[List[float]]:
+        """Embed one batch, falling back to per-document requests on failure."""
+        async with semaphore:
+            await self._arate_limit()
+
+            try:
+                return await self._aembed_documents_fn(batch)
+            except Exception as e:
+                if len(batch) == 1:
+                    raise
+                logger.warning(
+                    f"Batch embedding failed ({e}); falling back to per-document requests"
+                )
+
+            embeddings: List[List[float]] = []
+            for text in batch:
+                await self._arate_limit()
+                embeddings.extend(await self._aembed_documents_fn([text]))
+            return embeddings
+
+    async def aembed_documents(
+        self,
+        texts: List[str],
+        batch_size: Optional[int] = None,
+        sort_by_length: bool = True,
+        token_counts: Optional[List[int]] = None,
+    ) -> np.ndarray:
+        """
+        Embed multiple documents with concurrent batch requests.
 
-            batch_embeddings = self._client.embed_documents(batch)
-            all_embeddings.extend(batch_embeddings)
+        Batches are issued together, with at most
+        ``config.embedding.concurrency`` requests in flight, so network
+        round-trips overlap instead of running back to back.
 
-            logger.debug(
-                f"Embedded batch {i // batch_size + 1}"
-                f"/{(len(texts) + batch_size - 1) // batch_size}"
-                f" ({len(batch)} texts)"
-            )
+        Args:
+            texts: List of document texts to embed
+            batch_size: Max texts per API call
+                (default: config.embedding.batch_size)
+            sort_by_length: Batch texts of similar token length together
+            token_counts: Known token count per text (skips re-encoding)
+
+        Returns:
+            float32 array of shape (len(texts), dimensions), in input order;
+            repeated and cached texts are not re-sent
+        """
+        if not self._client:
+            raise RuntimeError("Embedder not initialized. Call initialize() first.")
+
+        unique, unique_counts, inverse = self._dedupe(texts, token_counts)
+        keys, found, misses = await asyncio.to_thread(self._lookup_documents, unique)
+        fresh = await self._aembed_batches(
+            [unique[i] for i in misses],
+            batch_size,
+            sort_by_length,
+            None if unique_counts is None else [unique_counts[i] for i in misses],
+        )
+        vectors = await asyncio.to_thread(self._merge_cached, keys, found, misses, fresh)
+        return vectors if len(unique) == len(texts) else vectors[inverse]
+
+    async def _aembed_batches(
+        self,
+        texts: List[str],
+        batch_size: Optional[int],
+        sort_by_length: bool,
+        token_counts: Optional[List[int]],
+    ) -> np.ndarray:
+        """Send planned batches concurrently and gather rows in input order."""
+        batch_size = batch_size or self.config.embedding.batch_size
+        semaphore = asyncio.Semaphore(max(1, self.config.embedding.concurrency))
+
+        if token_counts is None:
+            token_counts = self.token_lengths(texts)
+        order, batches = self._plan_batches(
+            texts,
+            token_counts,
+            batch_size,
+            self.config.embedding.max_batch_tokens,
+            sort_by_length,
+        )
+        results = await asyncio.gather(
+            *(self._aembed_batch(batch, semaphore) for batch in batches)
+        )
+
+        out: Optional[np.ndarray] = None
+        offset = 0
+        for batch_embeddings in results:
+            rows = order[offset : offset + len(batch_embeddings)]
+            out = self._scatter(out, rows, batch_embeddings, len(texts))
+            offset += len(batch_embeddings)
+
+        logger.debug(
+            f"Embedded {len(texts)} texts in {len(batches)} concurrent batches"
+        )
 
-        self._total_tokens_embedded += sum(len(t.split()) for t in texts)
-        return all_embeddings
+        self._total_tokens_embedded += sum(token_counts)
+        return out if out is not None else self._empty_embeddings()
 
     def get_stats(self) -> dict:
         """Get embedding statistics."""
@@ -130,6 +708,9 @@ class NVIDIAEmbedder:
             "total_requests": self._request_count,
             "total_tokens_embedded": self._total_tokens_embedded,
             "dimensions": self.model_config.dimensions,
+            "query_cache": self.get_cache_stats(),
+            "document_cache_hits": self._document_cache_hits,
+            "query_batching": self._batcher.get_stats() if self._batcher else None,
         }
 
     @staticmethod
@@ -0,0 +1,115 @@
+"""
+Persistent Embedding Cache
+
+SQLite store of document embeddings keyed by (model id, text digest), so
+re-ingesting a file or restarting the service does not re-embed its chunks.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Digests per SELECT, under SQLite's host-parameter limit
+_LOOKUP_CHUNK = 500
+
+
+class EmbeddingCache:
+    """
+    Document embeddings on disk as little-endian float32 blobs.
+
+    WAL journaling lets service workers read while one of them writes.
+    Rows carry a last-used time; past max_rows the least recently used
+    are deleted (0 = unbounded). Storage errors are logged and treated
+    as misses: the cache never fails an embedding call.
+    """
+
+    def __init__(self, path: str, max_rows: int = 0):
+        self.path = path
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, digest BLOB NOT NULL, vector BLOB NOT NULL, "
+                "used REAL NOT NULL, PRIMARY KEY (model, digest)) WITHOUT ROWID"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")}
+            if "used" not in columns:  # Stores created before LRU pruning
+                self._conn.execute(
+                    "ALTER TABLE embeddings ADD COLUMN used REAL NOT NULL DEFAULT 0"
+                )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_used ON embeddings (used)"
+            )
+
+    def get_many(self, model_id: str, digests: Sequence[bytes]) -> List[Optional[np.ndarray]]:
+        """Cached vector per digest, None where the text was never embedded; hits are marked used."""
+        found = {}
+        now = time.time()
+        try:
+            with self._lock, self._conn:
+                for start in range(0, len(digests), _LOOKUP_CHUNK):
+                    chunk = digests[start : start + _LOOKUP_CHUNK]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows = self._conn.execute(
+                        "SELECT digest, vector FROM embeddings "
+                        f"WHERE model = ? AND digest IN ({placeholders})",
+                        (model_id, *chunk),
+                    ).fetchall()
+                    if rows and self.max_rows > 0:
+                        self._conn.executemany(
+                            "UPDATE embeddings SET used = ? WHERE model = ? AND digest = ?",
+                            [(now, model_id, d) for d, _ in rows],
+                        )
+                    found.update(rows)
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache lookup failed: {e}")
+            return [None] * len(digests)
+        return [
+            np.frombuffer(found[d], dtype="<f4") if d in found else None
+            for d in digests
+        ]
+
+    def put_many(self, model_id: str, digests: Sequence[bytes], vectors: np.ndarray) -> None:
+        """Store one vector per digest, replacing existing entries, then prune past max_rows."""
+        now = time.time()
+        rows = [
+            (model_id, d, np.ascontiguousarray(v, dtype="<f4").tobytes(), now)
+            for d, v in zip(digests, vectors)
+        ]
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows
+                )
+                if self.max_rows > 0:
+                    self._prune()
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+
+    def _prune(self) -> None:
+        """Delete least recently used rows beyond max_rows (caller holds the lock)."""
+        excess = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_rows
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE (model, digest) IN "
+                "(SELECT model, digest FROM embeddings ORDER BY used LIMIT ?)",
+                (excess,),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
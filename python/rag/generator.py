@@ -6,12 +6,13 @@ Supports streaming and non-streaming generation.
 """
 
 import logging
-import json
-from typing import List, Tuple, Optional, AsyncIterator
+import threading
+from typing import List, NamedTuple, Tuple, Optional, AsyncIterator, Union
 
+import orjson
 from langchain.schema import Document
 from langchain_nvidia_ai_endpoints import ChatNVIDIA
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
 
 from .config import RAGConfig
 
@@ -19,31 +20,59 @@ logger = logging.getLogger(__name__)
 
 # ── Prompt Templates ───────────────────────────────────────────────────────────
 
-STUDY_ASSISTANT_PROMPT = """You are an expert study assistant. Use the following context from study documents to answer the question accurately and concisely.
 
-If the context doesn't contain enough information, say so honestly rather than making up information.
+class ChatPrompt(NamedTuple):
+    """
+    Fixed system message plus a per-request user template.
 
-**Context from documents:**
-{context}
+    The system message is identical on every call, so the serving backend
+    can reuse its cached prefix; {context} comes before {question} so
+    follow-ups over the same documents share a longer prefix.
+    """
+
+    system: str
+    user: str
+
+
+STUDY_ASSISTANT_PROMPT = ChatPrompt(
+    system="""You are an expert study assistant. Use the context from study documents provided with each question to answer it accurately and concisely.
 
-**Question:** {question}
+If the context doesn't contain enough information, say so honestly rather than making up information.
 
 **Instructions:**
 - Be precise and educational
 - Cite document sources when possible
 - Use clear formatting (bullet points, headers) for complex answers
-- If the answer requires multiple steps, break them down clearly"""
+- If the answer requires multiple steps, break them down clearly""",
+    user="""**Context from documents:**
+{context}
 
-SUMMARIZATION_PROMPT = """You are an expert summarizer. Create a comprehensive but concise summary of the following text.
+**Question:** {question}""",
+)
 
-**Text to summarize:**
-{context}
+SUMMARIZATION_PROMPT = ChatPrompt(
+    system="""You are an expert summarizer. Create a comprehensive but concise summary of the text you are given.
 
 **Instructions:**
 - Capture all key points and concepts
 - Organize by theme/topic
 - Keep technical accuracy
-- Use bullet points for clarity"""
+- Use bullet points for clarity""",
+    user="""**Text to summarize:**
+{context}""",
+)
+
+SOURCE_PREVIEW_CHARS = 500
+
+
+def sse_data(payload: dict) -> str:
+    """One SSE data frame, JSON-encoded with orjson."""
+    return f"data: {orjson.dumps(payload).decode()}\n\n"
+
+
+def _truncate(text: str, limit: int = SOURCE_PREVIEW_CHARS) -> str:
+    """Cut text to limit characters, marking the cut with an ellipsis."""
+    return text if len(text) <= limit else text[:limit] + "..."
 
 
 class NVIDIAGenerator:
@@ -61,6 +90,8 @@ class NVIDIAGenerator:
         self.config = config
         self._llm: Optional[ChatNVIDIA] = None
         self._llm_streaming: Optional[ChatNVIDIA] = None
+        self._client_lock = threading.Lock()
+        self._initialized = False
         self._generation_count: int = 0
 
     @property
@@ -68,33 +99,56 @@ class NVIDIAGenerator:
         return self.config.get_llm_model().model_id
 
     def initialize(self) -> "NVIDIAGenerator":
-        """Initialize the NVIDIA LLM clients."""
-        model_cfg = self.config.get_llm_model()
-        gen_cfg = self.config.generator
+        """
+        Check the LLM selection; the clients are created on first use.
 
-        logger.info(f"Initializing NVIDIA Generator: {model_cfg.model_id}")
+        Servers that sit idle, and tools that only ingest, never pay for
+        the client setup.
+        """
+        model_cfg = self.config.get_llm_model()
+        self._initialized = True
+        logger.info(f"✓ Generator initialized: {model_cfg.model_id}")
+        return self
 
-        # Non-streaming LLM
-        self._llm = ChatNVIDIA(
-            model=model_cfg.model_id,
+    def _create_llm(self, streaming: bool) -> ChatNVIDIA:
+        gen_cfg = self.config.generator
+        return ChatNVIDIA(
+            model=self.model_id,
             nvidia_api_key=self.config.nvidia_api_key,
             temperature=gen_cfg.temperature,
             top_p=gen_cfg.top_p,
             max_completion_tokens=gen_cfg.max_completion_tokens,
+            streaming=streaming,
         )
 
-        # Streaming LLM
-        self._llm_streaming = ChatNVIDIA(
-            model=model_cfg.model_id,
-            nvidia_api_key=self.config.nvidia_api_key,
-            temperature=gen_cfg.temperature,
-            top_p=gen_cfg.top_p,
-            max_completion_tokens=gen_cfg.max_completion_tokens,
-            streaming=True,
-        )
+    @property
+    def llm(self) -> ChatNVIDIA:
+        """Non-streaming client, created on first access."""
+        if self._llm is None:
+            if not self._initialized:
+                raise RuntimeError("Generator not initialized")
+            with self._client_lock:
+                if self._llm is None:
+                    self._llm = self._create_llm(streaming=False)
+        return self._llm
 
-        logger.info(f"✓ Generator initialized: {model_cfg.model_id}")
-        return self
+    @property
+    def llm_streaming(self) -> ChatNVIDIA:
+        """
+        Streaming client, created on first access.
+
+        With config.generator.streaming off, the non-streaming client's
+        astream is used instead of allocating a second client.
+        """
+        if not self.config.generator.streaming:
+            return self.llm
+        if self._llm_streaming is None:
+            if not self._initialized:
+                raise RuntimeError("Generator not initialized")
+            with self._client_lock:
+                if self._llm_streaming is None:
+                    self._llm_streaming = self._create_llm(streaming=True)
+        return self._llm_streaming
 
     def _build_context(
         self,
@@ -102,23 +156,44 @@ class NVIDIAGenerator:
         max_chunks: int = 5,
     ) -> str:
         """Build context string from retrieved documents with source info."""
-        context_parts = []
-
-        for i, (doc, score) in enumerate(documents[:max_chunks]):
-            source = doc.metadata.get("source_name", doc.metadata.get("source", "Unknown"))
-            page = doc.metadata.get("page", "?")
-            chunk_id = doc.metadata.get("chunk_id", i)
-
-            header = f"[Document {i + 1} | Source: {source}, Page: {page}, Chunk: {chunk_id}]"
-            context_parts.append(f"{header}\n{doc.page_content}")
+        parts = []
+        append = parts.append
+        for i, (doc, _) in enumerate(documents[:max_chunks]):
+            get = doc.metadata.get
+            # The "source" fallback is only looked up when source_name is missing
+            append(
+                f"[Document {i + 1} | Source: {get('source_name') or get('source', 'Unknown')}, "
+                f"Page: {get('page', '?')}, Chunk: {get('chunk_id', i)}]\n{doc.page_content}"
+            )
+        return "\n\n---\n\n".join(parts)
+
+    def _messages(
+        self,
+        query: str,
+        documents: List[Tuple[Document, float]],
+        prompt_template: Union[ChatPrompt, str],
+    ) -> List[BaseMessage]:
+        """
+        Fill the template and wrap it as chat messages.
 
-        return "\n\n---\n\n".join(context_parts)
+        A ChatPrompt becomes its fixed system message plus the filled user
+        message; a plain string template becomes a single user message.
+        Plain str.format is several times faster than a ChatPromptTemplate,
+        and a ready message list skips the client's input coercion.
+        """
+        context = self._build_context(documents)
+        if isinstance(prompt_template, ChatPrompt):
+            return [
+                SystemMessage(content=prompt_template.system),
+                HumanMessage(content=prompt_template.user.format(context=context, question=query)),
+            ]
+        return [HumanMessage(content=prompt_template.format(context=context, question=query))]
 
     def generate(
         self,
         query: str,
         documents: List[Tuple[Document, float]],
-        prompt_template: str = STUDY_ASSISTANT_PROMPT,
+        prompt_template: Union[ChatPrompt, str] = STUDY_ASSISTANT_PROMPT,
     ) -> dict:
         """
         Generate a response using retrieved documents.
@@ -126,30 +201,35 @@ class NVIDIAGenerator:
         Args:
             query: User question
             documents: Retrieved (document, score) tuples
-            prompt_template: Prompt template with {context} and {question} placeholders
+            prompt_template: ChatPrompt, or a single template string, with
+                {context} and {question} placeholders
 
         Returns:
             Dict with 'answer', 'sources', 'chunks_retrieved'
         """
-        if not self._llm:
-            raise RuntimeError("Generator not initialized")
-
-        # Build context
-        context = self._build_context(documents)
+        llm = self.llm
+        response = llm.invoke(self._messages(query, documents, prompt_template))
+        self._generation_count += 1
 
-        # Format prompt
-        prompt = prompt_template.format(context=context, question=query)
+        return self._result(response.content, documents)
 
-        # Generate response
-        response = self._llm.invoke(prompt)
+    async def agenerate(
+        self,
+        query: str,
+        documents: List[Tuple[Document, float]],
+        prompt_template: Union[ChatPrompt, str] = STUDY_ASSISTANT_PROMPT,
+    ) -> dict:
+        """Async variant of generate (awaits the LLM instead of blocking a thread)."""
+        llm = self.llm
+        response = await llm.ainvoke(self._messages(query, documents, prompt_template))
         self._generation_count += 1
 
-        # Format sources
-        sources = self._format_sources(documents)
+        return self._result(response.content, documents)
 
+    def _result(self, answer: str, documents: List[Tuple[Document, float]]) -> dict:
         return {
-            "answer": response.content,
-            "sources": sources,
+            "answer": answer,
+            "sources": self._format_sources(documents),
             "chunks_retrieved": len(documents),
         }
 
@@ -157,7 +237,7 @@ class NVIDIAGenerator:
         self,
         query: str,
         documents: List[Tuple[Document, float]],
-        prompt_template: str = STUDY_ASSISTANT_PROMPT,
+        prompt_template: Union[ChatPrompt, str] = STUDY_ASSISTANT_PROMPT,
     ) -> AsyncIterator[str]:
         """
         Stream a response using retrieved documents.
@@ -167,44 +247,44 @@ class NVIDIAGenerator:
         Args:
             query: User question
             documents: Retrieved (document, score) tuples
-            prompt_template: Prompt template
+            prompt_template: ChatPrompt or template string
 
         Yields:
             SSE data strings
         """
-        if not self._llm_streaming:
-            raise RuntimeError("Generator not initialized")
-
-        context = self._build_context(documents)
-        prompt = prompt_template.format(context=context, question=query)
+        llm = self.llm_streaming
+        messages = self._messages(query, documents, prompt_template)
 
         try:
-            async for chunk in self._llm_streaming.astream(prompt):
+            async for chunk in llm.astream(messages):
                 if hasattr(chunk, "content") and chunk.content:
-                    yield f"data: {json.dumps({'content': chunk.content})}\n\n"
+                    yield sse_data({"content": chunk.content})
 
             # Send sources at the end
             sources = self._format_sources(documents)
-            yield f"data: {json.dumps({'sources': sources, 'chunks_retrieved': len(documents)})}\n\n"
+            yield sse_data({"sources": sources, "chunks_retrieved": len(documents)})
             yield "data: [DONE]\n\n"
 
             self._generation_count += 1
 
         except Exception as e:
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            yield sse_data({"error": str(e)})
+            yield "data: [DONE]\n\n"
 
     @staticmethod
     def _format_sources(documents: List[Tuple[Document, float]]) -> List[dict]:
         """Format source documents for API response."""
-        sources = []
-        for doc, score in documents:
-            metadata = doc.metadata.copy()
-            metadata["retrieval_score"] = float(score)
-            sources.append({
-                "content": doc.page_content[:500] + ("..." if len(doc.page_content) > 500 else ""),
-                "metadata": metadata,
-            })
-        return sources
+        return [
+            {
+                "content": _truncate(doc.page_content),
+                "metadata": {**doc.metadata, "retrieval_score": float(score)},
+            }
+            for doc, score in documents
+        ]
+
+    def warmup(self) -> None:
+        """Request a one-token completion to prime the connection and model."""
+        self.llm.invoke("ping", max_tokens=1)
 
     def get_stats(self) -> dict:
         """Get generator statistics."""
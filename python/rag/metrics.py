@@ -7,12 +7,35 @@ Measures latency, relevance, and throughput at each pipeline stage.
 
 import time
 import logging
-from typing import List, Dict, Any, Optional
+from collections import deque
+from itertools import islice
+from typing import Deque, List, Dict, Any, Optional
 from dataclasses import dataclass, field
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Try to import prometheus_client for scrape-based metrics
+try:
+    from prometheus_client import Counter, Histogram
+
+    _PROMETHEUS_AVAILABLE = True
+except ImportError:
+    Counter = Histogram = None  # type: ignore[assignment,misc]
+    _PROMETHEUS_AVAILABLE = False
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+
+# Registered once per process; every RAGMetrics instance feeds the same series
+if _PROMETHEUS_AVAILABLE:
+    QUERY_LATENCY = Histogram(
+        "rag_query_seconds", "End-to-end RAG query latency", buckets=_LATENCY_BUCKETS
+    )
+    STAGE_LATENCY = Histogram(
+        "rag_stage_seconds", "RAG pipeline stage latency", ["stage"], buckets=_LATENCY_BUCKETS
+    )
+    QUERIES_TOTAL = Counter("rag_queries_total", "RAG queries by outcome", ["status"])
+
 
 @dataclass
 class StageMetric:
@@ -51,9 +74,12 @@ class RAGMetrics:
     - Error rates
     """
 
-    def __init__(self, enabled: bool = True):
+    def __init__(self, enabled: bool = True, max_history: int = 1000):
         self.enabled = enabled
-        self._queries: List[QueryMetric] = []
+        # Only the most recent queries are kept; lifetime counts are tracked separately
+        self._queries: Deque[QueryMetric] = deque(maxlen=max_history)
+        self._total_queries: int = 0
+        self._failed_queries: int = 0
         self._stage_timers: Dict[str, float] = {}
 
     def start_timer(self, stage: str) -> None:
@@ -129,6 +155,15 @@ class RAGMetrics:
         )
 
         self._queries.append(metric)
+        self._total_queries += 1
+        if not success:
+            self._failed_queries += 1
+
+        if _PROMETHEUS_AVAILABLE:
+            QUERY_LATENCY.observe(total_ms / 1000)
+            for s in stages:
+                STAGE_LATENCY.labels(stage=s.stage).observe(s.latency_ms / 1000)
+            QUERIES_TOTAL.labels(status="success" if success else "error").inc()
 
         logger.info(
             f"Query completed: {total_ms:.0f}ms total, "
@@ -143,8 +178,9 @@ class RAGMetrics:
         if not self._queries:
             return {"message": "No queries recorded yet"}
 
-        total_queries = len(self._queries)
-        successful = sum(1 for q in self._queries if q.success)
+        total_queries = self._total_queries
+        successful = total_queries - self._failed_queries
+        window = len(self._queries)
 
         # Average latencies per stage
         stage_latencies: Dict[str, List[float]] = {}
@@ -172,20 +208,21 @@ class RAGMetrics:
             "min_total_latency_ms": round(min(total_latencies), 2),
             "max_total_latency_ms": round(max(total_latencies), 2),
             "avg_chunks_retrieved": round(
-                sum(q.chunks_retrieved for q in self._queries) / total_queries, 1
+                sum(q.chunks_retrieved for q in self._queries) / window, 1
             ),
             "avg_chunks_after_rerank": round(
-                sum(q.chunks_after_rerank for q in self._queries) / total_queries, 1
+                sum(q.chunks_after_rerank for q in self._queries) / window, 1
             ),
             "avg_answer_length": round(
-                sum(q.answer_length for q in self._queries) / total_queries, 0
+                sum(q.answer_length for q in self._queries) / window, 0
             ),
             "stage_latencies": avg_stage_latencies,
+            "window_size": window,  # averages cover the most recent queries only
         }
 
     def get_recent_queries(self, n: int = 10) -> List[Dict[str, Any]]:
         """Get the N most recent query metrics."""
-        recent = self._queries[-n:]
+        recent = reversed(list(islice(reversed(self._queries), n)))
         return [
             {
                 "query": q.query[:100],
@@ -202,4 +239,6 @@ class RAGMetrics:
     def reset(self) -> None:
         """Reset all recorded metrics."""
         self._queries.clear()
+        self._total_queries = 0
+        self._failed_queries = 0
         self._stage_timers.clear()
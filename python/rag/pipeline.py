@@ -9,22 +9,47 @@ All components are modular and independently configurable.
 """
 
 import os
+import time
+import asyncio
+import hashlib
 import logging
-from typing import List, Optional, Dict, Any, AsyncIterator
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple
 
 from langchain.schema import Document
-from langchain_community.document_loaders import PyPDFLoader
+from langchain_community.document_loaders import PyMuPDFLoader, PyPDFLoader
 
 from .config import RAGConfig
 from .embedder import NVIDIAEmbedder
-from .chunker import SemanticChunker
+from .embedding_cache import EmbeddingCache
+from .chunker import SemanticChunker, ChunkStats
 from .retriever import HybridRetriever
 from .reranker import NVIDIAReranker
-from .generator import NVIDIAGenerator, STUDY_ASSISTANT_PROMPT, SUMMARIZATION_PROMPT
-from .metrics import RAGMetrics
+from .generator import NVIDIAGenerator, STUDY_ASSISTANT_PROMPT, SUMMARIZATION_PROMPT, sse_data
+from .metrics import RAGMetrics, StageMetric
 
 logger = logging.getLogger(__name__)
 
+# PDF text extraction: MuPDF (C) when installed, pure-Python pypdf otherwise
+try:
+    import pymupdf  # noqa: F401
+
+    def _pdf_loader(path: str):
+        return PyMuPDFLoader(path, extract_images=False)
+
+except ImportError:
+
+    def _pdf_loader(path: str):
+        return PyPDFLoader(path)
+
+
+def file_hash(path: str) -> str:
+    """blake2b digest of a file's bytes, read in 1 MiB blocks."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
 
 class RAGPipeline:
     """
@@ -63,6 +88,16 @@ class RAGPipeline:
         logger.info("=" * 60)
 
         self.embedder.initialize()
+        if self._query_cache_path:
+            loaded = self.embedder.load_cache(self._query_cache_path)
+            if loaded:
+                logger.info(f"  Restored {loaded} cached query embeddings")
+        if self._document_cache_path:
+            os.makedirs(self.config.chroma_persist_dir, exist_ok=True)
+            self.embedder.document_cache = EmbeddingCache(
+                self._document_cache_path,
+                max_rows=self.config.embedding.document_cache_max_rows,
+            )
         self.retriever.initialize()
         self.reranker.initialize()
         self.generator.initialize()
@@ -80,24 +115,74 @@ class RAGPipeline:
 
         return self
 
+    async def warmup(self) -> Dict[str, Any]:
+        """
+        Prime the tokenizer, embedder, vector index, reranker and LLM concurrently.
+
+        Failures are logged and reported, never raised: a cold component
+        only costs latency on the first real request.
+
+        Returns:
+            Dict of component -> {"ok", "latency_ms"} (plus "error" on failure)
+        """
+        self._ensure_initialized()
+
+        async def _run(name: str, fn) -> Tuple[str, Dict[str, Any]]:
+            start = time.time()
+            try:
+                await asyncio.to_thread(fn)
+                result: Dict[str, Any] = {"ok": True}
+            except Exception as e:
+                logger.warning(f"Warmup failed for {name}: {e}")
+                result = {"ok": False, "error": str(e)}
+            result["latency_ms"] = round((time.time() - start) * 1000, 2)
+            return name, result
+
+        results = await asyncio.gather(
+            _run("chunker", self.chunker.warmup),
+            _run("embedder", self.embedder.warmup),
+            _run("retriever", self.retriever.warmup),
+            _run("reranker", self.reranker.warmup),
+            _run("generator", self.generator.warmup),
+        )
+        return dict(results)
+
+    def close(self) -> None:
+        """Release network resources and flush deferred index work."""
+        self.retriever.close()
+        if self._query_cache_path:
+            try:
+                self.embedder.save_cache(self._query_cache_path)
+            except OSError as e:
+                logger.warning(f"Could not save query embedding cache: {e}")
+        self.embedder.close()
+
+    @property
+    def _query_cache_path(self) -> Optional[str]:
+        name = self.config.embedding.query_cache_file
+        return os.path.join(self.config.chroma_persist_dir, name) if name else None
+
+    @property
+    def _document_cache_path(self) -> Optional[str]:
+        name = self.config.embedding.document_cache_file
+        if not (self.config.enable_embedding_cache and name):
+            return None
+        return os.path.join(self.config.chroma_persist_dir, name)
+
     def _ensure_initialized(self) -> None:
         if not self._initialized:
             raise RuntimeError("Pipeline not initialized. Call initialize() first.")
 
     # ── Document Ingestion ─────────────────────────────────────────────────────
 
-    def load_pdf(self, pdf_path: str) -> Dict[str, Any]:
+    def _check_pdf(self, pdf_path: str) -> Tuple[str, str, Optional[Dict[str, Any]]]:
         """
-        Load and index a PDF document.
+        Validate the path and hash the file.
 
-        Args:
-            pdf_path: Path to the PDF file
-
-        Returns:
-            Dict with status, chunks count, and statistics
+        Returns (absolute path, content hash, result). The result is only set
+        when chunks with this content hash are already indexed, in which case
+        there is nothing to parse or embed.
         """
-        self._ensure_initialized()
-
         # Resolve path
         if not os.path.isabs(pdf_path):
             pdf_path = os.path.abspath(pdf_path)
@@ -108,37 +193,85 @@ class RAGPipeline:
         if not pdf_path.lower().endswith(".pdf"):
             raise ValueError("Only PDF files are supported")
 
-        source_name = os.path.basename(pdf_path)
-
-        self.metrics.start_timer("document_load")
-
-        # Load PDF
-        loader = PyPDFLoader(pdf_path)
-        documents = loader.load()
+        source_hash = file_hash(pdf_path)
+        indexed = self.retriever.indexed_chunks(source_hash)
+        if not indexed:
+            return pdf_path, source_hash, None
 
-        if not documents:
-            raise ValueError("PDF has no extractable content")
-
-        load_metric = self.metrics.stop_timer(
-            "document_load", input_count=1, output_count=len(documents)
-        )
-
-        # Chunk
-        self.metrics.start_timer("chunking")
-        chunks, chunk_stats = self.chunker.chunk_documents(documents, source_name)
-        chunk_metric = self.metrics.stop_timer(
-            "chunking",
-            input_count=len(documents),
-            output_count=chunk_stats.total_chunks,
+        source_name = os.path.basename(pdf_path)
+        tokens = [meta.get("chunk_size_tokens", 0) for meta in indexed]
+        chunk_stats = ChunkStats(
+            total_chunks=len(indexed),
+            avg_tokens_per_chunk=sum(tokens) / len(tokens),
+            min_tokens=min(tokens),
+            max_tokens=max(tokens),
+            total_tokens=sum(tokens),
+            source_pages=len({meta.get("page", 0) for meta in indexed}),
         )
+        result = self._pdf_result(source_name, chunk_stats, None, None, None)
+        result["status"] = "cached"
+        result["message"] = f"{source_name} is unchanged; {len(indexed)} chunks already indexed"
+        logger.info(f"✓ Skipping unchanged '{source_name}' ({source_hash})")
+        return pdf_path, source_hash, result
+
+    def _load_and_chunk_pdf(
+        self, pdf_path: str, source_hash: str
+    ) -> Tuple[str, List[Document], ChunkStats, Optional[StageMetric], Optional[StageMetric]]:
+        """
+        Stream PDF pages into the chunker as they are parsed.
 
-        # Index
-        self.metrics.start_timer("indexing")
-        self.retriever.add_documents(chunks)
-        index_metric = self.metrics.stop_timer(
-            "indexing", input_count=chunk_stats.total_chunks
-        )
+        Pages are never held as one list, so peak memory is the chunks plus
+        a window of pages. Parse time and split time are measured separately.
+        Returns (source_name, chunks, stats, load_metric, chunk_metric).
+        """
+        source_name = os.path.basename(pdf_path)
+        parse_s = 0.0
+        page_count = 0
+
+        def pages():
+            nonlocal parse_s, page_count
+            loader = _pdf_loader(pdf_path).lazy_load()
+            while True:
+                start = time.perf_counter()
+                page = next(loader, None)
+                parse_s += time.perf_counter() - start
+                if page is None:
+                    return
+                page.metadata["source_hash"] = source_hash
+                page_count += 1
+                yield page
+
+        start = time.perf_counter()
+        chunks, chunk_stats = self.chunker.chunk_documents(pages(), source_name)
+        total_s = time.perf_counter() - start
+
+        if not page_count:
+            raise ValueError("PDF has no extractable content")
 
+        load_metric = chunk_metric = None
+        if self.metrics.enabled:
+            load_metric = StageMetric(
+                stage="document_load",
+                latency_ms=round(parse_s * 1000, 2),
+                input_count=1,
+                output_count=page_count,
+            )
+            chunk_metric = StageMetric(
+                stage="chunking",
+                latency_ms=round((total_s - parse_s) * 1000, 2),
+                input_count=page_count,
+                output_count=chunk_stats.total_chunks,
+            )
+        return source_name, chunks, chunk_stats, load_metric, chunk_metric
+
+    @staticmethod
+    def _pdf_result(
+        source_name: str,
+        chunk_stats: ChunkStats,
+        load_metric: Optional[StageMetric],
+        chunk_metric: Optional[StageMetric],
+        index_metric: Optional[StageMetric],
+    ) -> Dict[str, Any]:
         return {
             "status": "success",
             "chunks": chunk_stats.total_chunks,
@@ -158,6 +291,84 @@ class RAGPipeline:
             },
         }
 
+    @staticmethod
+    def _text_result(source_name: str, chunk_stats: ChunkStats) -> Dict[str, Any]:
+        return {
+            "status": "success",
+            "chunks": chunk_stats.total_chunks,
+            "message": f"Indexed {source_name}: {chunk_stats.total_chunks} chunks",
+            "chunk_stats": {
+                "total_chunks": chunk_stats.total_chunks,
+                "avg_tokens_per_chunk": round(chunk_stats.avg_tokens_per_chunk),
+                "total_tokens": chunk_stats.total_tokens,
+            },
+        }
+
+    def load_pdf(self, pdf_path: str) -> Dict[str, Any]:
+        """
+        Load and index a PDF document.
+
+        Args:
+            pdf_path: Path to the PDF file
+
+        Returns:
+            Dict with status, chunks count, and statistics
+        """
+        self._ensure_initialized()
+
+        pdf_path, source_hash, cached = self._check_pdf(pdf_path)
+        if cached:
+            return cached
+
+        # Parse and chunk in one streamed pass
+        source_name, chunks, chunk_stats, load_metric, chunk_metric = self._load_and_chunk_pdf(
+            pdf_path, source_hash
+        )
+
+        # Index
+        self.metrics.start_timer("indexing")
+        self.retriever.add_documents(chunks)
+        index_metric = self.metrics.stop_timer(
+            "indexing", input_count=chunk_stats.total_chunks
+        )
+
+        return self._pdf_result(
+            source_name, chunk_stats, load_metric, chunk_metric, index_metric
+        )
+
+    async def aload_pdf(self, pdf_path: str) -> Dict[str, Any]:
+        """
+        Async variant of load_pdf.
+
+        PDF parsing and chunking run in a worker thread and embedding batches
+        are issued concurrently, so the event loop is never blocked.
+        """
+        self._ensure_initialized()
+
+        pdf_path, source_hash, cached = await asyncio.to_thread(self._check_pdf, pdf_path)
+        if cached:
+            return cached
+
+        # Parse and chunk in one streamed pass
+        source_name, chunks, chunk_stats, load_metric, chunk_metric = await asyncio.to_thread(
+            self._load_and_chunk_pdf, pdf_path, source_hash
+        )
+
+        # Index, timed locally: the shared stage timers are not safe across awaits
+        index_metric = None
+        start = time.perf_counter()
+        await self.retriever.aadd_documents(chunks)
+        if self.metrics.enabled:
+            index_metric = StageMetric(
+                stage="indexing",
+                latency_ms=round((time.perf_counter() - start) * 1000, 2),
+                input_count=chunk_stats.total_chunks,
+            )
+
+        return self._pdf_result(
+            source_name, chunk_stats, load_metric, chunk_metric, index_metric
+        )
+
     def load_text(
         self,
         text: str,
@@ -190,16 +401,38 @@ class RAGPipeline:
         self.retriever.add_documents(chunks)
         self.metrics.stop_timer("indexing", input_count=chunk_stats.total_chunks)
 
-        return {
-            "status": "success",
-            "chunks": chunk_stats.total_chunks,
-            "message": f"Indexed {source_name}: {chunk_stats.total_chunks} chunks",
-            "chunk_stats": {
-                "total_chunks": chunk_stats.total_chunks,
-                "avg_tokens_per_chunk": round(chunk_stats.avg_tokens_per_chunk),
-                "total_tokens": chunk_stats.total_tokens,
-            },
-        }
+        return self._text_result(source_name, chunk_stats)
+
+    async def aload_text(
+        self,
+        text: str,
+        source_name: str = "text_input",
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Async variant of load_text with concurrent embedding batches."""
+        self._ensure_initialized()
+
+        if not text.strip():
+            raise ValueError("Text cannot be empty")
+
+        # Chunk and index, timed locally (see aload_pdf)
+        start = time.perf_counter()
+        chunks, chunk_stats = await asyncio.to_thread(
+            self.chunker.chunk_text, text, metadata, source_name
+        )
+        chunked = time.perf_counter()
+        await self.retriever.aadd_documents(chunks)
+        if self.metrics.enabled:
+            logger.debug(
+                f"  [chunking] {(chunked - start) * 1000:.1f}ms "
+                f"(1 → {chunk_stats.total_chunks})"
+            )
+            logger.debug(
+                f"  [indexing] {(time.perf_counter() - chunked) * 1000:.1f}ms "
+                f"({chunk_stats.total_chunks} → 0)"
+            )
+
+        return self._text_result(source_name, chunk_stats)
 
     # ── Query Pipeline ─────────────────────────────────────────────────────────
 
@@ -227,6 +460,108 @@ class RAGPipeline:
         if not question.strip():
             raise ValueError("Question cannot be empty")
 
+        retrieved, reranked, stages = self._retrieve_and_rerank(question, top_k)
+        if not retrieved:
+            return self._no_results()
+
+        # ── Generate ───────────────────────────────────────────────────────
+        self.metrics.start_timer("generation")
+        result = self.generator.generate(question, reranked)
+        gen_metric = self.metrics.stop_timer(
+            "generation", output_count=len(result.get("answer", ""))
+        )
+        if gen_metric:
+            stages.append(gen_metric)
+
+        return self._record_query(question, result, stages, retrieved, reranked)
+
+    async def aquery(
+        self,
+        question: str,
+        top_k: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Async variant of query.
+
+        The query embedding and the LLM are awaited, so no thread is held
+        during network calls; local search and reranking use worker threads.
+        """
+        self._ensure_initialized()
+
+        if not question.strip():
+            raise ValueError("Question cannot be empty")
+
+        retrieved, reranked, stages = await self._aretrieve_and_rerank(question, top_k)
+        if not retrieved:
+            return self._no_results()
+
+        # Timed locally: concurrent coroutines would share the named stage timer
+        start = time.perf_counter()
+        result = await self.generator.agenerate(question, reranked)
+        if self.metrics.enabled:
+            stages.append(StageMetric(
+                stage="generation",
+                latency_ms=round((time.perf_counter() - start) * 1000, 2),
+                output_count=len(result.get("answer", "")),
+            ))
+
+        return self._record_query(question, result, stages, retrieved, reranked)
+
+    async def aretrieve(
+        self,
+        question: str,
+        top_k: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Retrieve and rerank without generating an answer.
+
+        Returns:
+            Dict with 'sources' and 'chunks_retrieved', shaped like query()
+        """
+        self._ensure_initialized()
+
+        if not question.strip():
+            raise ValueError("Question cannot be empty")
+
+        _, reranked, _ = await self._aretrieve_and_rerank(question, top_k)
+        return {
+            "sources": self.generator._format_sources(reranked),
+            "chunks_retrieved": len(reranked),
+        }
+
+    async def _aretrieve_and_rerank(
+        self, question: str, top_k: Optional[int]
+    ) -> Tuple[list, list, List[StageMetric]]:
+        """Async _retrieve_and_rerank, with stages timed locally (see aquery)."""
+        stages = []
+
+        start = time.perf_counter()
+        retrieved = await self.retriever.aretrieve(question, top_k=top_k)
+        if self.metrics.enabled:
+            stages.append(StageMetric(
+                stage="retrieval",
+                latency_ms=round((time.perf_counter() - start) * 1000, 2),
+                output_count=len(retrieved),
+            ))
+
+        if not retrieved:
+            return retrieved, [], stages
+
+        start = time.perf_counter()
+        reranked = await asyncio.to_thread(self.reranker.rerank, question, retrieved)
+        if self.metrics.enabled:
+            stages.append(StageMetric(
+                stage="reranking",
+                latency_ms=round((time.perf_counter() - start) * 1000, 2),
+                input_count=len(retrieved),
+                output_count=len(reranked),
+            ))
+
+        return retrieved, reranked, stages
+
+    def _retrieve_and_rerank(
+        self, question: str, top_k: Optional[int]
+    ) -> Tuple[list, list, List[StageMetric]]:
         stages = []
 
         # ── Retrieve ───────────────────────────────────────────────────────
@@ -239,11 +574,7 @@ class RAGPipeline:
             stages.append(retrieval_metric)
 
         if not retrieved:
-            return {
-                "answer": "No relevant information found. Please upload documents first.",
-                "sources": [],
-                "chunks_retrieved": 0,
-            }
+            return retrieved, [], stages
 
         # ── Rerank ─────────────────────────────────────────────────────────
         self.metrics.start_timer("reranking")
@@ -256,16 +587,24 @@ class RAGPipeline:
         if rerank_metric:
             stages.append(rerank_metric)
 
-        # ── Generate ───────────────────────────────────────────────────────
-        self.metrics.start_timer("generation")
-        result = self.generator.generate(question, reranked)
-        gen_metric = self.metrics.stop_timer(
-            "generation", output_count=len(result.get("answer", ""))
-        )
-        if gen_metric:
-            stages.append(gen_metric)
+        return retrieved, reranked, stages
+
+    @staticmethod
+    def _no_results() -> Dict[str, Any]:
+        return {
+            "answer": "No relevant information found. Please upload documents first.",
+            "sources": [],
+            "chunks_retrieved": 0,
+        }
 
-        # ── Record metrics ─────────────────────────────────────────────────
+    def _record_query(
+        self,
+        question: str,
+        result: Dict[str, Any],
+        stages: List[StageMetric],
+        retrieved: list,
+        reranked: list,
+    ) -> Dict[str, Any]:
         query_metric = self.metrics.record_query(
             query=question,
             stages=stages,
@@ -301,17 +640,15 @@ class RAGPipeline:
         if not question.strip():
             raise ValueError("Question cannot be empty")
 
-        # Retrieve
-        retrieved = self.retriever.retrieve(question, top_k=top_k)
+        retrieved = await self.retriever.aretrieve(question, top_k=top_k)
 
         if not retrieved:
-            import json
-            yield f"data: {json.dumps({'content': 'No relevant information found.'})}\n\n"
+            yield sse_data({"content": "No relevant information found."})
             yield "data: [DONE]\n\n"
             return
 
         # Rerank
-        reranked = self.reranker.rerank(question, retrieved)
+        reranked = await asyncio.to_thread(self.reranker.rerank, question, retrieved)
 
         # Stream generation
         async for chunk in self.generator.generate_stream(question, reranked):
@@ -126,6 +126,15 @@ class NVIDIAReranker:
             logger.error(f"Reranking failed: {e}. Falling back to initial ranking.")
             return documents[:n]
 
+    def warmup(self) -> None:
+        """Rerank a single dummy pair to prime the connection and model."""
+        if not self.config.enable_reranking or not self._client:
+            return
+        self._client.compress_documents(
+            documents=[Document(page_content="warmup")],
+            query="warmup",
+        )
+
     def get_stats(self) -> dict:
         """Get reranker statistics."""
         return {
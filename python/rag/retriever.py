@@ -5,21 +5,51 @@ Combines semantic (vector) search with keyword (BM25-style) search
 for more robust document retrieval.
 """
 
+import asyncio
+import hashlib
 import logging
 import re
+import threading
 from collections import Counter
-from typing import List, Tuple, Optional, Dict, Any
+from typing import List, Sequence, Tuple, Optional, Dict, Any
 from pathlib import Path
 import math
 
+import numpy as np
 from langchain.schema import Document
 from langchain_community.vectorstores import Chroma
 
-from .config import RAGConfig
+from .config import RAGConfig, RetrieverConfig
 from .embedder import NVIDIAEmbedder
 
 logger = logging.getLogger(__name__)
 
+# Compiled once at import; used for every document and query tokenization
+_TOKEN_PATTERN = re.compile(r"\b[a-z0-9]+\b")
+
+# Batch tokenization joins documents with a control character that is never
+# a token, scans the whole blob once, then splits the token stream back apart
+_DOC_SEP = "\x1f"
+_BATCH_TOKEN_PATTERN = re.compile(r"\b[a-z0-9]+\b|\x1f")
+
+
+def hnsw_metadata(rc: RetrieverConfig) -> Dict[str, int]:
+    """Chroma collection metadata for the configured HNSW index parameters."""
+    return {
+        "hnsw:M": rc.hnsw_m,
+        "hnsw:construction_ef": rc.hnsw_construction_ef,
+        "hnsw:search_ef": rc.hnsw_search_ef,
+    }
+
+
+def prewarm_collection(collection: Any) -> None:
+    """Page the HNSW index and stored rows in with one throwaway query."""
+    sample = collection.peek(1)["embeddings"]
+    if sample is None or len(sample) == 0:
+        return
+    probe = np.random.default_rng().standard_normal(len(sample[0])).astype(np.float32)
+    collection.query(query_embeddings=[probe], n_results=1, include=[])
+
 
 class KeywordSearcher:
     """
@@ -35,7 +65,26 @@ class KeywordSearcher:
     @staticmethod
     def _tokenize(text: str) -> List[str]:
         """Simple tokenization: lowercase, alphanumeric tokens."""
-        return re.findall(r"\b[a-z0-9]+\b", text.lower())
+        return _TOKEN_PATTERN.findall(text.lower())
+
+    @classmethod
+    def _tokenize_batch(cls, texts: List[str]) -> List[List[str]]:
+        """
+        Tokenize many texts with a single regex scan.
+
+        Produces the same tokens as calling _tokenize on each text. Falls back
+        to per-text tokenization if any text contains the separator.
+        """
+        if any(_DOC_SEP in text for text in texts):
+            return [cls._tokenize(text) for text in texts]
+
+        token_lists: List[List[str]] = [[]]
+        for token in _BATCH_TOKEN_PATTERN.findall(_DOC_SEP.join(texts).lower()):
+            if token == _DOC_SEP:
+                token_lists.append([])
+            else:
+                token_lists[-1].append(token)
+        return token_lists if texts else []
 
     def index(self, documents: List[Document]) -> None:
         """Index documents for keyword search."""
@@ -44,14 +93,12 @@ class KeywordSearcher:
 
         doc_freq: Counter = Counter()
 
-        for doc in documents:
-            tokens = self._tokenize(doc.page_content)
+        for tokens in self._tokenize_batch([doc.page_content for doc in documents]):
             tf = Counter(tokens)
             self._doc_term_freqs.append(tf)
 
             # Count unique terms per document
-            for term in set(tokens):
-                doc_freq[term] += 1
+            doc_freq.update(tf.keys())
 
         # Compute IDF
         n_docs = len(documents)
@@ -115,6 +162,9 @@ class HybridRetriever:
         self._vector_store: Optional[Chroma] = None
         self._keyword_searcher = KeywordSearcher()
         self._total_documents: int = 0
+        self._keyword_lock = threading.RLock()
+        self._keyword_dirty = False
+        self._keyword_timer: Optional[threading.Timer] = None
 
     @staticmethod
     def _is_missing_collection_error(error: Exception) -> bool:
@@ -131,8 +181,29 @@ class HybridRetriever:
             collection_name=self.config.collection_name,
             embedding_function=self.embedder._client,
             persist_directory=persist_dir,
+            collection_metadata=hnsw_metadata(self.config.retriever),
         )
 
+    def indexed_chunks(self, source_hash: str) -> List[Dict[str, Any]]:
+        """Metadata of stored chunks whose source file has this content hash."""
+        if self._vector_store is None:
+            raise RuntimeError("Retriever not initialized")
+        try:
+            res = self._vector_store._collection.get(
+                where={"source_hash": source_hash}, include=["metadatas"]
+            )
+        except Exception as e:
+            if not self._is_missing_collection_error(e):
+                raise
+            return []
+        return [meta or {} for meta in res["metadatas"] or []]
+
+    def warmup(self) -> None:
+        """Page the HNSW index and stored rows in with one throwaway query."""
+        if self._vector_store is None:
+            raise RuntimeError("Retriever not initialized")
+        prewarm_collection(self._vector_store._collection)
+
     def _recover_missing_collection(self) -> None:
         """Recover from a stale/deleted collection handle by recreating it."""
         self._total_documents = 0
@@ -235,7 +306,10 @@ class HybridRetriever:
                         results.get("metadatas") or [],
                     )
                 ]
-                self._keyword_searcher.index(docs)
+                # Build aside and swap, so concurrent searches see a whole index
+                searcher = KeywordSearcher()
+                searcher.index(docs)
+                self._keyword_searcher = searcher
                 logger.info(f"Keyword index built with {len(docs)} documents")
         except Exception as e:
             if self._is_missing_collection_error(e):
@@ -246,21 +320,79 @@ class HybridRetriever:
                 return
             logger.warning(f"Failed to rebuild keyword index: {e}")
 
-    def add_documents(self, documents: List[Document]) -> int:
-        """
-        Add documents to the retriever (both vector and keyword index).
+    def _schedule_keyword_rebuild(self) -> None:
+        """Mark the keyword index stale and (re)start the debounce timer."""
+        delay = self.config.retriever.keyword_rebuild_delay_seconds
+        if delay <= 0:
+            self._rebuild_keyword_index()
+            return
 
-        Args:
-            documents: Documents to add
+        with self._keyword_lock:
+            self._keyword_dirty = True
+            if self._keyword_timer is not None:
+                self._keyword_timer.cancel()
+            self._keyword_timer = threading.Timer(delay, self.flush_keyword_index)
+            self._keyword_timer.daemon = True
+            self._keyword_timer.start()
+
+    def flush_keyword_index(self) -> None:
+        """Run a pending keyword index rebuild now, if one is scheduled."""
+        with self._keyword_lock:
+            if self._keyword_timer is not None:
+                self._keyword_timer.cancel()
+                self._keyword_timer = None
+            if not self._keyword_dirty:
+                return
+            self._keyword_dirty = False
+            self._rebuild_keyword_index()
 
-        Returns:
-            Number of documents added
-        """
-        if self._vector_store is None:
-            raise RuntimeError("Retriever not initialized")
+    @staticmethod
+    def _document_id(doc: Document) -> str:
+        """Stable id from source and content, so re-ingesting a file overwrites its chunks."""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(str(doc.metadata.get("source", "")).encode())
+        h.update(b"\0")
+        h.update(doc.page_content.encode())
+        return h.hexdigest()
+
+    def _upsert(
+        self,
+        documents: List[Document],
+        embeddings: Sequence[Sequence[float]],
+    ) -> None:
+        """Write documents with precomputed embeddings to the collection."""
+        assert self._vector_store is not None
+        ids = [self._document_id(doc) for doc in documents]
+
+        # Chroma rejects repeated ids within one call; keep the last copy
+        rows = {doc_id: i for i, doc_id in enumerate(ids)}
+        if len(rows) < len(ids):
+            keep = sorted(rows.values())
+            ids = [ids[i] for i in keep]
+            documents = [documents[i] for i in keep]
+            embeddings = [embeddings[i] for i in keep]
+
+        # A single call is cheapest, but Chroma caps rows per call
+        collection = self._vector_store._collection
+        max_batch = self._vector_store._client.get_max_batch_size()
+        for start in range(0, len(ids), max_batch):
+            end = start + max_batch
+            collection.upsert(
+                ids=ids[start:end],
+                embeddings=embeddings[start:end],
+                documents=[doc.page_content for doc in documents[start:end]],
+                # Chroma rejects empty metadata dicts; None is accepted
+                metadatas=[doc.metadata or None for doc in documents[start:end]],
+            )
 
+    def _index_embedded(
+        self,
+        documents: List[Document],
+        embeddings: Sequence[Sequence[float]],
+    ) -> int:
+        """Store embedded documents and refresh the keyword index."""
         try:
-            self._vector_store.add_documents(documents)
+            self._upsert(documents, embeddings)
         except Exception as e:
             if not self._is_missing_collection_error(e):
                 raise
@@ -269,19 +401,123 @@ class HybridRetriever:
                 "Collection missing during add_documents; recreating and retrying"
             )
             self._recover_missing_collection()
-            assert self._vector_store is not None
-            self._vector_store.add_documents(documents)
+            self._upsert(documents, embeddings)
 
-        self._total_documents += len(documents)
+        # Upserts may overwrite existing rows, so count rather than add
+        self._total_documents = self._vector_store._collection.count()
 
-        # Rebuild keyword index
-        self._rebuild_keyword_index()
+        # Rebuild keyword index (debounced across back-to-back ingests)
+        self._schedule_keyword_rebuild()
 
         logger.info(
             f"Added {len(documents)} documents (total: {self._total_documents})"
         )
         return len(documents)
 
+    def _pending_embeddings(
+        self, documents: List[Document]
+    ) -> Tuple[List[Optional[Sequence[float]]], List[str]]:
+        """
+        Vectors already stored for these documents (None where missing), and
+        the texts that still need embedding (the embedder collapses repeats).
+
+        Ids derive from source and text, so a stored row under the same id
+        holds exactly this text's vector: re-ingests skip the API entirely.
+        """
+        ids = list(dict.fromkeys(self._document_id(doc) for doc in documents))
+        stored = {}
+        try:
+            # Chroma caps ids per call as it does rows per upsert
+            collection = self._vector_store._collection
+            max_batch = self._vector_store._client.get_max_batch_size()
+            for start in range(0, len(ids), max_batch):
+                res = collection.get(ids=ids[start : start + max_batch], include=["embeddings"])
+                stored.update(zip(res["ids"], res["embeddings"]))
+        except Exception as e:
+            if not self._is_missing_collection_error(e):
+                raise
+            stored = {}
+
+        vectors = [stored.get(self._document_id(doc)) for doc in documents]
+        missing = [doc.page_content for doc, vector in zip(documents, vectors) if vector is None]
+        return vectors, missing
+
+    @staticmethod
+    def _merge_embeddings(
+        documents: List[Document],
+        vectors: List[Optional[Sequence[float]]],
+        texts: List[str],
+        embedded: Sequence[Sequence[float]],
+    ) -> List[Sequence[float]]:
+        by_text = dict(zip(texts, embedded))
+        return [
+            vector if vector is not None else by_text[doc.page_content]
+            for doc, vector in zip(documents, vectors)
+        ]
+
+    @staticmethod
+    def _known_token_counts(
+        documents: List[Document], texts: List[str]
+    ) -> Optional[List[int]]:
+        """Chunker token counts for texts, when every one carries them."""
+        by_text = {doc.page_content: doc.metadata.get("chunk_size_tokens") for doc in documents}
+        counts = [by_text.get(text) for text in texts]
+        return counts if all(isinstance(n, int) for n in counts) else None
+
+    def add_documents(self, documents: List[Document]) -> int:
+        """
+        Add documents to the retriever (both vector and keyword index).
+
+        Args:
+            documents: Documents to add
+
+        Returns:
+            Number of documents added
+        """
+        if self._vector_store is None:
+            raise RuntimeError("Retriever not initialized")
+
+        if not documents:
+            return 0
+
+        # Embed new texts up front in batches, then hand Chroma the vectors
+        vectors, texts = self._pending_embeddings(documents)
+        embedded = (
+            self.embedder.embed_documents(
+                texts, token_counts=self._known_token_counts(documents, texts)
+            )
+            if texts
+            else []
+        )
+        embeddings = self._merge_embeddings(documents, vectors, texts, embedded)
+
+        return self._index_embedded(documents, embeddings)
+
+    async def aadd_documents(self, documents: List[Document]) -> int:
+        """
+        Async variant of add_documents.
+
+        Embedding batches run concurrently; the local Chroma write runs in a
+        worker thread so the event loop stays free.
+        """
+        if self._vector_store is None:
+            raise RuntimeError("Retriever not initialized")
+
+        if not documents:
+            return 0
+
+        vectors, texts = await asyncio.to_thread(self._pending_embeddings, documents)
+        embedded = (
+            await self.embedder.aembed_documents(
+                texts, token_counts=self._known_token_counts(documents, texts)
+            )
+            if texts
+            else []
+        )
+        embeddings = self._merge_embeddings(documents, vectors, texts, embedded)
+
+        return await asyncio.to_thread(self._index_embedded, documents, embeddings)
+
     def retrieve(
         self,
         query: str,
@@ -301,12 +537,63 @@ class HybridRetriever:
             raise RuntimeError("Retriever not initialized")
 
         k = top_k or self.config.retriever.top_k
-        cfg = self.config.retriever
 
         # ── Semantic search ────────────────────────────────────────────────
+        query_embedding = self.embedder.embed_query(query)
+        semantic_results = self._semantic_search(query_embedding, k)
+        if semantic_results is None or not self._hybrid_enabled:
+            return semantic_results or []
+
+        # ── Keyword search + fusion ────────────────────────────────────────
+        return self._fuse(semantic_results, self._keyword_search(query, k), k)
+
+    async def aretrieve(
+        self,
+        query: str,
+        top_k: Optional[int] = None,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Async variant of retrieve.
+
+        Keyword search runs in a worker thread while the query embedding is
+        awaited, so the local and remote halves of hybrid search overlap.
+        """
+        if self._vector_store is None:
+            raise RuntimeError("Retriever not initialized")
+
+        k = top_k or self.config.retriever.top_k
+        keyword_task = (
+            asyncio.ensure_future(asyncio.to_thread(self._keyword_search, query, k))
+            if self._hybrid_enabled
+            else None
+        )
         try:
-            semantic_results = self._vector_store.similarity_search_with_score(
-                query, k=k
+            query_embedding = await self.embedder.aembed_query(query)
+            semantic_results = await asyncio.to_thread(
+                self._semantic_search, query_embedding, k
+            )
+        except BaseException:
+            if keyword_task is not None:
+                keyword_task.cancel()
+            raise
+
+        if semantic_results is None or keyword_task is None:
+            if keyword_task is not None:
+                keyword_task.cancel()
+            return semantic_results or []
+        return self._fuse(semantic_results, await keyword_task, k)
+
+    @property
+    def _hybrid_enabled(self) -> bool:
+        return self.config.retriever.use_hybrid and self.config.enable_hybrid_search
+
+    def _semantic_search(
+        self, query_embedding: List[float], k: int
+    ) -> Optional[List[Tuple[Document, float]]]:
+        """Vector search; None when the collection had to be recreated."""
+        try:
+            return self._vector_store.similarity_search_by_vector_with_relevance_scores(
+                query_embedding, k=k
             )
         except Exception as e:
             if not self._is_missing_collection_error(e):
@@ -316,15 +603,21 @@ class HybridRetriever:
                 "Collection missing during retrieval; recreating and returning empty results"
             )
             self._recover_missing_collection()
-            return []
-
-        if not cfg.use_hybrid or not self.config.enable_hybrid_search:
-            return semantic_results
+            return None
 
-        # ── Keyword search ─────────────────────────────────────────────────
-        keyword_results = self._keyword_searcher.search(query, top_k=k)
+    def _keyword_search(self, query: str, k: int) -> List[Tuple[Document, float]]:
+        if self._keyword_dirty:
+            self.flush_keyword_index()
+        return self._keyword_searcher.search(query, top_k=k)
 
-        # ── Score fusion (Reciprocal Rank Fusion) ──────────────────────────
+    def _fuse(
+        self,
+        semantic_results: List[Tuple[Document, float]],
+        keyword_results: List[Tuple[Document, float]],
+        k: int,
+    ) -> List[Tuple[Document, float]]:
+        """Score fusion (Reciprocal Rank Fusion) with the configured weights."""
+        cfg = self.config.retriever
         return self._reciprocal_rank_fusion(
             semantic_results,
             keyword_results,
@@ -386,8 +679,17 @@ class HybridRetriever:
             "persist_dir": self.config.chroma_persist_dir,
         }
 
+    def close(self) -> None:
+        """Apply any pending keyword index rebuild and stop the debounce timer."""
+        self.flush_keyword_index()
+
     def clear(self) -> None:
         """Clear all documents."""
+        with self._keyword_lock:
+            if self._keyword_timer is not None:
+                self._keyword_timer.cancel()
+                self._keyword_timer = None
+            self._keyword_dirty = False
         if self._vector_store is not None:
             try:
                 self._vector_store.delete_collection()
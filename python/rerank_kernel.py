@@ -0,0 +1,44 @@
+"""
+Asymmetric-distance (ADC) scoring kernel for SQ8 vectors
+
+Scores an fp32 query against int8 rows with per-row scales. Uses a Numba
+JIT kernel when numba is installed, otherwise falls back to NumPy.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _adc_kernel(q_f32, codes_i8, scales, out_scores):
+        for i in prange(codes_i8.shape[0]):
+            acc = np.float32(0.0)
+            for j in range(q_f32.shape[0]):
+                acc += q_f32[j] * codes_i8[i, j]
+            out_scores[i] = acc * scales[i]
+
+
+def adc_scores(q_f32: np.ndarray, codes_i8: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    """Dequantized dot products: (codes_i8 @ q_f32) * scales"""
+    if not NUMBA_AVAILABLE:
+        return (codes_i8 @ q_f32) * scales
+    out = np.empty(codes_i8.shape[0], dtype=np.float32)
+    _adc_kernel(q_f32, codes_i8, scales, out)
+    return out
+
+
+def warmup(dim: int = 8) -> None:
+    """Compile the kernel ahead of the first query"""
+    adc_scores(
+        np.zeros(dim, dtype=np.float32),
+        np.zeros((2, dim), dtype=np.int8),
+        np.ones(2, dtype=np.float32),
+    )
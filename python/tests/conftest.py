@@ -0,0 +1,45 @@
+"""
+Shared test fixtures.
+
+StubEmbeddings stands in for NVIDIAEmbeddings in the embedder, retriever and
+standalone service suites; subclass it where a test needs extra recording.
+"""
+
+import pytest
+
+
+class StubEmbeddings:
+    """Deterministic embeddings that record each call."""
+
+    def __init__(self):
+        self.document_batches = []
+        self.queries = []
+        self.query_batches = []
+
+    @staticmethod
+    def _vector(text):
+        return [float(len(text)), float(text.count(" ")), 1.0]
+
+    def embed_documents(self, texts):
+        self.document_batches.append(list(texts))
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return self._vector(text)
+
+    def _embed(self, texts, model_type):
+        self.query_batches.append(list(texts))
+        self.queries.extend(texts)
+        return [self._vector(t) for t in texts]
+
+    async def aembed_documents(self, texts):
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+
+@pytest.fixture
+def stub_embeddings():
+    return StubEmbeddings()
@@ -0,0 +1,170 @@
+"""
+Unit Tests for Dynamic Batcher Module
+
+Tests request coalescing, deduplication, and error propagation.
+"""
+
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from rag.batcher import DynamicBatcher
+
+
+class RecordingBatchFn:
+    """Batch function that records each call."""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, texts):
+        with self._lock:
+            self.calls.append(list(texts))
+        if self.fail:
+            raise RuntimeError("upstream unavailable")
+        return [[float(len(t))] for t in texts]
+
+
+class TestDynamicBatcher:
+    """Tests for the thread-safe micro-batcher."""
+
+    def test_single_request(self):
+        fn = RecordingBatchFn()
+        batcher = DynamicBatcher(fn, max_wait_ms=1)
+        try:
+            assert batcher.embed("hello") == [5.0]
+            assert fn.calls == [["hello"]]
+        finally:
+            batcher.close()
+
+    def test_concurrent_requests_are_coalesced(self):
+        fn = RecordingBatchFn()
+        batcher = DynamicBatcher(fn, max_batch=64, max_wait_ms=200)
+        texts = [f"query {'x' * i}" for i in range(16)]
+        try:
+            futures = [batcher.submit(t) for t in texts]
+            results = [f.result(timeout=5) for f in futures]
+        finally:
+            batcher.close()
+
+        assert results == [[float(len(t))] for t in texts]
+        assert len(fn.calls) == 1
+
+    def test_max_batch_splits_requests(self):
+        fn = RecordingBatchFn()
+        batcher = DynamicBatcher(fn, max_batch=4, max_wait_ms=200)
+        try:
+            futures = [batcher.submit(f"q{i}") for i in range(10)]
+            [f.result(timeout=5) for f in futures]
+        finally:
+            batcher.close()
+
+        assert [len(c) for c in fn.calls] == [4, 4, 2]
+
+    def test_duplicate_texts_share_a_slot(self):
+        fn = RecordingBatchFn()
+        batcher = DynamicBatcher(fn, max_wait_ms=200)
+        try:
+            futures = [batcher.submit("same") for _ in range(5)]
+            results = [f.result(timeout=5) for f in futures]
+        finally:
+            batcher.close()
+
+        assert results == [[4.0]] * 5
+        assert fn.calls == [["same"]]
+        assert batcher.get_stats()["requests"] == 5
+
+    def test_errors_reach_every_caller(self):
+        batcher = DynamicBatcher(RecordingBatchFn(fail=True), max_wait_ms=50)
+        try:
+            futures = [batcher.submit(f"q{i}") for i in range(3)]
+            for f in futures:
+                with pytest.raises(RuntimeError, match="upstream unavailable"):
+                    f.result(timeout=5)
+        finally:
+            batcher.close()
+
+    def test_blocking_callers_from_threads(self):
+        fn = RecordingBatchFn()
+        batcher = DynamicBatcher(fn, max_batch=32, max_wait_ms=50)
+        try:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                results = list(pool.map(batcher.embed, [f"q{i}" for i in range(8)]))
+        finally:
+            batcher.close()
+
+        assert results == [[float(len(f"q{i}"))] for i in range(8)]
+        assert len(fn.calls) < 8
+
+    def test_short_result_fails_every_caller(self):
+        batcher = DynamicBatcher(lambda texts: [[1.0]], max_wait_ms=200)
+        try:
+            futures = [batcher.submit(f"q{i}") for i in range(3)]
+            for f in futures:
+                with pytest.raises(RuntimeError, match="1 vectors for 3 texts"):
+                    f.result(timeout=5)
+        finally:
+            batcher.close()
+
+    def test_blocking_embed_times_out(self):
+        release = threading.Event()
+
+        def stalled(texts):
+            release.wait(5)
+            return [[0.0] for _ in texts]
+
+        batcher = DynamicBatcher(stalled, max_wait_ms=1, timeout_s=0.05)
+        try:
+            with pytest.raises(TimeoutError):
+                batcher.embed("slow")
+        finally:
+            release.set()
+            batcher.close()
+
+    def test_cancelled_request_is_skipped(self):
+        fn = RecordingBatchFn()
+        batcher = DynamicBatcher(fn, max_wait_ms=200)
+        try:
+            dropped = batcher.submit("dropped")
+            assert dropped.cancel()
+            assert batcher.embed("kept") == [4.0]
+        finally:
+            batcher.close()
+
+        assert fn.calls == [["kept"]]
+
+    def test_close_races_with_submit(self):
+        fn = RecordingBatchFn()
+        batcher = DynamicBatcher(fn, max_wait_ms=1)
+        accepted = []
+
+        def submit_many():
+            for i in range(200):
+                try:
+                    accepted.append(batcher.submit(f"q{i}"))
+                except RuntimeError:
+                    return
+
+        thread = threading.Thread(target=submit_many)
+        thread.start()
+        batcher.close()
+        thread.join()
+
+        assert all(f.result(timeout=5) for f in accepted)
+
+    def test_submit_after_close_raises(self):
+        batcher = DynamicBatcher(RecordingBatchFn(), max_wait_ms=1)
+        batcher.close()
+        with pytest.raises(RuntimeError):
+            batcher.submit("late")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -12,7 +12,8 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 from langchain.schema import Document
 from rag.config import RAGConfig, ChunkingConfig
-from rag.chunker import SemanticChunker, ChunkStats
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from rag.chunker import SemanticChunker, ChunkStats, LiteralSeparatorSplitter, get_tokenizer
 
 
 @pytest.fixture
@@ -60,6 +61,10 @@ class TestTokenLength:
         long = chunker.token_length("Hello world this is a longer sentence with more tokens")
         assert long > short
 
+    def test_batch_lengths_match_single(self, chunker):
+        texts = ["", "hello", "The quick brown fox jumps over the lazy dog.", "<|endoftext|>"]
+        assert chunker.token_lengths(texts) == [chunker.token_length(t) for t in texts]
+
 
 class TestChunkDocuments:
     """Tests for document chunking."""
@@ -96,7 +101,7 @@ class TestChunkDocuments:
             assert "total_chunks" in chunk.metadata
             assert "chunk_size_tokens" in chunk.metadata
             assert "source_name" in chunk.metadata
-            assert "preview" in chunk.metadata
+            assert "preview" not in chunk.metadata
             assert chunk.metadata["source_name"] == "test.pdf"
 
     def test_chunk_preserves_original_metadata(self, small_chunker):
@@ -132,6 +137,107 @@ class TestChunkDocuments:
         assert stats.source_pages >= 2  # At least 2 unique pages
         assert stats.total_chunks > 3   # More chunks than pages
 
+    def test_stats_match_chunk_metadata(self, small_chunker):
+        docs = [Document(page_content="Token counting test. " * 80, metadata={"page": 0})]
+        chunks, stats = small_chunker.chunk_documents(docs)
+
+        counts = [c.metadata["chunk_size_tokens"] for c in chunks]
+        assert stats.total_tokens == sum(counts)
+        assert stats.max_tokens == max(counts)
+
+    def test_chunkers_share_one_tokenizer(self, config):
+        first = SemanticChunker(config)
+        second = SemanticChunker(config)
+
+        assert first._tokenizer is second._tokenizer
+        assert get_tokenizer.cache_info().currsize >= 1
+
+
+class TestLiteralSeparatorSplitter:
+    """The regex-free splitter must match LangChain's literal-separator output."""
+
+    TEXT = (
+        "Entropy measures disorder.\n\nIt always increases; in isolated systems, "
+        "at least. Why? Because microstates! " * 40
+        + "\n\n\nSection two:\n" + "word " * 300
+    )
+
+    @pytest.mark.parametrize("keep_separator", [True, False, "start", "end"])
+    @pytest.mark.parametrize("size,overlap", [(400, 80), (60, 0), (15, 5)])
+    def test_matches_recursive_splitter(self, keep_separator, size, overlap):
+        kwargs = dict(
+            chunk_size=size,
+            chunk_overlap=overlap,
+            separators=ChunkingConfig().separators,
+            keep_separator=keep_separator,
+        )
+        expected = RecursiveCharacterTextSplitter(**kwargs).split_text(self.TEXT)
+        assert LiteralSeparatorSplitter(**kwargs).split_text(self.TEXT) == expected
+
+
+class TestMergeAndRegularize:
+    """Tests for the tiny-chunk merge and oversized resplit pass."""
+
+    def test_tiny_tail_folds_into_previous(self, small_chunker):
+        text = "word " * 30 + "end."
+        merged = small_chunker._merge_and_regularize(
+            text, ["word " * 20, "word " * 10 + "end."], [20, 11]
+        )
+        assert len(merged) == 1
+        assert merged[0][0] == text
+
+    def test_overlap_is_not_duplicated(self, small_chunker):
+        text = "alpha beta gamma delta"
+        merged = small_chunker._merge_and_regularize(
+            text, ["alpha beta gamma", "gamma delta"], [4, 3]
+        )
+        assert merged == [(text, small_chunker.token_length(text))]
+
+    def test_merge_respects_chunk_size(self, small_chunker):
+        text = "a" * 160 + "b" * 160
+        merged = small_chunker._merge_and_regularize(
+            text, ["a" * 160, "b" * 160], [40, 40]
+        )
+        assert [t for t, _ in merged] == ["a" * 160, "b" * 160]
+
+    def test_disabled_keeps_pieces(self, small_chunk_config):
+        small_chunk_config.chunking.min_chunk_tokens = 0
+        chunker = SemanticChunker(small_chunk_config)
+        text = "one two"
+        assert chunker._merge_and_regularize(text, ["one", "two"], [1, 1]) == [
+            ("one", 1), ("two", 1)
+        ]
+
+    def test_oversized_chunk_is_resplit(self, small_chunker):
+        text = "Sentence here. " * 60
+        pieces = small_chunker._merge_and_regularize(
+            text.strip(), [text.strip()], [small_chunker.token_length(text)]
+        )
+        assert len(pieces) > 1
+        assert all(n <= 50 for _, n in pieces)
+
+    def test_chunks_stay_within_page(self, small_chunker):
+        docs = [
+            Document(page_content="Short page.", metadata={"page": 0}),
+            Document(page_content="Another short page.", metadata={"page": 1}),
+        ]
+        chunks, _ = small_chunker.chunk_documents(docs)
+        assert [c.metadata["page"] for c in chunks] == [0, 1]
+
+
+class TestWarmup:
+    """Tests for chunker warmup."""
+
+    def test_missing_tokenizer_is_reported(self, chunker):
+        chunker._tokenizer = None
+        with pytest.raises(RuntimeError, match="tiktoken"):
+            chunker.warmup()
+
+    def test_warm_with_tokenizer(self, chunker):
+        if chunker._tokenizer is None:
+            pytest.skip("tiktoken encoding not available offline")
+        chunker.warmup()
+
 
 class TestChunkText:
     """Tests for raw text chunking."""
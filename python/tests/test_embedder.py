@@ -0,0 +1,529 @@
+"""
+Unit Tests for NVIDIA Embedder Module
+
+Tests batching, concurrency, and failure fallback using a stub client
+(no API key needed).
+"""
+
+import asyncio
+import itertools
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from rag.config import RAGConfig
+import rag.embedding_cache as embedding_cache_module
+from rag.embedder import NVIDIAEmbedder
+from rag.embedding_cache import EmbeddingCache
+from tests.conftest import StubEmbeddings
+
+
+class StubEmbeddingsClient(StubEmbeddings):
+    """Shared stub that can reject multi-text batches and tracks concurrency."""
+
+    def __init__(self, fail_batches: bool = False):
+        super().__init__()
+        self.fail_batches = fail_batches
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def embed_documents(self, texts):
+        vectors = super().embed_documents(texts)
+        if self.fail_batches and len(texts) > 1:
+            raise RuntimeError("payload too large")
+        return vectors
+
+    async def aembed_documents(self, texts):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            return self.embed_documents(texts)
+        finally:
+            self.in_flight -= 1
+
+
+class ThreadedStubClient(StubEmbeddingsClient):
+    """Stub whose sync batch calls take a moment, to observe overlap."""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(0.02)
+            return super().embed_documents(texts)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+@pytest.fixture
+def config():
+    cfg = RAGConfig(nvidia_api_key="test-key")
+    cfg.embedding.batch_size = 4
+    return cfg
+
+
+@pytest.fixture
+def stub():
+    return StubEmbeddingsClient()
+
+
+@pytest.fixture
+def embedder(config, stub):
+    e = NVIDIAEmbedder(config)
+    e._client = stub
+    return e
+
+
+class TestEmbedDocuments:
+    """Tests for batched document embedding."""
+
+    def test_requires_initialization(self, config):
+        with pytest.raises(RuntimeError):
+            NVIDIAEmbedder(config).embed_documents(["text"])
+
+    def test_batches_by_configured_size(self, embedder, stub):
+        texts = [f"doc {i}" for i in range(10)]
+        vectors = embedder.embed_documents(texts)
+
+        assert len(vectors) == 10
+        assert [len(c) for c in stub.document_batches] == [4, 4, 2]
+
+    def test_explicit_batch_size_overrides_config(self, embedder, stub):
+        embedder.embed_documents([f"doc {i}" for i in range(6)], batch_size=3)
+        assert [len(c) for c in stub.document_batches] == [3, 3]
+
+    def test_preserves_input_order(self, embedder):
+        texts = ["a", "bbbb", "cc", "ddddddd", "eee"]
+        vectors = embedder.embed_documents(texts)
+        assert vectors.tolist() == [StubEmbeddingsClient._vector(t) for t in texts]
+
+    def test_groups_similar_lengths(self, embedder, stub):
+        texts = ["x" * n for n in (1, 90, 2, 80, 3, 70, 4, 60)]
+        vectors = embedder.embed_documents(texts)
+
+        assert [len(t) for t in stub.document_batches[0]] == [1, 2, 3, 4]
+        assert [len(t) for t in stub.document_batches[1]] == [60, 70, 80, 90]
+        assert vectors.tolist() == [StubEmbeddingsClient._vector(t) for t in texts]
+
+    def test_sort_by_length_opt_out(self, embedder, stub):
+        texts = ["x" * n for n in (1, 90, 2, 80)]
+        embedder.embed_documents(texts, sort_by_length=False)
+        assert stub.document_batches == [texts]
+
+    def test_token_budget_closes_batches(self, config, stub):
+        config.embedding.max_batch_tokens = 100
+        e = NVIDIAEmbedder(config)
+        e._client = stub
+        e._count_tokens = lambda texts: [len(t) for t in texts]  # 1 token per char
+
+        texts = ["a" * 60, "b" * 30, "c" * 30, "d" * 10]
+        vectors = e.embed_documents(texts)
+
+        assert all(sum(len(t) for t in c) <= 100 for c in stub.document_batches)
+        assert [len(c) for c in stub.document_batches] == [3, 1]
+        assert vectors.tolist() == [StubEmbeddingsClient._vector(t) for t in texts]
+
+    def test_token_lengths_are_cached(self, embedder):
+        encoded = []
+        count = embedder._count_tokens
+        embedder._count_tokens = lambda texts: encoded.append(list(texts)) or count(texts)
+
+        embedder.token_length("repeated text")
+        lengths = embedder.token_lengths(["repeated text", "new", "new", "other"])
+
+        assert encoded == [["repeated text"], ["new", "other"]]
+        assert lengths[0] == embedder.token_length("repeated text")
+        assert lengths[1] == lengths[2]
+
+    def test_token_cache_is_bounded(self, config):
+        config.embedding.token_cache_size = 2
+        e = NVIDIAEmbedder(config)
+        e.token_lengths(["a", "b", "c"])
+        assert list(e._token_cache) == ["b", "c"]
+
+    def test_failed_batch_falls_back_to_single_requests(self, config):
+        stub = StubEmbeddingsClient(fail_batches=True)
+        e = NVIDIAEmbedder(config)
+        e._client = stub
+
+        texts = ["one", "two", "three"]
+        vectors = e.embed_documents(texts, sort_by_length=False)
+
+        assert vectors.tolist() == [StubEmbeddingsClient._vector(t) for t in texts]
+        assert stub.document_batches[1:] == [["one"], ["two"], ["three"]]
+
+    def test_replacing_client_rebinds_methods(self, embedder, stub):
+        replacement = StubEmbeddingsClient()
+        embedder._client = replacement
+        embedder.embed_documents(["text"])
+
+        assert stub.document_batches == []
+        assert replacement.document_batches == [["text"]]
+
+    def test_empty_input(self, embedder, stub):
+        assert embedder.embed_documents([]).shape[0] == 0
+        assert stub.document_batches == []
+
+    def test_returns_contiguous_float32_array(self, embedder):
+        vectors = embedder.embed_documents([f"doc {'x' * i}" for i in range(7)])
+        assert vectors.dtype == np.float32
+        assert vectors.shape == (7, 3)
+        assert vectors.flags["C_CONTIGUOUS"]
+
+    def test_batches_overlap_on_worker_threads(self, config):
+        stub = ThreadedStubClient()
+        config.embedding.concurrency = 3
+        e = NVIDIAEmbedder(config)
+        e._client = stub
+
+        texts = [f"doc {'x' * i}" for i in range(20)]
+        vectors = e.embed_documents(texts)
+
+        assert vectors.tolist() == [StubEmbeddingsClient._vector(t) for t in texts]
+        assert 1 < stub.max_in_flight <= 3
+
+    def test_duplicate_texts_are_embedded_once(self, embedder, stub):
+        texts = ["header", "body", "header"]
+        vectors = embedder.embed_documents(texts, token_counts=[1, 2, 1])
+
+        assert vectors.tolist() == [StubEmbeddingsClient._vector(t) for t in texts]
+        assert sorted(t for call in stub.document_batches for t in call) == ["body", "header"]
+
+    def test_async_duplicate_texts_are_embedded_once(self, embedder, stub):
+        vectors = asyncio.run(embedder.aembed_documents(["x", "x", "y"]))
+
+        assert vectors.tolist() == [StubEmbeddingsClient._vector(t) for t in ["x", "x", "y"]]
+        assert sorted(t for call in stub.document_batches for t in call) == ["x", "y"]
+
+
+class TestRateLimit:
+    """Tests for the token-bucket rate limiter."""
+
+    def test_burst_up_to_rpm_is_free(self, config):
+        config.rate_limit_rpm = 5
+        e = NVIDIAEmbedder(config)
+        assert [e._rate_limit_wait() for _ in range(5)] == [0.0] * 5
+
+    def test_empty_bucket_spaces_callers(self, config):
+        config.rate_limit_rpm = 60  # One token per second
+        e = NVIDIAEmbedder(config)
+        for _ in range(60):
+            e._rate_limit_wait()
+
+        first, second = e._rate_limit_wait(), e._rate_limit_wait()
+        assert 0.9 < first <= 1.0
+        assert 1.9 < second <= 2.0
+
+    def test_refills_over_time(self, config, monkeypatch):
+        clock = [100.0]
+        monkeypatch.setattr(time, "monotonic", lambda: clock[0])
+        config.rate_limit_rpm = 60
+        e = NVIDIAEmbedder(config)
+        for _ in range(60):
+            e._rate_limit_wait()
+
+        clock[0] += 3.0
+        assert [e._rate_limit_wait() for _ in range(3)] == [0.0] * 3
+        assert e._rate_limit_wait() == pytest.approx(1.0)
+
+    def test_requests_are_counted(self, embedder):
+        embedder.embed_documents(["a", "b", "c", "d", "e"])
+        assert embedder.get_stats()["total_requests"] == 2
+
+
+class TestPlanBatches:
+    """Tests for batch planning."""
+
+    def test_oversized_text_gets_own_batch(self):
+        texts = ["small", "huge", "tiny"]
+        order, batches = NVIDIAEmbedder._plan_batches(
+            texts, [5, 500, 4], batch_size=10, max_batch_tokens=100, sort_by_length=True
+        )
+        assert order == [2, 0, 1]
+        assert batches == [["tiny", "small"], ["huge"]]
+
+    def test_zero_budget_uses_batch_size_only(self):
+        _, batches = NVIDIAEmbedder._plan_batches(
+            ["a", "b", "c"], [1000] * 3, batch_size=2, max_batch_tokens=0, sort_by_length=False
+        )
+        assert batches == [["a", "b"], ["c"]]
+
+
+class TestSessionPooling:
+    """Tests for the shared HTTP session."""
+
+    def test_initialize_installs_shared_session(self, config):
+        config.embedding.max_connections = 16
+        e = NVIDIAEmbedder(config).initialize()
+
+        inner = e._client._client
+        session = inner.get_session_fn()
+        assert session is inner.get_session_fn()
+        assert session.get_adapter("https://integrate.api.nvidia.com")._pool_maxsize == 16
+
+        e.close()
+        assert e._session is None
+
+    def test_close_without_initialize(self, config):
+        NVIDIAEmbedder(config).close()
+
+
+class TestQueryCache:
+    """Tests for the query embedding LRU cache."""
+
+    def test_repeated_query_hits_cache(self, embedder, stub):
+        first = embedder.embed_query("what is entropy?")
+        second = embedder.embed_query("what is entropy?")
+
+        assert first == second
+        assert stub.queries == ["what is entropy?"]
+        stats = embedder.get_cache_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_entries_stored_as_float32(self, embedder):
+        first = embedder.embed_query("what is entropy?")
+        second = embedder.embed_query("what is entropy?")
+
+        assert isinstance(second, list)
+        assert second == first
+        assert embedder._query_cache[embedder._cache_key("what is entropy?")].dtype == np.float32
+
+    def test_evicts_least_recently_used(self, config, stub):
+        config.embedding.query_cache_size = 2
+        e = NVIDIAEmbedder(config)
+        e._client = stub
+
+        e.embed_query("a")
+        e.embed_query("b")
+        e.embed_query("a")  # refresh "a"
+        e.embed_query("c")  # evicts "b"
+        e.embed_query("a")
+        e.embed_query("b")
+
+        assert stub.queries == ["a", "b", "c", "b"]
+        assert e.get_cache_stats()["size"] == 2
+
+    def test_zero_size_disables_cache(self, config, stub):
+        config.embedding.query_cache_size = 0
+        e = NVIDIAEmbedder(config)
+        e._client = stub
+
+        e.embed_query("q")
+        e.embed_query("q")
+
+        assert stub.queries == ["q", "q"]
+        assert e.get_cache_stats()["size"] == 0
+
+    def test_concurrent_misses_are_batched(self, config, stub):
+        config.embedding.query_batch_window_ms = 100
+        e = NVIDIAEmbedder(config).initialize()
+        e._client = stub
+        try:
+            with ThreadPoolExecutor(max_workers=6) as pool:
+                vectors = list(pool.map(e.embed_query, [f"q{i}" for i in range(6)]))
+        finally:
+            e.close()
+
+        assert vectors == [StubEmbeddingsClient._vector(f"q{i}") for i in range(6)]
+        assert stub.query_batches  # some misses shared one request
+        assert e.get_cache_stats()["size"] == 6
+
+    def test_async_misses_are_batched_and_cached(self, config, stub):
+        config.embedding.query_batch_window_ms = 100
+        e = NVIDIAEmbedder(config).initialize()
+        e._client = stub
+
+        async def run():
+            return await asyncio.gather(*(e.aembed_query(f"q{i}") for i in range(6)))
+
+        try:
+            vectors = asyncio.run(run())
+            again = asyncio.run(e.aembed_query("q0"))
+        finally:
+            e.close()
+
+        assert vectors == [StubEmbeddingsClient._vector(f"q{i}") for i in range(6)]
+        assert again == vectors[0]
+        assert stub.query_batches  # some misses shared one request
+        assert e.get_cache_stats()["hits"] == 1
+
+    def test_async_without_batcher(self, embedder, stub):
+        assert asyncio.run(embedder.aembed_query("q")) == StubEmbeddingsClient._vector("q")
+        assert embedder.embed_query("q") == StubEmbeddingsClient._vector("q")
+        assert stub.queries == ["q"]
+
+    def test_warmup_bypasses_cache(self, embedder, stub):
+        embedder.warmup()
+        assert stub.queries == ["warmup"]
+        assert embedder.get_cache_stats()["size"] == 0
+        assert embedder.get_stats()["total_requests"] == 1
+
+    def test_clear_cache(self, embedder, stub):
+        embedder.embed_query("q")
+        embedder.clear_cache()
+        embedder.embed_query("q")
+        assert stub.queries == ["q", "q"]
+
+    def test_snapshot_round_trip(self, config, embedder, stub, tmp_path):
+        path = str(tmp_path / "embed_cache.npz")
+        embedder.embed_query("a")
+        embedder.embed_query("b")
+        assert embedder.save_cache(path) == 2
+
+        restored = NVIDIAEmbedder(config)
+        restored._client = stub
+        assert restored.load_cache(path) == 2
+        assert restored.embed_query("a") == StubEmbeddingsClient._vector("a")
+        assert stub.queries == ["a", "b"]
+
+    def test_snapshot_from_other_model_is_ignored(self, config, embedder, tmp_path):
+        path = str(tmp_path / "embed_cache.npz")
+        embedder.embed_query("a")
+        embedder.save_cache(path)
+
+        config.embedding_model = "bge-m3"
+        assert NVIDIAEmbedder(config).load_cache(path) == 0
+
+    def test_load_missing_snapshot(self, embedder, tmp_path):
+        assert embedder.load_cache(str(tmp_path / "missing.npz")) == 0
+
+
+class TestDocumentCache:
+    """Tests for the persistent document embedding cache."""
+
+    @pytest.fixture
+    def cached(self, embedder, tmp_path):
+        embedder.document_cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"))
+        yield embedder
+        embedder.close()
+
+    def test_second_run_skips_cached_texts(self, cached, stub):
+        cached.embed_documents(["a", "b"])
+        vectors = cached.embed_documents(["b", "c", "a"])
+
+        assert vectors.tolist() == [StubEmbeddingsClient._vector(t) for t in ["b", "c", "a"]]
+        assert stub.document_batches[-1] == ["c"]
+        assert cached.get_stats()["document_cache_hits"] == 2
+
+    def test_async_reads_and_writes_cache(self, cached, stub):
+        asyncio.run(cached.aembed_documents(["x", "y"]))
+        calls = len(stub.document_batches)
+        vectors = asyncio.run(cached.aembed_documents(["y", "x"]))
+
+        assert vectors.tolist() == [StubEmbeddingsClient._vector(t) for t in ["y", "x"]]
+        assert len(stub.document_batches) == calls
+
+    def test_cache_survives_reopen(self, config, stub, tmp_path):
+        path = str(tmp_path / "embeddings.sqlite3")
+        first = NVIDIAEmbedder(config)
+        first._client = stub
+        first.document_cache = EmbeddingCache(path)
+        first.embed_documents(["persisted"])
+        first.close()
+
+        second = NVIDIAEmbedder(config)
+        second._client = StubEmbeddingsClient(fail_batches=True)
+        second.document_cache = EmbeddingCache(path)
+        assert second.embed_documents(["persisted"]).tolist() == [
+            StubEmbeddingsClient._vector("persisted")
+        ]
+        assert second._client.document_batches == []
+        second.close()
+
+    def test_entries_are_per_model(self, tmp_path):
+        cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"))
+        cache.put_many("model-a", [b"k"], np.ones((1, 3), dtype=np.float32))
+
+        assert cache.get_many("model-b", [b"k"]) == [None]
+        assert cache.get_many("model-a", [b"k"])[0].tolist() == [1.0, 1.0, 1.0]
+        assert len(cache) == 1
+        cache.close()
+
+    def test_store_without_used_column_is_migrated(self, tmp_path):
+        path = str(tmp_path / "embeddings.sqlite3")
+        with sqlite3.connect(path) as conn:
+            conn.execute(
+                "CREATE TABLE embeddings (model TEXT NOT NULL, digest BLOB NOT NULL, "
+                "vector BLOB NOT NULL, PRIMARY KEY (model, digest)) WITHOUT ROWID"
+            )
+            conn.execute("INSERT INTO embeddings VALUES ('m', x'01', ?)", (np.ones(3, "<f4").tobytes(),))
+        conn.close()
+
+        cache = EmbeddingCache(path, max_rows=2)
+        cache.put_many("m", [b"k"], np.ones((1, 3), dtype=np.float32))
+
+        assert cache.get_many("m", [b"\x01"])[0].tolist() == [1.0, 1.0, 1.0]
+        assert len(cache) == 2
+        cache.close()
+
+    def test_prunes_least_recently_used(self, tmp_path, monkeypatch):
+        clock = itertools.count()
+        monkeypatch.setattr(embedding_cache_module, "time", SimpleNamespace(time=lambda: next(clock)))
+        cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"), max_rows=2)
+        vector = np.ones((1, 3), dtype=np.float32)
+        cache.put_many("m", [b"a"], vector)
+        cache.put_many("m", [b"b"], vector)
+        cache.get_many("m", [b"a"])
+        cache.put_many("m", [b"c"], vector)
+
+        assert len(cache) == 2
+        assert cache.get_many("m", [b"b"]) == [None]
+        assert cache.get_many("m", [b"a"])[0] is not None
+        cache.close()
+
+
+class TestAsyncEmbedDocuments:
+    """Tests for concurrent async document embedding."""
+
+    def test_requires_initialization(self, config):
+        with pytest.raises(RuntimeError):
+            asyncio.run(NVIDIAEmbedder(config).aembed_documents(["text"]))
+
+    def test_matches_sync_results_in_order(self, embedder):
+        texts = [f"document {'x' * i}" for i in range(9)]
+        vectors = asyncio.run(embedder.aembed_documents(texts))
+        assert vectors.tolist() == [StubEmbeddingsClient._vector(t) for t in texts]
+
+    def test_batches_run_concurrently(self, embedder, stub):
+        asyncio.run(embedder.aembed_documents([f"doc {i}" for i in range(16)]))
+        assert len(stub.document_batches) == 4
+        assert stub.max_in_flight > 1
+
+    def test_concurrency_is_bounded(self, config, stub):
+        config.embedding.concurrency = 2
+        e = NVIDIAEmbedder(config)
+        e._client = stub
+
+        asyncio.run(e.aembed_documents([f"doc {i}" for i in range(40)]))
+        assert stub.max_in_flight == 2
+
+    def test_failed_batch_falls_back_to_single_requests(self, config):
+        stub = StubEmbeddingsClient(fail_batches=True)
+        e = NVIDIAEmbedder(config)
+        e._client = stub
+
+        texts = ["one", "two", "three"]
+        vectors = asyncio.run(e.aembed_documents(texts))
+        assert vectors.tolist() == [StubEmbeddingsClient._vector(t) for t in texts]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,151 @@
+"""
+Unit Tests for NVIDIA Generator Module
+
+Tests lazy client creation and prompt formatting with a stub chat client
+(no API key needed).
+"""
+
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from langchain.schema import Document
+import rag.generator as generator_module
+from rag.config import RAGConfig
+from rag.generator import NVIDIAGenerator, STUDY_ASSISTANT_PROMPT
+
+
+class StubChat:
+    """Stand-in for ChatNVIDIA that records constructions and prompts."""
+
+    created = []
+
+    def __init__(self, **kwargs):
+        self.streaming = kwargs.get("streaming", False)
+        self.prompts = []
+        StubChat.created.append(self)
+
+    def invoke(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return SimpleNamespace(content="answer")
+
+    async def ainvoke(self, prompt, **kwargs):
+        return self.invoke(prompt)
+
+    async def astream(self, prompt):
+        self.prompts.append(prompt)
+        for part in ("an", "swer"):
+            yield SimpleNamespace(content=part)
+
+
+@pytest.fixture(autouse=True)
+def stub_chat(monkeypatch):
+    StubChat.created = []
+    monkeypatch.setattr(generator_module, "ChatNVIDIA", StubChat)
+    return StubChat
+
+
+@pytest.fixture
+def config():
+    return RAGConfig(nvidia_api_key="test-key")
+
+
+@pytest.fixture
+def docs():
+    return [(Document(page_content="Entropy measures disorder.", metadata={"page": 1}), 0.9)]
+
+
+class TestPrompt:
+    """Tests for prompt construction."""
+
+    def test_system_prefix_is_fixed(self, config, stub_chat, docs):
+        gen = NVIDIAGenerator(config).initialize()
+        result = gen.generate("What is entropy?", docs)
+        gen.generate("And enthalpy?", docs)
+
+        first, second = stub_chat.created[0].prompts
+        assert [m.type for m in first] == ["system", "human"]
+        assert first[0].content == second[0].content == STUDY_ASSISTANT_PROMPT.system
+        assert result["answer"] == "answer"
+
+    def test_context_precedes_question(self, config, stub_chat, docs):
+        gen = NVIDIAGenerator(config).initialize()
+        gen.generate("What is entropy?", docs)
+
+        user = stub_chat.created[0].prompts[0][1].content
+        assert user.index("Entropy measures disorder.") < user.index("What is entropy?")
+
+    def test_string_template_is_one_user_message(self, config, stub_chat, docs):
+        gen = NVIDIAGenerator(config).initialize()
+        gen.generate("q", docs, prompt_template="Q: {question}\n{context}")
+
+        (messages,) = stub_chat.created[0].prompts
+        assert [m.type for m in messages] == ["human"]
+        assert messages[0].content.startswith("Q: q\n[Document 1")
+
+
+class TestBuildContext:
+    """Tests for the context block."""
+
+    def test_headers_and_separator(self, config):
+        docs = [
+            (Document(page_content="A", metadata={"source_name": "a.pdf", "page": 2, "chunk_id": 7}), 0.9),
+            (Document(page_content="B", metadata={"source": "/tmp/b.pdf"}), 0.5),
+        ]
+        context = NVIDIAGenerator(config)._build_context(docs)
+        assert context == (
+            "[Document 1 | Source: a.pdf, Page: 2, Chunk: 7]\nA"
+            "\n\n---\n\n"
+            "[Document 2 | Source: /tmp/b.pdf, Page: ?, Chunk: 1]\nB"
+        )
+
+    def test_max_chunks(self, config, docs):
+        context = NVIDIAGenerator(config)._build_context(docs * 3, max_chunks=2)
+        assert context.count("[Document") == 2
+
+
+class TestLazyClients:
+    """Tests for deferred ChatNVIDIA construction."""
+
+    def test_initialize_creates_no_clients(self, config, stub_chat):
+        NVIDIAGenerator(config).initialize()
+        assert stub_chat.created == []
+
+    def test_uninitialized_use_raises(self, config):
+        with pytest.raises(RuntimeError):
+            NVIDIAGenerator(config).generate("q", [])
+
+    def test_client_built_once_on_first_use(self, config, stub_chat, docs):
+        gen = NVIDIAGenerator(config).initialize()
+        gen.generate("What is entropy?", docs)
+        gen.generate("What is entropy?", docs)
+
+        assert len(stub_chat.created) == 1
+        assert not stub_chat.created[0].streaming
+
+    def test_streaming_client_only_when_enabled(self, config, stub_chat, docs):
+        config.generator.streaming = False
+        gen = NVIDIAGenerator(config).initialize()
+
+        async def collect():
+            return [frame async for frame in gen.generate_stream("q", docs)]
+
+        frames = asyncio.run(collect())
+        assert frames[-1] == "data: [DONE]\n\n"
+        assert len(stub_chat.created) == 1
+        assert gen.llm_streaming is gen.llm
+
+    def test_streaming_client_is_separate(self, config, stub_chat):
+        gen = NVIDIAGenerator(config).initialize()
+        assert gen.llm_streaming.streaming
+        assert gen.llm_streaming is not gen.llm
+        assert len(stub_chat.created) == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -150,6 +150,31 @@ class TestRAGMetrics:
         metrics.reset()
         assert len(metrics._queries) == 0
 
+    def test_history_is_bounded(self):
+        metrics = RAGMetrics(enabled=True, max_history=3)
+        stages = [StageMetric(stage="test", latency_ms=10)]
+        for i in range(5):
+            metrics.record_query(f"q{i}", stages, 1, 1, 10, success=i != 0)
+
+        assert len(metrics._queries) == 3
+        assert [q["query"] for q in metrics.get_recent_queries(n=2)] == ["q3", "q4"]
+
+        summary = metrics.get_summary()
+        assert summary["total_queries"] == 5
+        assert summary["successful_queries"] == 4
+        assert summary["window_size"] == 3
+
+    def test_prometheus_histograms(self, metrics):
+        prometheus_client = pytest.importorskip("prometheus_client")
+        registry = prometheus_client.REGISTRY
+
+        def count(stage):
+            return registry.get_sample_value("rag_stage_seconds_count", {"stage": stage}) or 0
+
+        before = count("retrieval")
+        metrics.record_query("q", [StageMetric(stage="retrieval", latency_ms=20)], 1, 1, 10)
+        assert count("retrieval") == before + 1
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
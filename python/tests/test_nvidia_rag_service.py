@@ -0,0 +1,778 @@
+"""
+Unit Tests for the standalone NVIDIA RAG Service
+
+Tests ingestion and query helpers with stub embeddings and a temporary
+Chroma collection (no API key needed).
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.testclient import TestClient
+from langchain.schema import Document
+
+import nvidia_rag_service as svc
+from tests.conftest import StubEmbeddings
+
+
+class StubMessage:
+    def __init__(self, content):
+        self.content = content
+
+
+class StubLLM:
+    """Chat model stand-in that only supports the async API."""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def ainvoke(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return StubMessage("stub answer")
+
+    async def astream(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        for token in ["stub", " answer"]:
+            yield StubMessage(token)
+
+
+@pytest.fixture
+def rag(monkeypatch, tmp_path, stub_embeddings):
+    stub = stub_embeddings
+    monkeypatch.setattr(svc, "CHROMA_PERSIST_DIR", str(tmp_path))
+    monkeypatch.setattr(svc, "query_cache", svc.QueryCache(16, 600, 0.97))
+    monkeypatch.setattr(svc, "answer_cache", svc.AnswerCache(16, 300))
+    rag = svc.AppState(stub, None, None, svc.create_vector_store(stub))
+    monkeypatch.setattr(svc.app.state, "rag", rag, raising=False)
+    return rag
+
+
+@pytest.fixture
+def stub(rag):
+    return rag.embeddings
+
+
+def make_chunks(n):
+    return [
+        Document(
+            page_content="word " * (i + 1),
+            metadata={"source": "notes.pdf", "page": i, "chunk_size_tokens": i + 1},
+        )
+        for i in range(n)
+    ]
+
+
+class TestConnectionPool:
+    """Tests for the shared outbound connection pool."""
+
+    def test_sessions_share_connector_and_leave_it_open(self):
+        async def run():
+            clients = [SimpleNamespace(_client=SimpleNamespace()) for _ in range(3)]
+            connector = svc.aiohttp.TCPConnector(limit=4)
+            svc.share_connection_pool(clients, connector)
+
+            sessions = [c._client.get_async_session_fn() for c in clients]
+            assert all(s.connector is connector for s in sessions)
+            for session in sessions:
+                await session.close()
+            assert not connector.closed
+            await connector.close()
+
+        asyncio.run(run())
+
+    def test_sync_calls_share_one_session(self):
+        async def run():
+            clients = [SimpleNamespace(_client=SimpleNamespace()) for _ in range(2)]
+            connector = svc.aiohttp.TCPConnector(limit=4)
+            session = svc.pooled_session(8)
+            svc.share_connection_pool(clients, connector, session)
+
+            assert all(c._client.get_session_fn() is session for c in clients)
+            assert session.get_adapter("https://integrate.api.nvidia.com")._pool_maxsize == 8
+            session.close()
+            await connector.close()
+
+        asyncio.run(run())
+
+
+class TestChunking:
+    """Tests for token-based chunking."""
+
+    def test_token_lengths_match_single_encode(self):
+        texts = ["hello world", "", "a much longer sentence with several words in it"]
+        assert svc.token_lengths(texts) == [svc.token_length(t) for t in texts]
+
+    def test_chunks_carry_token_counts(self):
+        pages = [Document(page_content="Paragraph. " * 400, metadata={"page": 0})]
+        chunks = svc.create_optimized_chunks(pages)
+
+        assert len(chunks) > 1
+        for chunk in chunks:
+            assert chunk.metadata["chunk_size_tokens"] == svc.token_length(chunk.page_content)
+
+    def test_chunk_token_stats(self):
+        stats = svc.chunk_token_stats(make_chunks(4))  # 1..4 tokens
+
+        assert stats == {
+            "total_chunks": 4,
+            "avg_tokens_per_chunk": 2,
+            "min_tokens": 1,
+            "max_tokens": 4,
+            "total_tokens": 10,
+        }
+        assert all(type(v) is int for v in stats.values())
+
+
+class StubPDFLoader:
+    """PDF loader stand-in that yields synthetic pages."""
+
+    pages = 20
+    fail_after = None
+
+    def __init__(self, path):
+        self.path = path
+
+    def lazy_load(self):
+        for i in range(self.pages):
+            if i == self.fail_after:
+                raise ValueError("corrupt page")
+            yield Document(page_content=f"Page {i}. " * 30, metadata={"page": i})
+
+
+class TestLoadAndSplit:
+    """Tests for off-loop PDF parsing and splitting."""
+
+    @pytest.fixture(autouse=True)
+    def offline(self, monkeypatch):
+        monkeypatch.setattr(svc, "pdf_loader", StubPDFLoader)
+        monkeypatch.setattr(svc, "PAGE_GROUP_SIZE", 3)
+        monkeypatch.setattr(
+            svc, "text_splitter", svc.RecursiveCharacterTextSplitter(chunk_size=120, chunk_overlap=0)
+        )
+
+    def test_matches_splitting_whole_document(self):
+        chunks = asyncio.run(svc.load_and_split_pdf("notes.pdf"))
+        expected = svc.text_splitter.split_documents(
+            list(StubPDFLoader("notes.pdf").lazy_load())
+        )
+
+        assert [c.page_content for c in chunks] == [c.page_content for c in expected]
+        assert [c.metadata["page"] for c in chunks] == [c.metadata["page"] for c in expected]
+
+    def test_parse_errors_propagate(self, monkeypatch):
+        monkeypatch.setattr(StubPDFLoader, "fail_after", 7)
+        with pytest.raises(ValueError, match="corrupt page"):
+            asyncio.run(svc.load_and_split_pdf("notes.pdf"))
+
+    def test_empty_pdf(self, monkeypatch):
+        monkeypatch.setattr(StubPDFLoader, "pages", 0)
+        assert asyncio.run(svc.load_and_split_pdf("notes.pdf")) == []
+
+
+class CharEncoding:
+    """One token per character, standing in for tiktoken offline."""
+
+    def __init__(self):
+        self.encode_calls = 0
+
+    def encode_ordinary(self, text):
+        self.encode_calls += 1
+        return [ord(c) for c in text]
+
+    def decode(self, ids):
+        return "".join(map(chr, ids))
+
+    def decode_single_token_bytes(self, token_id):
+        return chr(token_id).encode()
+
+
+class ByteEncoding(CharEncoding):
+    """One token per UTF-8 byte, like byte-level BPE at its most fragmented."""
+
+    def encode_ordinary(self, text):
+        self.encode_calls += 1
+        return list(text.encode())
+
+    def decode(self, ids):
+        return bytes(ids).decode(errors="replace")
+
+    def decode_single_token_bytes(self, token_id):
+        return bytes([token_id])
+
+
+class TestTokenWindowSplitter:
+    """Tests for single-encode token window splitting."""
+
+    @pytest.fixture
+    def encoding(self):
+        return CharEncoding()
+
+    def test_windows_respect_size_and_overlap(self, encoding):
+        splitter = svc.TokenWindowSplitter(encoding, chunk_size=10, chunk_overlap=3)
+
+        chunks = splitter.split_text("abcdefghijklmnopqrstuvwxyz")
+
+        assert chunks == ["abcdefghij", "hijklmnopq", "opqrstuvwx", "vwxyz"]
+
+    def test_ends_at_strongest_boundary(self, encoding):
+        splitter = svc.TokenWindowSplitter(encoding, chunk_size=20, chunk_overlap=0)
+
+        chunks = splitter.split_text("one two. three, four five six seven")
+
+        assert chunks[0] == "one two. three,"
+        assert chunks[1] == "four five six seven"
+
+    def test_never_splits_multibyte_characters(self):
+        splitter = svc.TokenWindowSplitter(ByteEncoding(), chunk_size=10, chunk_overlap=4)
+        text = "∫f dx ≈ Δy 漢字 " * 6
+
+        chunks = splitter.split_text(text)
+
+        assert len(chunks) > 1
+        assert not any("\ufffd" in c for c in chunks)
+        assert all(c in text for c in chunks)
+        assert all(len(c.encode()) <= 10 for c in chunks)
+
+    def test_encodes_each_document_once(self, encoding):
+        splitter = svc.TokenWindowSplitter(encoding, chunk_size=8, chunk_overlap=2)
+        docs = [Document(page_content="word " * 40, metadata={"page": i}) for i in range(3)]
+
+        chunks = splitter.split_documents(docs)
+
+        assert encoding.encode_calls == 3
+        assert {c.metadata["page"] for c in chunks} == {0, 1, 2}
+        assert chunks[0].metadata is not docs[0].metadata
+
+    def test_short_text_is_one_chunk(self, encoding):
+        splitter = svc.TokenWindowSplitter(encoding, chunk_size=50, chunk_overlap=10)
+        assert splitter.split_text("  short text \n") == ["short text"]
+        assert splitter.split_text("") == []
+
+
+class TestPDFLoader:
+    """Tests for real PDF extraction."""
+
+    def test_pages_keep_source_and_page(self, tmp_path):
+        pymupdf = pytest.importorskip("pymupdf")
+        path = str(tmp_path / "notes.pdf")
+        doc = pymupdf.open()
+        for i in range(3):
+            doc.new_page().insert_text((72, 72), f"Page {i} about photosynthesis.")
+        doc.save(path)
+
+        pages = list(svc.pdf_loader(path).lazy_load())
+
+        assert [p.metadata["page"] for p in pages] == [0, 1, 2]
+        assert all(p.metadata["source"] == path for p in pages)
+        assert "Page 1 about photosynthesis." in pages[1].page_content
+
+
+class TestEmbedAndUpsert:
+    """Tests for concurrent micro-batched ingestion."""
+
+    def test_batches_and_indexes_all_chunks(self, rag, stub, monkeypatch):
+        monkeypatch.setattr(svc, "EMBED_BATCH_SIZE", 4)
+        count = asyncio.run(svc.embed_and_upsert(rag, make_chunks(10)))
+
+        assert count == 10
+        assert sorted(len(b) for b in stub.document_batches) == [2, 4, 4]
+        assert rag.vector_store._collection.count() == 10
+
+    def test_stored_vectors_match_their_text(self, rag):
+        chunks = make_chunks(5)
+        asyncio.run(svc.embed_and_upsert(rag, chunks))
+
+        stored = rag.vector_store._collection.get(include=["documents", "embeddings"])
+        for text, vector in zip(stored["documents"], stored["embeddings"]):
+            assert list(vector) == StubEmbeddings._vector(text)
+
+    def test_doc_ids_follow_chunk_order(self, rag):
+        chunks = make_chunks(5)
+        asyncio.run(svc.embed_and_upsert(rag, chunks, "abc"))
+
+        stored = rag.vector_store._collection.get(ids=["abc:0", "abc:4"])
+        by_id = dict(zip(stored["ids"], stored["documents"]))
+        assert by_id == {"abc:0": chunks[0].page_content, "abc:4": chunks[4].page_content}
+
+    def test_reingest_is_skipped(self, rag, stub):
+        assert asyncio.run(svc.embed_and_upsert(rag, make_chunks(5), "abc")) == 5
+        assert asyncio.run(svc.embed_and_upsert(rag, make_chunks(5), "abc")) == 0
+
+        assert len(stub.document_batches) == 1
+        assert rag.vector_store._collection.count() == 5
+
+    def test_revised_document_reuses_stored_vectors(self, rag, stub):
+        asyncio.run(svc.embed_and_upsert(rag, make_chunks(5), "v1"))
+        revised = make_chunks(5)
+        revised[2].page_content = "rewritten paragraph"
+        stub.document_batches.clear()
+
+        assert asyncio.run(svc.embed_and_upsert(rag, revised, "v2")) == 5
+
+        assert stub.document_batches == [["rewritten paragraph"]]
+        stored = rag.vector_store._collection.get(
+            ids=[f"v2:{i}" for i in range(5)], include=["documents", "embeddings"]
+        )
+        for text, vector in zip(stored["documents"], stored["embeddings"]):
+            assert list(vector) == StubEmbeddings._vector(text)
+
+    def test_identical_chunks_embedded_once(self, rag, stub):
+        chunks = make_chunks(3) + make_chunks(3)
+        asyncio.run(svc.embed_and_upsert(rag, chunks))
+
+        assert sum(len(b) for b in stub.document_batches) == 3
+        assert rag.vector_store._collection.count() == 6
+
+    def test_document_id_tracks_modification(self, tmp_path):
+        path = tmp_path / "notes.pdf"
+        path.write_bytes(b"v1")
+        first = svc.document_id(str(path))
+        os.utime(path, (0, 12345))
+
+        assert svc.document_id(str(path)) != first
+        assert svc.document_id(str(path)) == svc.document_id(str(path))
+
+
+class TestLoadDocument:
+    """Tests for the /load-document endpoint."""
+
+    def test_unchanged_file_is_not_reprocessed(self, stub, tmp_path):
+        pymupdf = pytest.importorskip("pymupdf")
+        path = str(tmp_path / "notes.pdf")
+        doc = pymupdf.open()
+        doc.new_page().insert_text((72, 72), "Entropy always increases.")
+        doc.save(path)
+        client = TestClient(svc.app)
+
+        first = client.post("/load-document", json={"pdf_path": path}).json()
+        copy = str(tmp_path / "copy.pdf")
+        shutil.copy(path, copy)
+        second = client.post("/load-document", json={"pdf_path": copy}).json()
+
+        assert first["status"] == "success"
+        assert second["status"] == "cached"
+        assert second["chunks"] == first["chunks"]
+        assert second["chunk_stats"] == first["chunk_stats"]
+        assert len(stub.document_batches) == 1
+
+    def test_edited_file_replaces_previous_chunks(self, rag, tmp_path):
+        pymupdf = pytest.importorskip("pymupdf")
+        path = str(tmp_path / "notes.pdf")
+        client = TestClient(svc.app)
+        for i, text in enumerate(["Entropy always increases.", "Enthalpy is conserved."]):
+            doc = pymupdf.open()
+            doc.new_page().insert_text((72, 72), text)
+            doc.save(path)
+            os.utime(path, (i, i))  # distinct mtimes, so distinct chunk ids
+            assert client.post("/load-document", json={"pdf_path": path}).json()["status"] == "success"
+
+        stored = rag.vector_store._collection.get(include=["documents"])["documents"]
+        assert stored and all("Enthalpy" in text for text in stored)
+
+    def test_concurrent_ingestion_is_capped(self, rag, tmp_path, monkeypatch):
+        rag.document_slots = asyncio.Semaphore(2)
+        active = peak = 0
+
+        async def slow_ingest(rag, pdf_path, source_hash):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return make_chunks(1)
+
+        monkeypatch.setattr(svc, "ingest_pdf", slow_ingest)
+        paths = []
+        for i in range(5):
+            path = tmp_path / f"{i}.pdf"
+            path.write_bytes(b"%%PDF-%d" % i)
+            paths.append(str(path))
+
+        async def upload_all():
+            return await asyncio.gather(
+                *(svc.load_document(svc.DocumentRequest(pdf_path=p), rag) for p in paths)
+            )
+
+        results = asyncio.run(upload_all())
+
+        assert peak == 2
+        assert [r["status"] for r in results] == ["success"] * 5
+
+
+class TestQueryBatching:
+    """Tests for coalescing concurrent question embeddings."""
+
+    def test_concurrent_questions_share_requests(self, rag, stub):
+        async def run():
+            return await asyncio.gather(*(rag.embed_query(f"q{i}") for i in range(5)))
+
+        vectors = asyncio.run(run())
+        rag.query_batcher.close()
+
+        assert vectors == [StubEmbeddings._vector(f"q{i}") for i in range(5)]
+        assert sorted(t for batch in stub.query_batches for t in batch) == [f"q{i}" for i in range(5)]
+        assert len(stub.query_batches) < 5
+
+    def test_short_result_fails_instead_of_hanging(self, rag, stub):
+        stub._embed = lambda texts, model_type: []
+
+        async def run():
+            return await asyncio.gather(
+                rag.embed_query("a"), rag.embed_query("b"), return_exceptions=True
+            )
+
+        results = asyncio.run(run())
+        rag.query_batcher.close()
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+
+class TestVectorStore:
+    """Tests for collection setup."""
+
+    def test_hnsw_parameters_applied(self, rag):
+        config = rag.vector_store._collection.configuration["hnsw"]
+        assert config["max_neighbors"] == svc.HNSW_METADATA["hnsw:M"]
+        assert config["ef_construction"] == svc.HNSW_METADATA["hnsw:construction_ef"]
+        assert config["ef_search"] == svc.HNSW_METADATA["hnsw:search_ef"]
+
+    def test_prewarm(self, rag):
+        svc.prewarm_collection(rag.vector_store._collection)  # empty collection: nothing to probe
+        asyncio.run(svc.embed_and_upsert(rag, make_chunks(3)))
+        svc.prewarm_collection(rag.vector_store._collection)
+
+
+class TestSearchByVector:
+    """Tests for direct collection search."""
+
+    def test_matches_langchain_search(self, rag, stub):
+        asyncio.run(svc.embed_and_upsert(rag, make_chunks(6)))
+        vector = StubEmbeddings._vector("word word")
+        expected = rag.vector_store.similarity_search_by_vector_with_relevance_scores(
+            vector, k=3
+        )
+
+        results = svc.search_by_vector(rag.vector_store, vector, 3)
+
+        assert [(d.page_content, d.metadata, s) for d, s in results] == [
+            (d.page_content, d.metadata, s) for d, s in expected
+        ]
+        assert stub.queries == []
+
+    def test_empty_collection(self, rag):
+        assert svc.search_by_vector(rag.vector_store, [1.0, 0.0, 1.0], 5) == []
+
+    def test_mmr_matches_langchain(self, rag, stub):
+        texts = ["x", "x x", "x x x x", "xxxxxxxx", "xx", "xxxxx xxxxx", "x  x", "xxx xxx"]
+        chunks = make_chunks(len(texts))
+        for chunk, text in zip(chunks, texts):
+            chunk.page_content = text
+        asyncio.run(svc.embed_and_upsert(rag, chunks))
+        vector = StubEmbeddings._vector("xx xx")
+        expected = rag.vector_store.max_marginal_relevance_search_by_vector(
+            vector, k=4, fetch_k=8, lambda_mult=0.5
+        )
+
+        results = svc.search_by_vector(rag.vector_store, vector, 4, fetch_k=8, lambda_mult=0.5)
+
+        # LangChain keeps candidate order; the selection is the same
+        assert {d.page_content for d, _ in results} == {d.page_content for d in expected}
+
+    def test_mmr_skips_near_duplicates(self):
+        vectors = np.array([[1.0, 0.0], [0.99, 0.14], [0.6, 0.8]], dtype=np.float32)
+        assert svc.mmr_select([1.0, 0.0], vectors, 2, 0.3) == [0, 2]
+        assert svc.mmr_select([1.0, 0.0], vectors, 2, 1.0) == [0, 1]
+
+
+class TestQueryCache:
+    """Tests for the query embedding / retrieval cache."""
+
+    def test_semantic_hit_above_threshold(self):
+        cache = svc.QueryCache(8, 600, 0.97)
+        cache.put("a", [1.0, 0.0, 0.0], 5, ["doc"])
+
+        assert cache.lookup([0.99, 0.01, 0.0], 5) == ["doc"]
+        assert cache.lookup([0.0, 1.0, 0.0], 5) is None
+
+    def test_needs_enough_cached_results(self):
+        cache = svc.QueryCache(8, 600, 0.97)
+        cache.put("a", [1.0, 0.0], 3, ["d1", "d2", "d3"])
+
+        assert cache.lookup([1.0, 0.0], 2) == ["d1", "d2"]
+        assert cache.lookup([1.0, 0.0], 5) is None
+
+    def test_evicts_least_recent(self):
+        cache = svc.QueryCache(2, 600, 0.97)
+        for key in ["a", "b", "c"]:
+            cache.put(key, [1.0, 0.0], 1, [key])
+
+        assert cache.embedding("a") is None
+        assert np.allclose(cache.embedding("c"), [1.0, 0.0])
+
+    def test_embedding_is_rebuilt_from_codes(self):
+        vector = np.random.default_rng(1).standard_normal(256) * 3
+        cache = svc.QueryCache(8, 600, 0.97)
+        cache.put("a", vector.tolist(), 1, ["doc"])
+
+        assert "embedding" not in cache._entries["a"]
+        restored = np.asarray(cache.embedding("a"))
+        cosine = restored @ vector / (np.linalg.norm(restored) * np.linalg.norm(vector))
+        assert cosine > 0.999
+        assert np.isclose(np.linalg.norm(restored), np.linalg.norm(vector), rtol=1e-2)
+
+    def test_scan_matrix_is_int8(self):
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((4, 256))
+        cache = svc.QueryCache(8, 600, 0.97)
+        for i, v in enumerate(vectors):
+            cache.put(str(i), v.tolist(), 1, [i])
+
+        assert cache.lookup(vectors[2].tolist(), 1) == [2]
+        assert cache._matrix.dtype == np.int8
+
+        units = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        approx = (cache._matrix @ units[2].astype(np.float32)) * cache._scales
+        assert np.allclose(approx, units @ units[2], atol=1e-2)
+
+    def test_entries_expire(self):
+        cache = svc.QueryCache(8, -1, 0.97)  # already stale
+        cache.put("a", [1.0, 0.0], 1, ["doc"])
+        assert cache.embedding("a") is None
+        assert cache.lookup([1.0, 0.0], 1) is None
+
+
+class TestAnswerCache:
+    """Tests for the exact-question answer cache."""
+
+    def test_key_normalizes_question(self):
+        key = svc.AnswerCache.key
+        assert key("What is  entropy?", 5, True) == key(" what is entropy? ", 5, True)
+        assert key("q", 5, True) != key("q", 6, True)
+        assert key("q", 5, True) != key("q", 5, False)
+
+    def test_evicts_least_recent(self):
+        cache = svc.AnswerCache(2, 300)
+        for key in [b"a", b"b", b"c"]:
+            cache.put(key, {"answer": key})
+
+        assert cache.get(b"a") is None
+        assert cache.get(b"c") == {"answer": b"c"}
+
+    def test_entries_expire(self):
+        cache = svc.AnswerCache(8, -1)  # already stale
+        cache.put(b"a", {"answer": "x"})
+        assert cache.get(b"a") is None
+        assert cache.stats()["size"] == 0
+
+    def test_put_after_clear_is_dropped(self):
+        cache = svc.AnswerCache(8, 300)
+        generation = cache.generation
+        cache.clear()
+        cache.put(b"a", {"answer": "stale"}, generation)
+
+        assert cache.get(b"a") is None
+        cache.put(b"a", {"answer": "fresh"}, cache.generation)
+        assert cache.get(b"a") == {"answer": "fresh"}
+
+    def test_lock_is_released(self):
+        cache = svc.AnswerCache(8, 300)
+
+        async def run():
+            async with cache.lock(b"a"):
+                assert b"a" in cache._locks
+
+        asyncio.run(run())
+        assert cache._locks == {}
+
+
+async def fake_stream(tokens, delays=None):
+    for i, token in enumerate(tokens):
+        if delays:
+            await asyncio.sleep(delays[i])
+        yield StubMessage(token)
+
+
+async def collect(stream):
+    return [piece async for piece in stream]
+
+
+class TestCoalesceTokens:
+    """Tests for SSE token coalescing."""
+
+    def test_flushes_every_max_tokens(self):
+        stream = svc.coalesce_tokens(fake_stream(list("abcdefg")), 3, 1000)
+        assert asyncio.run(collect(stream)) == ["abc", "def", "g"]
+
+    def test_flushes_when_window_closes(self):
+        # The model stalls after "b"; the buffered text must not wait for "c"
+        stream = svc.coalesce_tokens(fake_stream(["a", "b", "c"], [0, 0, 0.1]), 16, 20)
+        assert asyncio.run(collect(stream)) == ["ab", "c"]
+
+    def test_skips_empty_chunks(self):
+        stream = svc.coalesce_tokens(fake_stream(["", "a", "", "b"]), 16, 1000)
+        assert asyncio.run(collect(stream)) == ["ab"]
+
+    def test_errors_propagate(self):
+        async def failing():
+            yield StubMessage("a")
+            raise RuntimeError("model error")
+
+        with pytest.raises(RuntimeError, match="model error"):
+            asyncio.run(collect(svc.coalesce_tokens(failing(), 16, 1000)))
+
+
+class TestBuildPrompt:
+    """Tests for prompt construction."""
+
+    def test_matches_template(self):
+        docs = [Document(page_content="alpha"), Document(page_content="beta\ngamma")]
+        prompt = svc.build_prompt("why?", docs)
+
+        assert prompt == (
+            "You are a helpful study assistant. Use the following context to answer "
+            "accurately and concisely.\n\nContext from documents:\n"
+            "[Document 1]\nalpha\n\n[Document 2]\nbeta\ngamma"
+            "\n\nQuestion: why?\n\nAnswer:"
+        )
+
+
+class TestQuery:
+    """Tests for the /query endpoint."""
+
+    @pytest.fixture
+    def llm(self, rag):
+        llm = rag.llm = rag.llm_streaming = StubLLM()
+        return llm
+
+    @pytest.fixture
+    def client(self, rag, llm):
+        asyncio.run(svc.embed_and_upsert(rag, make_chunks(6)))
+        return TestClient(svc.app)
+
+    def test_non_streaming_uses_async_llm(self, client, llm):
+        r = client.post("/query", json={"question": "word word", "top_k": 3})
+
+        assert r.status_code == 200
+        body = r.json()
+        assert body["answer"] == "stub answer"
+        assert body["chunks_retrieved"] == 3
+        assert len(llm.prompts) == 1
+
+    def test_repeated_question_hits_cache(self, client, stub):
+        first = client.post("/query", json={"question": "word word", "top_k": 3})
+        second = client.post("/query", json={"question": "  Word   WORD ", "top_k": 3})
+
+        assert first.headers["X-Cache"] == "MISS"
+        assert second.headers["X-Cache"] == "HIT"
+        assert stub.queries == ["word word"]
+        assert second.json()["sources"] == first.json()["sources"]
+
+    def test_repeated_question_reuses_answer(self, client, llm):
+        first = client.post("/query", json={"question": "word word", "top_k": 3})
+        second = client.post("/query", json={"question": "Word word", "top_k": 3})
+
+        assert second.headers["X-Cache"] == "HIT"
+        assert second.json() == first.json()
+        assert len(llm.prompts) == 1
+
+        client.post("/query", json={"question": "word word", "top_k": 2})
+        assert len(llm.prompts) == 2
+
+    def test_top_k_is_bounded(self, client):
+        for top_k in (0, svc.MAX_TOP_K + 1, 70000):
+            r = client.post("/query", json={"question": "word word", "top_k": top_k})
+            assert r.status_code == 422
+
+    def test_concurrent_repeats_share_one_llm_call(self, rag, llm):
+        asyncio.run(svc.embed_and_upsert(rag, make_chunks(6)))
+        request = svc.QueryRequest(question="word word", top_k=3)
+
+        async def run():
+            return await asyncio.gather(*(svc.query_rag(request, rag) for _ in range(4)))
+
+        responses = asyncio.run(run())
+        assert len(llm.prompts) == 1
+        assert len({r.body for r in responses}) == 1
+
+    def test_streaming_sse_frames(self, client):
+        r = client.post("/query", json={"question": "word word", "top_k": 2, "stream": True})
+
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("text/event-stream")
+        events = [line[len("data: "):] for line in r.text.split("\n") if line.startswith("data: ")]
+        assert json.loads(events[0])["content"] == "stub answer"  # coalesced
+        assert json.loads(events[1])["chunks_retrieved"] == 2
+        assert events[-1] == "[DONE]"
+
+    def test_retrieval_previews_only_at_debug(self, client, caplog):
+        with caplog.at_level("INFO", logger="nvidia_rag_service"):
+            client.post("/query", json={"question": "word", "top_k": 2})
+        assert "Retrieved" not in caplog.text
+
+        with caplog.at_level("DEBUG", logger="nvidia_rag_service"):
+            client.post("/query", json={"question": "other words", "top_k": 2})
+        assert "Retrieved 2 chunks" in caplog.text
+
+    def test_sources_without_content(self, client):
+        r = client.post(
+            "/query", json={"question": "word word", "top_k": 2, "include_source_content": False}
+        )
+
+        sources = r.json()["sources"]
+        assert all("content" not in s for s in sources)
+        chunk = client.get(f"/chunks/{sources[0]['id']}").json()
+        assert chunk["content"].startswith("word")
+        assert chunk["metadata"]["page"] == sources[0]["metadata"]["page"]
+
+    def test_long_sources_are_truncated(self, rag, llm):
+        long_chunk = Document(
+            page_content="x" * 600,
+            metadata={"source": "notes.pdf", "page": 0, "chunk_size_tokens": 150},
+        )
+        asyncio.run(svc.embed_and_upsert(rag, [long_chunk]))
+        r = TestClient(svc.app).post("/query", json={"question": "x", "top_k": 1})
+
+        assert r.json()["sources"][0]["content"] == "x" * 500 + "..."
+        assert svc.truncate("short") == "short"
+
+    def test_clear_reopens_collection(self, client, rag):
+        assert client.delete("/collection").status_code == 200
+        assert client.get("/collection/stats").json()["document_count"] == 0
+        assert asyncio.run(svc.embed_and_upsert(rag, make_chunks(2))) == 2
+
+    def test_unknown_chunk_is_404(self, client):
+        assert client.get("/chunks/missing").status_code == 404
+
+    def test_empty_question_rejected(self, client):
+        r = client.post("/query", json={"question": "   "})
+        assert r.status_code == 400
+
+    def test_llm_failure_is_500_with_cors_headers(self, rag, llm):
+        asyncio.run(svc.embed_and_upsert(rag, make_chunks(2)))
+
+        async def fail(prompt, **kwargs):
+            raise RuntimeError("upstream unavailable")
+
+        llm.ainvoke = fail
+        client = TestClient(svc.app, raise_server_exceptions=False)
+        r = client.post(
+            "/query",
+            json={"question": "word", "top_k": 1},
+            headers={"Origin": "http://localhost:3000"},
+        )
+
+        assert r.status_code == 500
+        assert r.json() == {"detail": "upstream unavailable"}
+        assert r.headers["access-control-allow-origin"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
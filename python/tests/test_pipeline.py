@@ -0,0 +1,174 @@
+"""
+Unit Tests for RAG Pipeline Module
+
+Tests pipeline-level orchestration with stubbed components
+(no API key needed).
+"""
+
+import asyncio
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from langchain.schema import Document
+from rag.config import RAGConfig
+from rag.pipeline import RAGPipeline, file_hash
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    cfg = RAGConfig(nvidia_api_key="test-key", chroma_persist_dir=str(tmp_path))
+    p = RAGPipeline(cfg)
+    p._initialized = True
+    return p
+
+
+def make_pdf(path, pages=2):
+    pymupdf = pytest.importorskip("pymupdf")
+    doc = pymupdf.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), f"Page {i} about entropy.")
+    doc.save(path)
+    return path
+
+
+class TestLoadPDFPages:
+    """Tests for PDF page extraction and unchanged-file detection."""
+
+    def test_chunks_keep_source_and_page(self, pipeline, tmp_path):
+        path = make_pdf(str(tmp_path / "notes.pdf"))
+
+        source_name, chunks, stats, load, chunk = pipeline._load_and_chunk_pdf(path, "abc")
+
+        assert source_name == "notes.pdf"
+        assert [c.metadata["page"] for c in chunks] == [0, 1]
+        assert all(c.metadata["source_hash"] == "abc" for c in chunks)
+        assert "Page 1 about entropy." in chunks[1].page_content
+        assert stats.source_pages == 2
+        assert load.output_count == 2
+        assert chunk.input_count == 2
+
+    def test_streams_pages_in_windows(self, pipeline, tmp_path):
+        path = make_pdf(str(tmp_path / "notes.pdf"), pages=5)
+        pipeline.config.chunking.page_window = 2
+
+        _, chunks, stats, _, _ = pipeline._load_and_chunk_pdf(path, "abc")
+
+        assert [c.metadata["page"] for c in chunks] == [0, 1, 2, 3, 4]
+        assert [c.metadata["chunk_id"] for c in chunks] == [0, 1, 2, 3, 4]
+        assert stats.total_chunks == 5
+
+    def test_rejects_non_pdf(self, pipeline, tmp_path):
+        path = tmp_path / "notes.txt"
+        path.write_text("text")
+        with pytest.raises(ValueError):
+            pipeline._check_pdf(str(path))
+
+    def test_new_file_is_hashed(self, pipeline, tmp_path):
+        path = make_pdf(str(tmp_path / "notes.pdf"))
+        pipeline.retriever.indexed_chunks = lambda h: []
+
+        resolved, source_hash, cached = pipeline._check_pdf(path)
+
+        assert resolved == path
+        assert cached is None
+        assert source_hash == file_hash(path)
+
+    def test_unchanged_file_is_skipped(self, pipeline, tmp_path):
+        path = make_pdf(str(tmp_path / "notes.pdf"))
+        stored = [{"chunk_size_tokens": 10, "page": 0}, {"chunk_size_tokens": 30, "page": 1}]
+        pipeline.retriever.indexed_chunks = lambda h: stored if h == file_hash(path) else []
+
+        def must_not_parse(*args):
+            raise AssertionError("unchanged file was parsed")
+
+        pipeline._load_and_chunk_pdf = must_not_parse
+        result = asyncio.run(pipeline.aload_pdf(path))
+
+        assert result["status"] == "cached"
+        assert result["chunks"] == 2
+        assert result["chunk_stats"]["avg_tokens_per_chunk"] == 20
+        assert result["chunk_stats"]["source_pages"] == 2
+
+    def test_concurrent_loads_each_time_indexing(self, pipeline, tmp_path):
+        paths = [make_pdf(str(tmp_path / f"notes{i}.pdf")) for i in range(2)]
+        pipeline.retriever.indexed_chunks = lambda h: []
+
+        async def slow_add(chunks):
+            await asyncio.sleep(0.01)
+
+        pipeline.retriever.aadd_documents = slow_add
+
+        async def load_both():
+            return await asyncio.gather(*(pipeline.aload_pdf(p) for p in paths))
+
+        results = asyncio.run(load_both())
+
+        assert all(r["timings"]["index_ms"] >= 10 for r in results)
+
+
+class TestWarmup:
+    """Tests for startup warmup."""
+
+    def test_requires_initialization(self, pipeline):
+        pipeline._initialized = False
+        with pytest.raises(RuntimeError):
+            asyncio.run(pipeline.warmup())
+
+    def test_warms_all_components(self, pipeline):
+        calls = []
+        pipeline.chunker.warmup = lambda: calls.append("chunker")
+        pipeline.embedder.warmup = lambda: calls.append("embedder")
+        pipeline.retriever.warmup = lambda: calls.append("retriever")
+        pipeline.reranker.warmup = lambda: calls.append("reranker")
+        pipeline.generator.warmup = lambda: calls.append("generator")
+
+        result = asyncio.run(pipeline.warmup())
+
+        assert sorted(calls) == ["chunker", "embedder", "generator", "reranker", "retriever"]
+        assert all(r["ok"] for r in result.values())
+        assert all(r["latency_ms"] >= 0 for r in result.values())
+
+    def test_failures_are_reported_not_raised(self, pipeline):
+        def fail():
+            raise ConnectionError("endpoint unreachable")
+
+        pipeline.embedder.warmup = lambda: None
+        pipeline.reranker.warmup = fail
+        pipeline.generator.warmup = lambda: None
+
+        result = asyncio.run(pipeline.warmup())
+
+        assert result["embedder"]["ok"]
+        assert not result["reranker"]["ok"]
+        assert "unreachable" in result["reranker"]["error"]
+
+
+class TestRetrieveOnly:
+    """Tests for retrieval without generation."""
+
+    def test_returns_reranked_sources_without_generating(self, pipeline):
+        doc = Document(page_content="Entropy measures disorder.", metadata={"page": 1})
+
+        async def aretrieve(question, top_k=None):
+            return [(doc, 0.4)]
+
+        pipeline.retriever.aretrieve = aretrieve
+        pipeline.reranker.rerank = lambda question, docs: [(doc, 0.9)]
+        pipeline.generator.agenerate = None  # Must not be called
+
+        result = asyncio.run(pipeline.aretrieve("what is entropy?", top_k=3))
+
+        assert result["chunks_retrieved"] == 1
+        assert result["sources"][0]["metadata"]["retrieval_score"] == 0.9
+        assert "answer" not in result
+
+    def test_rejects_empty_question(self, pipeline):
+        with pytest.raises(ValueError):
+            asyncio.run(pipeline.aretrieve("  "))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,55 @@
+"""
+Unit Tests for the ADC Scoring Kernel
+
+Checks the JIT kernel (when numba is installed) against the NumPy reference.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import rerank_kernel
+from rerank_kernel import adc_scores
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    q = rng.standard_normal(64).astype(np.float32)
+    codes = rng.integers(-127, 128, size=(40, 64)).astype(np.int8)
+    scales = rng.random(40).astype(np.float32)
+    return q, codes, scales
+
+
+class TestADCScores:
+    """Tests for int8 x fp32 scoring."""
+
+    def test_matches_numpy_reference(self, data):
+        q, codes, scales = data
+        expected = (codes.astype(np.float32) @ q) * scales
+        assert np.allclose(adc_scores(q, codes, scales), expected, rtol=1e-4, atol=1e-3)
+
+    def test_numpy_fallback(self, data, monkeypatch):
+        monkeypatch.setattr(rerank_kernel, "NUMBA_AVAILABLE", False)
+        q, codes, scales = data
+        expected = (codes.astype(np.float32) @ q) * scales
+        assert np.allclose(adc_scores(q, codes, scales), expected, rtol=1e-4, atol=1e-3)
+
+    def test_empty_matrix(self):
+        out = adc_scores(
+            np.ones(4, dtype=np.float32),
+            np.zeros((0, 4), dtype=np.int8),
+            np.zeros(0, dtype=np.float32),
+        )
+        assert out.shape == (0,)
+
+    def test_warmup(self):
+        rerank_kernel.warmup()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
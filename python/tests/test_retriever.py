@@ -4,6 +4,7 @@ Unit Tests for Hybrid Retriever Module
 Tests keyword search, vector search, score fusion, and indexing.
 """
 
+import asyncio
 import os
 import sys
 import pytest
@@ -11,7 +12,9 @@ import pytest
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 from langchain.schema import Document
-from rag.retriever import KeywordSearcher
+from rag.config import RAGConfig
+from rag.embedder import NVIDIAEmbedder
+from rag.retriever import KeywordSearcher, HybridRetriever
 
 
 class TestKeywordSearcher:
@@ -126,5 +129,231 @@ class TestTokenize:
         assert tokens == []
 
 
+class TestTokenizeBatch:
+    """Tests for single-pass batch tokenization."""
+
+    def test_matches_per_text_tokenize(self):
+        texts = [
+            "Hello, World!",
+            "",
+            "snake_case and C++ 3.14",
+            "Ünïcode café naïve",
+            "trailing space ",
+        ]
+        assert KeywordSearcher._tokenize_batch(texts) == [
+            KeywordSearcher._tokenize(t) for t in texts
+        ]
+
+    def test_empty_batch(self):
+        assert KeywordSearcher._tokenize_batch([]) == []
+
+    def test_separator_in_text_falls_back(self):
+        texts = ["alpha\x1fbeta", "gamma"]
+        assert KeywordSearcher._tokenize_batch(texts) == [["alpha", "beta"], ["gamma"]]
+
+
+class TestHybridRetrieverIngestion:
+    """Tests for adding documents through the batched embedder."""
+
+    @pytest.fixture
+    def retriever(self, tmp_path, stub_embeddings):
+        config = RAGConfig(nvidia_api_key="test-key")
+        config.chroma_persist_dir = str(tmp_path / "chroma")
+        config.collection_name = "test_collection"
+        config.embedding.batch_size = 2
+
+        embedder = NVIDIAEmbedder(config)
+        embedder._client = stub_embeddings
+        return HybridRetriever(config, embedder).initialize()
+
+    def test_add_documents_uses_batched_embedder(self, retriever):
+        docs = [
+            Document(page_content=f"Study note number {i}", metadata={"page": i})
+            for i in range(5)
+        ]
+
+        added = retriever.add_documents(docs)
+
+        assert added == 5
+        assert retriever.get_stats()["total_documents"] == 5
+        batches = retriever.embedder._client.document_batches
+        assert [len(b) for b in batches] == [2, 2, 1]
+
+    def test_large_adds_are_split_to_chroma_batch_limit(self, retriever, monkeypatch):
+        collection = retriever._vector_store._collection
+        calls = []
+        upsert = collection.upsert
+        monkeypatch.setattr(retriever._vector_store._client, "get_max_batch_size", lambda: 2)
+        monkeypatch.setattr(
+            collection, "upsert", lambda **kw: (calls.append(len(kw["ids"])), upsert(**kw))
+        )
+        docs = [Document(page_content=f"Note {i}", metadata={"page": i}) for i in range(5)]
+
+        assert retriever.add_documents(docs) == 5
+        assert calls == [2, 2, 1]
+        assert retriever.get_stats()["total_documents"] == 5
+
+    def test_stored_vector_lookup_is_split_to_chroma_batch_limit(self, retriever, monkeypatch):
+        docs = [Document(page_content=f"Note {i}", metadata={"page": i}) for i in range(5)]
+        retriever.add_documents(docs)
+        collection = retriever._vector_store._collection
+        calls = []
+        get = collection.get
+        monkeypatch.setattr(retriever._vector_store._client, "get_max_batch_size", lambda: 2)
+        monkeypatch.setattr(
+            collection, "get", lambda **kw: (calls.append(len(kw["ids"])), get(**kw))[1]
+        )
+
+        vectors, texts = retriever._pending_embeddings(docs)
+
+        assert calls == [2, 2, 1]
+        assert texts == []
+        assert all(v is not None for v in vectors)
+
+    def test_chunk_token_counts_skip_reencoding(self, retriever, monkeypatch):
+        encoded = []
+        count = retriever.embedder._count_tokens
+        monkeypatch.setattr(
+            retriever.embedder, "_count_tokens", lambda texts: encoded.append(texts) or count(texts)
+        )
+        counted = [
+            Document(page_content=f"Counted note {i}", metadata={"chunk_size_tokens": 3})
+            for i in range(3)
+        ]
+
+        assert retriever.add_documents(counted) == 3
+        assert asyncio.run(retriever.aadd_documents([
+            Document(page_content="Async counted", metadata={"chunk_size_tokens": 2})
+        ])) == 1
+        assert encoded == []
+
+        retriever.add_documents([Document(page_content="Uncounted note")])
+        assert encoded == [["Uncounted note"]]
+
+    def test_add_documents_without_metadata(self, retriever):
+        assert retriever.add_documents([Document(page_content="bare text")]) == 1
+        assert retriever.get_stats()["total_documents"] == 1
+
+    def test_aadd_documents(self, retriever):
+        docs = [Document(page_content=f"Async note {i}", metadata={"page": i}) for i in range(3)]
+
+        added = asyncio.run(retriever.aadd_documents(docs))
+
+        assert added == 3
+        assert retriever.get_stats()["total_documents"] == 3
+        retriever.flush_keyword_index()
+        assert retriever._keyword_searcher.search("async note", top_k=5)
+
+    def test_indexed_chunks_by_source_hash(self, retriever):
+        retriever.add_documents([
+            Document(page_content="hashed note", metadata={"page": 0, "source_hash": "abc"}),
+            Document(page_content="other note", metadata={"page": 0, "source_hash": "def"}),
+        ])
+
+        assert [m["source_hash"] for m in retriever.indexed_chunks("abc")] == ["abc"]
+        assert retriever.indexed_chunks("missing") == []
+
+    def test_keyword_rebuilds_are_debounced(self, retriever, monkeypatch):
+        rebuilds = []
+        rebuild = retriever._rebuild_keyword_index
+        monkeypatch.setattr(
+            retriever, "_rebuild_keyword_index", lambda: (rebuilds.append(1), rebuild())
+        )
+
+        for i in range(3):
+            retriever.add_documents([Document(page_content=f"Batch note {i}", metadata={"page": i})])
+        assert rebuilds == []
+
+        results = retriever.retrieve("batch note", top_k=3)  # stale index is flushed first
+        assert rebuilds == [1]
+        assert len(results) == 3
+        retriever.close()
+        assert rebuilds == [1]
+
+    def test_zero_delay_rebuilds_on_ingest(self, retriever):
+        retriever.config.retriever.keyword_rebuild_delay_seconds = 0
+        retriever.add_documents([Document(page_content="Eager note", metadata={"page": 0})])
+        assert retriever._keyword_searcher.search("eager", top_k=1)
+
+    def test_retrieve_reuses_cached_query_embedding(self, retriever):
+        retriever.add_documents([
+            Document(page_content="Photosynthesis converts light into energy", metadata={"page": 0}),
+            Document(page_content="Mitochondria are the powerhouse of the cell", metadata={"page": 1}),
+        ])
+
+        first = retriever.retrieve("photosynthesis light", top_k=2)
+        second = retriever.retrieve("photosynthesis light", top_k=2)
+
+        assert first
+        assert [d.page_content for d, _ in first] == [d.page_content for d, _ in second]
+        assert retriever.embedder._client.queries == ["photosynthesis light"]
+
+    def test_aretrieve_matches_retrieve(self, retriever):
+        retriever.add_documents([
+            Document(page_content="Photosynthesis converts light into energy", metadata={"page": 0}),
+            Document(page_content="Mitochondria are the powerhouse of the cell", metadata={"page": 1}),
+            Document(page_content="Light reactions happen in the thylakoid", metadata={"page": 2}),
+        ])
+
+        expected = retriever.retrieve("light energy", top_k=2)
+        results = asyncio.run(retriever.aretrieve("light energy", top_k=2))
+
+        assert [(d.page_content, s) for d, s in results] == [
+            (d.page_content, s) for d, s in expected
+        ]
+
+    def test_aretrieve_semantic_only(self, retriever):
+        retriever.config.retriever.use_hybrid = False
+        retriever.add_documents([Document(page_content="Only note", metadata={"page": 0})])
+
+        results = asyncio.run(retriever.aretrieve("only note", top_k=1))
+        assert [d.page_content for d, _ in results] == ["Only note"]
+
+    def test_reingest_overwrites_instead_of_duplicating(self, retriever):
+        docs = [
+            Document(page_content=f"Study note number {i}", metadata={"source": "a.pdf"})
+            for i in range(3)
+        ]
+        retriever.add_documents(docs)
+        retriever.add_documents(docs)
+
+        assert retriever.get_stats()["total_documents"] == 3
+        # The second pass found every vector already stored
+        assert sum(map(len, retriever.embedder._client.document_batches)) == 3
+
+    def test_repeated_text_is_embedded_once(self, retriever):
+        docs = [
+            Document(page_content="Running header", metadata={"source": f"{name}.pdf"})
+            for name in ("a", "b", "c")
+        ]
+        retriever.add_documents(docs)
+
+        assert retriever.embedder._client.document_batches == [["Running header"]]
+        assert retriever.get_stats()["total_documents"] == 3
+
+    def test_same_text_from_other_source_is_kept(self, retriever):
+        retriever.add_documents([
+            Document(page_content="shared text", metadata={"source": "a.pdf"}),
+            Document(page_content="shared text", metadata={"source": "b.pdf"}),
+            Document(page_content="shared text", metadata={"source": "b.pdf"}),
+        ])
+
+        assert retriever.get_stats()["total_documents"] == 2
+
+    def test_collection_uses_hnsw_config(self, retriever):
+        hnsw = retriever._vector_store._collection.configuration["hnsw"]
+        assert hnsw["ef_construction"] == retriever.config.retriever.hnsw_construction_ef
+        assert hnsw["ef_search"] == retriever.config.retriever.hnsw_search_ef
+
+    def test_warmup(self, retriever):
+        retriever.warmup()  # empty collection is a no-op
+        retriever.add_documents([Document(page_content="warm index", metadata={"page": 0})])
+        retriever.warmup()
+
+    def test_add_no_documents(self, retriever):
+        assert retriever.add_documents([]) == 0
+        assert retriever.embedder._client.document_batches == []
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
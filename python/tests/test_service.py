@@ -0,0 +1,228 @@
+"""
+Unit Tests for the Enhanced RAG Service
+
+Tests service-level helpers that do not need a live pipeline.
+"""
+
+import asyncio
+import base64
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.testclient import TestClient
+
+import enhanced_rag_service as service
+from enhanced_rag_service import sse_with_heartbeat
+
+
+async def _collect(stream):
+    return [chunk async for chunk in stream]
+
+
+class TestSSEHeartbeat:
+    """Tests for the streaming keepalive wrapper."""
+
+    def test_passes_chunks_through(self):
+        async def source():
+            yield "data: a\n\n"
+            yield "data: b\n\n"
+
+        chunks = asyncio.run(_collect(sse_with_heartbeat(source(), interval=1)))
+        assert chunks == ["data: a\n\n", "data: b\n\n"]
+
+    def test_sends_keepalive_while_idle(self):
+        async def source():
+            await asyncio.sleep(0.05)
+            yield "data: late\n\n"
+
+        chunks = asyncio.run(_collect(sse_with_heartbeat(source(), interval=0.01)))
+        assert chunks[0] == ": keepalive\n\n"
+        assert chunks[-1] == "data: late\n\n"
+
+    def test_error_is_framed_and_terminated(self):
+        async def source():
+            yield "data: a\n\n"
+            raise ValueError("Question cannot be empty")
+
+        chunks = asyncio.run(_collect(sse_with_heartbeat(source(), interval=1)))
+        assert chunks[0] == "data: a\n\n"
+        assert "Question cannot be empty" in chunks[1]
+        assert chunks[-1] == "data: [DONE]\n\n"
+
+    def test_closing_early_closes_upstream(self):
+        closed = []
+
+        async def source():
+            try:
+                yield "data: a\n\n"
+                await asyncio.sleep(10)
+                yield "data: never\n\n"
+            finally:
+                closed.append(True)
+
+        async def consume_one():
+            stream = sse_with_heartbeat(source(), interval=0.01)
+            first = await stream.__anext__()
+            await stream.__anext__()  # keepalive while upstream sleeps
+            await stream.aclose()
+            return first
+
+        assert asyncio.run(consume_one()) == "data: a\n\n"
+        assert closed == [True]
+
+
+class TestRequestParsing:
+    """Tests for adapter-validated request bodies (no pipeline needed)."""
+
+    @pytest.fixture
+    def client(self, monkeypatch):
+        monkeypatch.setattr(service, "pipeline", None)
+        return TestClient(service.app)
+
+    def test_missing_field_is_422_with_body_loc(self, client):
+        r = client.post("/query", json={"top_k": 3})
+        assert r.status_code == 422
+        assert r.json()["detail"][0]["loc"] == ["body", "question"]
+
+    def test_invalid_json_is_422(self, client):
+        r = client.post("/embed", content=b"{not json")
+        assert r.status_code == 422
+
+    def test_invalid_format_is_422(self, client):
+        r = client.post("/embed-batch", json={"texts": ["a"], "format": "i8"})
+        assert r.status_code == 422
+
+    def test_batch_size_out_of_range_is_422(self, client):
+        for batch_size in (0, -1, service.MAX_EMBED_BATCH_SIZE + 1):
+            r = client.post("/embed-batch", json={"texts": ["a"], "batch_size": batch_size})
+            assert r.status_code == 422
+
+    def test_valid_body_reaches_handler(self, client):
+        r = client.post("/query", json={"question": "what is entropy?"})
+        assert r.status_code == 503
+
+    def test_openapi_documents_request_body(self, client):
+        schema = client.get("/openapi.json").json()
+        body = schema["paths"]["/query"]["post"]["requestBody"]
+        props = body["content"]["application/json"]["schema"]["properties"]
+        assert "question" in props
+
+
+class StubEmbedder:
+    """Stand-in for NVIDIAEmbedder that returns a fixed query vector."""
+
+    model_id = "stub-embed"
+
+    async def aembed_query(self, text):
+        return [0.5, -1.0, 2.0]
+
+
+class StubPipeline:
+    """Pipeline stand-in exposing the query, embed and metrics entry points."""
+
+    def __init__(self):
+        self.calls = []
+        self.embedder = StubEmbedder()
+
+    def get_metrics_summary(self):
+        return {"avg_latency_ms": np.float32(12.5), "latencies": np.arange(3, dtype=np.float32)}
+
+    async def aquery(self, question, top_k=None):
+        self.calls.append(("aquery", question, top_k))
+        return {"answer": "stub answer", "sources": [], "chunks_retrieved": 0}
+
+    async def aretrieve(self, question, top_k=None):
+        self.calls.append(("aretrieve", question, top_k))
+        return {"sources": [{"content": "chunk", "metadata": {}}], "chunks_retrieved": 1}
+
+    async def query_stream(self, question, top_k=None):
+        self.calls.append(("query_stream", question, top_k))
+        yield 'data: {"content": "stub"}\n\n'
+        yield "data: [DONE]\n\n"
+
+
+class TestQueryEndpoints:
+    """Tests for /query and /query-stream routing to the pipeline."""
+
+    @pytest.fixture
+    def stub(self, monkeypatch):
+        stub = StubPipeline()
+        monkeypatch.setattr(service, "pipeline", stub)
+        return stub
+
+    def test_query_awaits_async_pipeline(self, stub):
+        r = TestClient(service.app).post("/query", json={"question": "q", "top_k": 3})
+        assert r.json()["answer"] == "stub answer"
+        assert stub.calls == [("aquery", "q", 3)]
+
+    def test_retrieve_skips_generation(self, stub):
+        r = TestClient(service.app).post("/retrieve", json={"question": "q", "top_k": 5})
+        assert r.json()["chunks_retrieved"] == 1
+        assert "answer" not in r.json()
+        assert stub.calls == [("aretrieve", "q", 5)]
+
+    def test_query_stream_always_streams(self, stub):
+        r = TestClient(service.app).post("/query-stream", json={"question": "q"})
+        assert r.headers["content-type"].startswith("text/event-stream")
+        assert r.text.endswith("data: [DONE]\n\n")
+        assert stub.calls == [("query_stream", "q", 10)]
+
+    def test_query_stream_rejects_empty_question(self, stub):
+        r = TestClient(service.app).post("/query-stream", json={"question": "  "})
+        assert r.status_code == 400
+
+
+class TestMetricsEndpoints:
+    """Tests for metrics served through the orjson response."""
+
+    def test_metrics_serialize_numpy_values(self, monkeypatch):
+        monkeypatch.setattr(service, "pipeline", StubPipeline())
+        r = TestClient(service.app).get("/metrics")
+        assert r.json() == {"avg_latency_ms": 12.5, "latencies": [0.0, 1.0, 2.0]}
+
+
+class TestEmbedEndpoint:
+    """Tests for /embed response formats."""
+
+    @pytest.fixture
+    def client(self, monkeypatch):
+        monkeypatch.setattr(service, "pipeline", StubPipeline())
+        return TestClient(service.app)
+
+    def test_json_format(self, client):
+        r = client.post("/embed", json={"text": "entropy"})
+        assert r.json()["embedding"] == [0.5, -1.0, 2.0]
+
+    def test_upstream_failure_is_500_with_detail(self, monkeypatch):
+        stub = StubPipeline()
+
+        async def fail(text):
+            raise RuntimeError("upstream unavailable")
+
+        stub.embedder.aembed_query = fail
+        monkeypatch.setattr(service, "pipeline", stub)
+        client = TestClient(service.app, raise_server_exceptions=False)
+
+        r = client.post(
+            "/embed", json={"text": "entropy"}, headers={"Origin": "http://localhost:3000"}
+        )
+
+        assert r.status_code == 500
+        assert r.json() == {"detail": "upstream unavailable"}
+        # Browsers discard cross-origin responses without this header
+        assert r.headers["access-control-allow-origin"]
+
+    def test_f16b64_format_round_trips(self, client):
+        body = client.post("/embed", json={"text": "entropy", "format": "f16b64"}).json()
+        decoded = np.frombuffer(base64.b64decode(body["embedding_b64"]), dtype="<f2")
+        assert decoded.tolist() == [0.5, -1.0, 2.0]
+        assert body["dtype"] == "float16"
+        assert body["dimensions"] == 3
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
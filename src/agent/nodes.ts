@@ -4,8 +4,12 @@ import { createNVIDIAOpenAIChat } from "../models/nvidia-openai-chat";
 import type { StudyAgentStateType } from "./state";
 import { logger } from "../client/logger";
 import { ragClient } from "../rag/rag-client";
+import type { RetrieveResponse } from "../rag/rag-client";
 import { StructuredTool } from "@langchain/core/tools";
-import type { ChatCompletionTool } from "openai/resources/chat/completions";
+import type {
+  ChatCompletionFunctionTool,
+  ChatCompletionTool,
+} from "openai/resources/chat/completions";
 import type { MemoryManager } from "./MemoryManager";
 import {
   enrichAllTools,
@@ -14,7 +18,13 @@ import {
   validateToolArguments,
   mergeWithDefaults,
 } from "../tools/tool-schema-enricher";
+import type { EnrichedToolSchema } from "../tools/tool-schema-enricher";
 import type { Tool } from "@modelcontextprotocol/sdk/types.js";
+import crypto from "crypto";
+import { ROUTES, classifyRoute } from "./route-classifier";
+import type { Route } from "./route-classifier";
+
+export { classifyRoute };
 
 const STUDY_MENTOR_SYSTEM_PROMPT = `You are Alex, an enthusiastic and patient AI Study Mentor created by NVIDIA technology! 🎓
 
@@ -80,6 +90,79 @@ function formatSourceLabel(doc: Document): string {
   return `${baseName} · ${originLabel}`;
 }
 
+const CONTEXT_SEPARATOR = "\n\n---\n\n";
+
+const RETRIEVED_CONTEXT_INSTRUCTIONS = `Instructions:
+- Use the above context to answer the user's question accurately.
+- If the user asks to extract specific items (like questions, terms, dates), list them exactly as they appear in the context.
+- Cite the source (e.g., [Source 1]) for your information.`;
+
+// Numbered, source-labelled context block shared by the retrieve,
+// flashcard and generate nodes
+function formatContext(docs: Document[], trim = false): string {
+  return docs
+    .map((doc, idx) => {
+      const content = trim ? doc.pageContent.trim() : doc.pageContent;
+      return `[Source ${idx + 1}: ${formatSourceLabel(doc)}]\n${content}`;
+    })
+    .join(CONTEXT_SEPARATOR);
+}
+
+// The router is forced to call this tool, so its answer arrives as
+// schema-shaped arguments instead of free text that needs matching
+const ROUTE_TOOL: ChatCompletionFunctionTool = {
+  type: "function",
+  function: {
+    name: "choose_strategy",
+    description: "Pick the strategy used to answer the user query.",
+    parameters: {
+      type: "object",
+      properties: { route: { type: "string", enum: [...ROUTES] } },
+      required: ["route"],
+      additionalProperties: false,
+    },
+  },
+};
+
+const ROUTE_CACHE_SIZE = 1024;
+const routeCache = new Map<string, Route>();
+
+function routeCacheKey(query: string): string {
+  const normalized = query.toLowerCase().split(/\s+/).filter(Boolean).join(" ");
+  return crypto.createHash("sha1").update(normalized).digest("hex");
+}
+
+function rememberRoute(key: string, route: Route): Route {
+  // Map keeps insertion order: re-inserting marks the entry most recent
+  routeCache.delete(key);
+  routeCache.set(key, route);
+  if (routeCache.size > ROUTE_CACHE_SIZE) {
+    routeCache.delete(routeCache.keys().next().value as string);
+  }
+  return route;
+}
+
+// Retrievals started while the router LLM is still deciding, keyed by query
+// text; retrieveNode picks them up instead of issuing its own request.
+// Retrieval only: no answer is generated, and non-rag routes abort it.
+const RETRIEVE_TOP_K = 5;
+const prefetchedRetrievals = new Map<
+  string,
+  { retrieval: Promise<RetrieveResponse>; controller: AbortController }
+>();
+
+function prefetchRetrieval(query: string): void {
+  const controller = new AbortController();
+  const retrieval = ragClient.retrieve(query, RETRIEVE_TOP_K, controller.signal);
+  retrieval.catch(() => undefined); // retrieveNode reports failures it actually awaits
+  prefetchedRetrievals.set(query, { retrieval, controller });
+}
+
+function cancelPrefetch(query: string): void {
+  prefetchedRetrievals.get(query)?.controller.abort();
+  prefetchedRetrievals.delete(query);
+}
+
 export async function routeNode(
   state: StudyAgentStateType
 ): Promise<Partial<StudyAgentStateType>> {
@@ -91,6 +174,19 @@ export async function routeNode(
         ? lastMessage.content
         : JSON.stringify(lastMessage.content);
 
+    const key = routeCacheKey(query);
+    const cached = routeCache.get(key);
+    if (cached) {
+      logger.info(`Router decision (cached): ${cached}`);
+      return { route: rememberRoute(key, cached) };
+    }
+
+    const local = classifyRoute(query);
+    if (local) {
+      logger.info(`Router decision (keywords): ${local}`);
+      return { route: rememberRoute(key, local) };
+    }
+
     const prompt = `You are a router for a study assistant. Decide the best strategy for the user query.
     
     Options:
@@ -100,20 +196,26 @@ export async function routeNode(
     - "tool": Use this ONLY when the user asks to perform a specific SYSTEM action (e.g., read a local file path, list directory, search github, calculate something) that requires using external tools. Do NOT use this for questions about uploaded documents.
     - "general": Use this for general conversation, greetings, or questions that don't need external tools or specific document context.
     
-    Query: ${query}
-    
-    Return ONLY the option name (memory, flashcard, rag, tool, or general).`;
+    Query: ${query}`;
 
-    const response = await model.invoke([{ role: "user", content: prompt }]);
-    const route = response.toLowerCase().trim();
+    // Retrieval does not depend on the decision: overlap it with the router
+    // call, and abort it if the route turns out not to be rag
+    prefetchRetrieval(query);
 
-    logger.info(`Router decision: ${route}`);
+    let decision: Route = "general";
+    try {
+      const args = await model.invokeToolChoice(
+        [{ role: "user", content: prompt }],
+        ROUTE_TOOL
+      );
+      const route = args?.route;
+      if (ROUTES.includes(route)) decision = route;
 
-    if (route.includes("memory")) return { route: "memory" };
-    if (route.includes("flashcard")) return { route: "flashcard" };
-    if (route.includes("rag")) return { route: "rag" };
-    if (route.includes("tool")) return { route: "tool" };
-    return { route: "general" };
+      logger.info(`Router decision: ${decision}`);
+    } finally {
+      if (decision !== "rag") cancelPrefetch(query);
+    }
+    return { route: rememberRoute(key, decision) };
   } catch (error) {
     logger.error("Router failed", error);
     return { route: "general" };
@@ -121,30 +223,58 @@ export async function routeNode(
 }
 
 export function createQueryNode(tools: StructuredTool[]) {
+  // The tool set is fixed for the life of the graph, so the enriched schemas,
+  // OpenAI tool definitions and tool-aware prompt are built once, on first use
+  let prepared:
+    | {
+        toolsByName: Map<string, StructuredTool>;
+        enrichedByName: Map<string, EnrichedToolSchema>;
+        openAITools: ChatCompletionTool[];
+        toolAwarePrompt: string;
+      }
+    | undefined;
+
+  function prepareTools() {
+    if (prepared) return prepared;
+
+    // Enrich tool schemas with detailed descriptions and examples
+    const mcpTools: Tool[] = tools.map((tool) => ({
+      name: tool.name,
+      description: tool.description,
+      inputSchema: tool.schema as Tool["inputSchema"],
+    }));
+
+    const enrichedTools = enrichAllTools(mcpTools);
+    const openAITools: ChatCompletionTool[] =
+      enrichedTools.map(toOpenAIToolFormat);
+
+    if (openAITools.length > 0) {
+      logger.info(
+        `[QueryNode] Using ${openAITools.length} enriched tools: ${openAITools.map((t) => (t.type === "function" ? t.function.name : "unknown")).join(", ")}`
+      );
+    } else {
+      logger.info("[QueryNode] No tools available");
+    }
+
+    prepared = {
+      toolsByName: new Map(tools.map((t) => [t.name, t])),
+      enrichedByName: new Map(enrichedTools.map((t) => [t.name, t])),
+      openAITools,
+      toolAwarePrompt: createToolAwareSystemPrompt(
+        STUDY_MENTOR_SYSTEM_PROMPT,
+        enrichedTools
+      ),
+    };
+    return prepared;
+  }
+
   return async function queryNode(
     state: StudyAgentStateType
   ): Promise<Partial<StudyAgentStateType>> {
     try {
       const model = createNVIDIAOpenAIChat();
-
-      // Enrich tool schemas with detailed descriptions and examples
-      const mcpTools: Tool[] = tools.map((tool) => ({
-        name: tool.name,
-        description: tool.description,
-        inputSchema: tool.schema as Tool["inputSchema"],
-      }));
-
-      const enrichedTools = enrichAllTools(mcpTools);
-      const openAITools: ChatCompletionTool[] =
-        enrichedTools.map(toOpenAIToolFormat);
-
-      if (openAITools.length > 0) {
-        logger.info(
-          `[QueryNode] Using ${openAITools.length} enriched tools: ${openAITools.map((t) => (t.type === "function" ? t.function.name : "unknown")).join(", ")}`
-        );
-      } else {
-        logger.info("[QueryNode] No tools available");
-      }
+      const { toolsByName, enrichedByName, openAITools, toolAwarePrompt } =
+        prepareTools();
 
       // When RAG context is present, use the base system prompt (no tool
       // descriptions) to keep the payload small for the NVIDIA free-tier API.
@@ -152,7 +282,7 @@ export function createQueryNode(tools: StructuredTool[]) {
       const hasRAGContext = (state.documents?.length ?? 0) > 0;
       let systemPrompt = hasRAGContext
         ? STUDY_MENTOR_SYSTEM_PROMPT
-        : createToolAwareSystemPrompt(STUDY_MENTOR_SYSTEM_PROMPT, enrichedTools);
+        : toolAwarePrompt;
 
       // Inject persistent memory context into the system prompt
       const memoryCtx = state.memoryContext || "";
@@ -205,13 +335,13 @@ export function createQueryNode(tools: StructuredTool[]) {
           toolName: string,
           args: Record<string, unknown>
         ) => {
-          const tool = tools.find((t) => t.name === toolName);
+          const tool = toolsByName.get(toolName);
           if (!tool) {
             throw new Error(`Tool ${toolName} not found`);
           }
 
           // Get enriched schema for validation
-          const enrichedSchema = enrichedTools.find((t) => t.name === toolName);
+          const enrichedSchema = enrichedByName.get(toolName);
           if (enrichedSchema) {
             // Validate and merge with defaults
             const validation = validateToolArguments(
@@ -285,8 +415,11 @@ export async function retrieveNode(
       `Retrieving documents for query: ${query.substring(0, 100)}...`
     );
 
-    // Query the RAG service
-    const ragResponse = await ragClient.query(query, [], 5);
+    // Query the RAG service (or reuse the request started during routing)
+    const prefetched = prefetchedRetrievals.get(query);
+    prefetchedRetrievals.delete(query);
+    const ragResponse = await (prefetched?.retrieval ??
+      ragClient.retrieve(query, RETRIEVE_TOP_K));
     const docs = ragResponse.sources.map((source) => ({
       pageContent: source.content,
       metadata: {
@@ -312,19 +445,13 @@ export async function retrieveNode(
     logger.info(`Retrieved ${docs.length} relevant documents from RAG service`);
 
     // Format context with source citations
-    const contextWithSources = docs
-      .map((doc, idx) => {
-        const source = formatSourceLabel(doc);
-        const content = doc.pageContent.trim();
-        return `[Source ${idx + 1}: ${source}]\n${content}`;
-      })
-      .join("\n\n---\n\n");
+    const contextWithSources = formatContext(docs, true);
 
     return {
       documents: docs,
       messages: [
         new SystemMessage({
-          content: `Retrieved Context from Study Materials:\n\n${contextWithSources}\n\nInstructions:\n- Use the above context to answer the user's question accurately.\n- If the user asks to extract specific items (like questions, terms, dates), list them exactly as they appear in the context.\n- Cite the source (e.g., [Source 1]) for your information.`,
+          content: `Retrieved Context from Study Materials:\n\n${contextWithSources}\n\n${RETRIEVED_CONTEXT_INSTRUCTIONS}`,
         }),
       ],
     };
@@ -349,12 +476,7 @@ export async function flashcardNode(
     const model = createNVIDIAOpenAIChat();
 
     // Extract context from retrieved documents if any
-    const context = (state.documents ?? [])
-      .map((doc, idx) => {
-        const source = formatSourceLabel(doc);
-        return `[Source ${idx + 1}: ${source}]\n${doc.pageContent}`;
-      })
-      .join("\n\n---\n\n");
+    const context = formatContext(state.documents ?? []);
 
     // Get the original user question to understand topic
     const userMessages = state.messages.filter(
@@ -442,12 +564,7 @@ export async function generateNode(
     const model = createNVIDIAOpenAIChat();
 
     // Extract context from retrieved documents
-    const context = (state.documents ?? [])
-      .map((doc, idx) => {
-        const source = formatSourceLabel(doc);
-        return `[Source ${idx + 1}: ${source}]\n${doc.pageContent}`;
-      })
-      .join("\n\n---\n\n");
+    const context = formatContext(state.documents ?? []);
 
     // Get conversation history (last 5 messages for context)
     const recentMessages = state.messages.slice(-5);
@@ -0,0 +1,41 @@
+import { describe, it } from "node:test";
+import assert from "node:assert/strict";
+import { classifyRoute } from "./route-classifier";
+
+describe("classifyRoute", () => {
+  it("routes memory requests", () => {
+    assert.equal(classifyRoute("Remember that my exam is on Friday"), "memory");
+    assert.equal(classifyRoute("What do you know about me?"), "memory");
+  });
+
+  it("routes flashcard requests ahead of document keywords", () => {
+    assert.equal(classifyRoute("Make flashcards from chapter 3"), "flashcard");
+    assert.equal(classifyRoute("create some study cards"), "flashcard");
+  });
+
+  it("routes document questions to rag", () => {
+    assert.equal(classifyRoute("Summarize the uploaded PDF"), "rag");
+    assert.equal(classifyRoute("What do my lecture notes say about entropy?"), "rag");
+  });
+
+  it("routes filesystem, GitHub and calculation requests to tools", () => {
+    assert.equal(classifyRoute("List the files in ~/projects/thesis/"), "tool");
+    assert.equal(classifyRoute("Open my GitHub repository"), "tool");
+    assert.equal(classifyRoute("calculate 12 * 7"), "tool");
+  });
+
+  it("routes short greetings to general", () => {
+    assert.equal(classifyRoute("hi"), "general");
+    assert.equal(classifyRoute("  Thank you so much "), "general");
+  });
+
+  it("leaves ambiguous queries to the LLM router", () => {
+    // Both document and tool keywords
+    assert.equal(classifyRoute("Save my notes to the folder"), null);
+    // Greeting followed by a real question
+    assert.equal(classifyRoute("hello, can you explain how photosynthesis works?"), null);
+    // No keywords at all
+    assert.equal(classifyRoute("Explain the Krebs cycle"), null);
+    assert.equal(classifyRoute(""), null);
+  });
+});
@@ -0,0 +1,33 @@
+/**
+ * Keyword routing for the agent router. Kept free of runtime dependencies
+ * so it can be unit tested without the model or RAG clients.
+ */
+
+export const ROUTES = ["general", "rag", "tool", "flashcard", "memory"] as const;
+export type Route = (typeof ROUTES)[number];
+
+// Unambiguous intents are routed locally; only the rest pay for an LLM call.
+const MEMORY_RE =
+  /\b(remember (this|that)|forget (this|that)|delete (this|that) memory|what do you (know|remember) about me|temporary chat|do not save)\b/i;
+const FLASHCARD_RE = /\b(flash ?cards?|study cards?|quiz cards?)\b/i;
+const RAG_RE =
+  /\b(documents?|pdfs?|notes|chapters?|textbooks?|papers?|slides?|lectures?|uploaded|syllabus)\b/i;
+const TOOL_RE =
+  /\b(directory|folder|github|repository|calculate)\b|(^|\s)(~|\.{1,2})?\/[\w.-]+\/|\b[a-z]:\\/i;
+const GREETING_RE =
+  /^(hi|hello|hey|yo|thanks|thank you|good (morning|afternoon|evening)|bye)\b/i;
+
+/** Route from keywords alone, or null when the query is ambiguous. */
+export function classifyRoute(query: string): Route | null {
+  if (MEMORY_RE.test(query)) return "memory";
+  if (FLASHCARD_RE.test(query)) return "flashcard";
+
+  const rag = RAG_RE.test(query);
+  const tool = TOOL_RE.test(query);
+  if (rag && !tool) return "rag";
+  if (tool && !rag) return "tool";
+  if (!rag && !tool && query.trim().split(/\s+/).length <= 4 && GREETING_RE.test(query.trim())) {
+    return "general";
+  }
+  return null;
+}
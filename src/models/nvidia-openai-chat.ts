@@ -1,12 +1,15 @@
 // eslint-disable-next-line @typescript-eslint/no-require-imports
 import OpenAI from "openai";
 import type {
+  ChatCompletionFunctionTool,
   ChatCompletionMessageParam,
   ChatCompletionTool,
 } from "openai/resources/chat/completions";
 
 const NVIDIA_CHAT_MODEL = "moonshotai/kimi-k2-instruct"; // Using Kimi K2 Instruct
 const NVIDIA_BASE_URL = "https://integrate.api.nvidia.com/v1";
+// Assistant turns that only carry tool calls still need non-empty content
+const TOOL_CALL_PLACEHOLDER = "Calling tools...";
 
 function getRequiredApiKey(): string {
   const key = process.env.NVIDIA_API_KEY;
@@ -55,6 +58,32 @@ export class NVIDIAOpenAIChat {
     return completion.choices[0].message.content || "";
   }
 
+  /**
+   * Force exactly one call to `tool` and return its decoded arguments, or
+   * null when the model answers without calling it
+   */
+  async invokeToolChoice(
+    messages: ChatCompletionMessageParam[],
+    tool: ChatCompletionFunctionTool
+    // eslint-disable-next-line @typescript-eslint/no-explicit-any
+  ): Promise<any | null> {
+    const completion = await this.client.chat.completions.create({
+      model: this.model,
+      messages,
+      tools: [tool],
+      tool_choice: { type: "function", function: { name: tool.function.name } },
+      temperature: this.temperature,
+      max_tokens: this.maxTokens,
+    });
+
+    const message = completion.choices[0].message;
+    const call =
+      message.tool_calls?.find((c) => c.type === "function") ??
+      this.parseToolCallsFromContent(message.content || "").toolCalls[0];
+    if (!call) return null;
+    return this.parseToolArguments(tool.function.name, call.function.arguments);
+  }
+
   /**
    * Invoke the chat model with tools enabled
    * This handles the complete tool-calling flow with recursion:
@@ -83,18 +112,19 @@ export class NVIDIAOpenAIChat {
     while (iterations < MAX_ITERATIONS) {
       iterations++;
 
+      // An empty tool list is left out entirely: some backends treat any
+      // tools/tool_choice field as function-calling mode
       const completion = await this.client.chat.completions.create({
         model: this.model,
         messages: conversationMessages,
-        tools,
-        tool_choice: "auto",
+        ...(tools.length > 0 ? { tools, tool_choice: "auto" as const } : {}),
         temperature: this.temperature,
         max_tokens: this.maxTokens,
       });
 
-      const choice = completion.choices[0];
-      let toolCalls = choice.message?.tool_calls || [];
-      let content = choice.message.content || "";
+      const message = completion.choices[0].message;
+      let toolCalls = message.tool_calls ?? [];
+      let content = message.content ?? "";
 
       // Check for raw tool call tokens in content if no structured tool calls found
       if (
@@ -119,82 +149,52 @@ export class NVIDIAOpenAIChat {
       // Add assistant message with tool calls to history
       conversationMessages.push({
         role: "assistant",
-        content: content || "Calling tools...", // Ensure non-empty content
+        content: content.length > 0 ? content : TOOL_CALL_PLACEHOLDER,
         tool_calls: toolCalls,
       });
 
-      // Execute tool calls
-      for (const toolCall of toolCalls) {
-        if (toolCall.type !== "function") continue;
-        const toolName = toolCall.function.name;
-        let toolArgs: any = {};
-        try {
-          const rawArgs = toolCall.function.arguments;
-          let parsed = JSON.parse(rawArgs);
-
-          // Handle double-encoded JSON (stringified JSON inside string)
-          if (typeof parsed === "string") {
-            try {
-              // Check if it looks like a JSON object or array
-              if (
-                parsed.trim().startsWith("{") ||
-                parsed.trim().startsWith("[")
-              ) {
-                parsed = JSON.parse(parsed);
-              }
-            } catch (e) {
-              // Keep as string if second parse fails
-            }
-          }
+      // Parse every call up front, then run the tools concurrently: calls in
+      // one turn are independent, so the turn costs the slowest tool rather
+      // than the sum. Results are appended in the order the model asked.
+      const pending = toolCalls.flatMap((toolCall) =>
+        toolCall.type === "function"
+          ? [
+              {
+                toolCall,
+                toolName: toolCall.function.name,
+                toolArgs: this.parseToolArguments(
+                  toolCall.function.name,
+                  toolCall.function.arguments
+                ),
+              },
+            ]
+          : []
+      );
 
-          toolArgs = parsed;
-        } catch (e) {
-          // Fallback: Try to fix single quotes (common in some models)
+      const results = await Promise.all(
+        pending.map(async ({ toolName, toolArgs }) => {
           try {
-            const fixed = toolCall.function.arguments.replace(/'/g, '"');
-            toolArgs = JSON.parse(fixed);
-          } catch (e2) {
-            console.error(
-              `Failed to parse arguments for tool ${toolName}:`,
-              toolCall.function.arguments
-            );
+            return await toolExecutor(toolName, toolArgs);
+          } catch (error) {
+            return `Error executing tool ${toolName}: ${error instanceof Error ? error.message : String(error)}`;
           }
-        }
-
-        // Ensure toolArgs is an object (unless the tool specifically accepts a string, but standard is object)
-        if (typeof toolArgs !== "object" || toolArgs === null) {
-          // If it's a primitive, wrap it? Or just leave it and let validation fail?
-          // For now, let's assume it should be an object.
-          // If it's a string that wasn't JSON, maybe it's the value for the single argument?
-          // But we don't know the argument name.
-          // Let's just log a warning.
-          console.warn(
-            `Tool arguments for ${toolName} are not an object:`,
-            toolArgs
-          );
-        }
-
-        // Execute the tool
-        let toolResult = "";
-        try {
-          toolResult = await toolExecutor(toolName, toolArgs);
-        } catch (error) {
-          toolResult = `Error executing tool ${toolName}: ${error instanceof Error ? error.message : String(error)}`;
-        }
+        })
+      );
 
+      pending.forEach(({ toolCall, toolName, toolArgs }, i) => {
         allExecutedTools.push({
           name: toolName,
           args: toolArgs,
-          result: toolResult,
+          result: results[i],
         });
 
         // Add tool result to conversation
         conversationMessages.push({
           role: "tool",
           tool_call_id: toolCall.id,
-          content: toolResult,
+          content: results[i],
         });
-      }
+      });
     }
 
     // If we hit max iterations, return what we have
@@ -208,6 +208,60 @@ export class NVIDIAOpenAIChat {
     };
   }
 
+  /**
+   * Decode a tool call's JSON arguments, tolerating double encoding and
+   * single-quoted JSON
+   */
+  // eslint-disable-next-line @typescript-eslint/no-explicit-any
+  private parseToolArguments(toolName: string, rawArgs: string): any {
+    let toolArgs: any = {};
+    try {
+      let parsed = JSON.parse(rawArgs);
+
+      // Handle double-encoded JSON (stringified JSON inside string)
+      if (typeof parsed === "string") {
+        try {
+          // Check if it looks like a JSON object or array
+          if (
+            parsed.trim().startsWith("{") ||
+            parsed.trim().startsWith("[")
+          ) {
+            parsed = JSON.parse(parsed);
+          }
+        } catch (e) {
+          // Keep as string if second parse fails
+        }
+      }
+
+      toolArgs = parsed;
+    } catch (e) {
+      // Fallback: Try to fix single quotes (common in some models)
+      try {
+        const fixed = rawArgs.replace(/'/g, '"');
+        toolArgs = JSON.parse(fixed);
+      } catch (e2) {
+        console.error(
+          `Failed to parse arguments for tool ${toolName}:`,
+          rawArgs
+        );
+      }
+    }
+
+    // Ensure toolArgs is an object (unless the tool specifically accepts a string, but standard is object)
+    if (typeof toolArgs !== "object" || toolArgs === null) {
+      // If it's a primitive, wrap it? Or just leave it and let validation fail?
+      // For now, let's assume it should be an object.
+      // If it's a string that wasn't JSON, maybe it's the value for the single argument?
+      // But we don't know the argument name.
+      // Let's just log a warning.
+      console.warn(
+        `Tool arguments for ${toolName} are not an object:`,
+        toolArgs
+      );
+    }
+    return toolArgs;
+  }
+
   /**
    * Parse raw tool call tokens from content
    * Format: <|tool_calls_section_begin|><|tool_call_begin|>name:id<|tool_call_argument_begin|>args<|tool_call_end|><|tool_calls_section_end|>
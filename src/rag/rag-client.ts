@@ -8,6 +8,7 @@
  *   const client = new RAGClient();
  *   await client.loadDocument('/path/to/document.pdf');
  *   const result = await client.query('What is the main topic?');
+ *   for await (const event of client.queryStream('Summarize chapter 2')) { ... }
  */
 
 import { logger } from "../client/logger";
@@ -34,6 +35,7 @@ export interface QueryRequest {
   question: string;
   chat_history?: Array<{ role: string; content: string }>;
   top_k?: number;
+  stream?: boolean;
 }
 
 export interface Source {
@@ -47,6 +49,25 @@ export interface QueryResponse {
   chunks_retrieved: number;
 }
 
+/**
+ * Reranked sources for a question, without a generated answer
+ */
+export interface RetrieveResponse {
+  sources: Source[];
+  chunks_retrieved: number;
+}
+
+/**
+ * One server-sent event from a streamed query: answer text while the
+ * model generates, then the sources once it has finished
+ */
+export interface QueryStreamEvent {
+  content?: string;
+  sources?: Source[];
+  chunks_retrieved?: number;
+  error?: string;
+}
+
 export interface AgentQueryRequest {
   question: string;
   use_rag?: boolean;
@@ -263,6 +284,123 @@ export class RAGClient {
     }
   }
 
+  /**
+   * Retrieve and rerank sources for a question without running the LLM
+   *
+   * @param question - User's question
+   * @param topK - Number of document chunks to retrieve (default: 4)
+   * @param signal - Optional signal that cancels the request
+   * @returns Reranked sources
+   */
+  async retrieve(
+    question: string,
+    topK = 4,
+    signal?: AbortSignal
+  ): Promise<RetrieveResponse> {
+    try {
+      if (!question || !question.trim()) {
+        throw new RAGClientError("Question cannot be empty");
+      }
+
+      const timeout = AbortSignal.timeout(60000);
+      const response = await fetch(`${this.baseURL}/retrieve`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ question, top_k: topK }),
+        signal: signal ? AbortSignal.any([signal, timeout]) : timeout,
+      });
+
+      if (!response.ok) {
+        const errorData = await response.json().catch(() => ({}));
+        throw new RAGClientError(
+          `Retrieve failed: ${response.status} ${response.statusText}`,
+          response.status,
+          errorData.detail || "Unknown error"
+        );
+      }
+
+      return await response.json();
+    } catch (error) {
+      if (error instanceof RAGClientError) {
+        throw error;
+      }
+
+      const message = error instanceof Error ? error.message : String(error);
+      if (!signal?.aborted) logger.error(`Retrieve error: ${message}`);
+      throw new RAGClientError(`Retrieve failed: ${message}`);
+    }
+  }
+
+  /**
+   * Query the RAG pipeline and stream the answer as it is generated
+   *
+   * @param question - User's question
+   * @param topK - Number of document chunks to retrieve (default: 4)
+   * @returns Events carrying answer text, then sources
+   */
+  async *queryStream(
+    question: string,
+    topK = 4
+  ): AsyncGenerator<QueryStreamEvent> {
+    if (!question || !question.trim()) {
+      throw new RAGClientError("Question cannot be empty");
+    }
+
+    const request: QueryRequest = { question, top_k: topK, stream: true };
+
+    const response = await fetch(`${this.baseURL}/query`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(request),
+      signal: AbortSignal.timeout(60000),
+    });
+
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({}));
+      throw new RAGClientError(
+        `Query failed: ${response.status} ${response.statusText}`,
+        response.status,
+        errorData.detail || "Unknown error"
+      );
+    }
+
+    // No matching context: the service answers with plain JSON
+    if (!response.headers.get("content-type")?.includes("text/event-stream")) {
+      const result: QueryResponse = await response.json();
+      yield { content: result.answer };
+      yield { sources: result.sources, chunks_retrieved: result.chunks_retrieved };
+      return;
+    }
+
+    if (!response.body) {
+      throw new RAGClientError("Query stream has no body");
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    try {
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let end: number;
+        while ((end = buffer.indexOf("\n\n")) !== -1) {
+          const frame = buffer.slice(0, end);
+          buffer = buffer.slice(end + 2);
+          // Comment lines (keepalive pings) carry no data
+          if (!frame.startsWith("data: ")) continue;
+          const data = frame.slice(6);
+          if (data === "[DONE]") return;
+          yield JSON.parse(data) as QueryStreamEvent;
+        }
+      }
+    } finally {
+      reader.releaseLock();
+    }
+  }
+
   /**
    * Clear all documents from the collection
    */
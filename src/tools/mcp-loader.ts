@@ -150,15 +150,26 @@ export async function loadStudyMCPTools(): Promise<LoadedStudyTools> {
   return { tools: patchedTools, client, transport };
 }
 
-export function loadMcpConfig(): McpConfig {
+let cachedMcpConfig: Readonly<McpConfig> | undefined;
+
+// Parsed once per process; the frozen result is shared by every caller
+export function loadMcpConfig(): Readonly<McpConfig> {
+  if (cachedMcpConfig) {
+    return cachedMcpConfig;
+  }
   const configPath = path.resolve(process.cwd(), "mcp.json");
-  if (fs.existsSync(configPath)) {
-    try {
-      const content = fs.readFileSync(configPath, "utf-8");
-      return JSON.parse(content);
-    } catch (error) {
+  let config: McpConfig = { mcpServers: {} };
+  try {
+    const parsed = JSON.parse(fs.readFileSync(configPath, "utf-8"));
+    config = { mcpServers: parsed?.mcpServers ?? {} };
+  } catch (error) {
+    // A missing file just means no servers are configured
+    if ((error as NodeJS.ErrnoException).code !== "ENOENT") {
       logger.error("Failed to parse mcp.json", error);
     }
   }
-  return { mcpServers: {} };
+  cachedMcpConfig = Object.freeze({
+    mcpServers: Object.freeze(config.mcpServers),
+  });
+  return cachedMcpConfig;
 }
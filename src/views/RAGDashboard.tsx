@@ -614,7 +614,7 @@ export const RAGDashboard: React.FC = () => {
                   <PipelineStage
                     icon={<Database className="w-4 h-4 text-purple-500" />}
                     title="4. ChromaDB Storage"
-                    description="Vectors are stored in a persistent ChromaDB collection with enriched metadata (chunk_id, page, token count, preview)."
+                    description="Vectors are stored in a persistent ChromaDB collection with enriched metadata (chunk_id, page, token count)."
                     detail={collectionStats?.persist_dir ?? "~/.chroma_db"}
                     color="bg-purple-500/10"
                     isLast